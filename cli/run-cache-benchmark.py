@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+sd api transformer step-cache benchmark
+runs fixed prompt and seed matrix for uncached baseline and each cache method on server and prints comparison
+"""
+import json
+import argparse
+import sdapi
+from util import log
+
+
+def main():
+    req = {
+        'steps': args.steps,
+        'width': args.width,
+        'height': args.height,
+        'cfg_scale': args.cfg,
+        'sampler_name': args.sampler,
+        'warmup': not args.nowarmup,
+    }
+    if args.prompts:
+        req['prompts'] = args.prompts
+    if args.seeds:
+        req['seeds'] = args.seeds
+    if args.methods:
+        with open(args.methods, 'r', encoding='utf-8') as f:
+            req['methods'] = json.load(f)
+    log.info({ 'request': req })
+    report = sdapi.postsync('/sdapi/v1/benchmark/cache', req)
+    if 'results' not in report:
+        log.error({ 'benchmark': report })
+        return
+    log.info({ 'model': report['model'], 'cls': report['cls'], 'time': report['time'], 'file': report.get('file', None) })
+    for res in report['results']:
+        if 'error' in res:
+            log.warning({ 'method': res['method'], 'error': res['error'] })
+        else:
+            log.info({ 'method': res['method'], 'settings': res['settings'], 'wall': res['wall'], 'its': res['its'], 'speedup': res['speedup'], 'peak': res['peak'], 'psnr': res['psnr'], 'ssim': res['ssim'] })
+    for note in report.get('notes', []):
+        log.warning({ 'note': note })
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        log.info({ 'save': args.output })
+
+
+if __name__ == '__main__':
+    log.info({ 'run-cache-benchmark' })
+    parser = argparse.ArgumentParser(description = 'run-cache-benchmark')
+    parser.add_argument("--steps", type=int, default=20, required=False, help="steps")
+    parser.add_argument("--width", type=int, default=1024, required=False, help="width")
+    parser.add_argument("--height", type=int, default=1024, required=False, help="height")
+    parser.add_argument("--cfg", type=float, default=3.5, required=False, help="cfg scale")
+    parser.add_argument("--sampler", type=str, default='Default', required=False, help="sampler")
+    parser.add_argument("--prompts", type=str, nargs='*', default=None, required=False, help="prompts, default uses built-in set")
+    parser.add_argument("--seeds", type=int, nargs='*', default=None, required=False, help="seeds, default uses built-in set")
+    parser.add_argument("--methods", type=str, default='', required=False, help="json file with cache method name and list of option overrides")
+    parser.add_argument("--output", type=str, default='', required=False, help="save json report to file")
+    parser.add_argument('--nowarmup', default = False, action='store_true', help = 'skip warmup run')
+    parser.add_argument('--debug', default = False, action='store_true', help = 'debug logging')
+    args = parser.parse_args()
+    if args.debug:
+        log.setLevel('DEBUG')
+    try:
+        main()
+    except KeyboardInterrupt:
+        log.warning({ 'interrupted': 'keyboard request' })
+        sdapi.interruptsync()
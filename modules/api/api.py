@@ -99,16 +99,33 @@ class Api:
         self.add_api_route("/sdapi/v1/refresh-vae", endpoints.post_refresh_vae, methods=["POST"])
         self.add_api_route("/sdapi/v1/latents", endpoints.get_latent_history, methods=["GET"], response_model=List[str])
         self.add_api_route("/sdapi/v1/latents", endpoints.post_latent_history, methods=["POST"], response_model=int)
+        self.add_api_route("/sdapi/v1/generation-log", endpoints.get_generation_log, methods=["GET"], response_model=List[models.ItemGenerationLog])
         self.add_api_route("/sdapi/v1/modules", endpoints.get_modules, methods=["GET"])
 
         # lora api
         from modules.api import loras
         loras.register_api()
 
+        # job queue api
+        from modules.api import jobs
+        jobs.register_api(self.generate)
+
+        # binary transport api
+        from modules.api import binary
+        binary.register_api(self)
+
         # gallery api
         from modules.api import gallery
         gallery.register_api(self.app)
 
+        # progress stream api
+        from modules.api import progress_stream
+        progress_stream.register_api(self.app)
+
+        # cache benchmark api
+        from modules.api import benchmark
+        benchmark.register_api(self.queue_lock)
+
         # nudenet api
         from modules.api import nudenet
         nudenet.register_api()
@@ -0,0 +1,32 @@
+from typing import Optional, List, Dict
+from pydantic import BaseModel, Field # pylint: disable=no-name-in-module
+from fastapi.exceptions import HTTPException
+from modules import shared
+
+
+class ReqCacheBenchmark(BaseModel):
+    methods: Optional[Dict[str, List[dict]]] = Field(title="Methods", default=None, description="Cache method name and list of option overrides to test, default tests teacache, cachedit, fastercache, pab and fbcache")
+    prompts: Optional[List[str]] = Field(title="Prompts", default=None, description="Prompts used for each method and setting")
+    seeds: Optional[List[int]] = Field(title="Seeds", default=None, description="Seeds used for each prompt")
+    steps: int = Field(title="Steps", default=20)
+    width: int = Field(title="Width", default=1024)
+    height: int = Field(title="Height", default=1024)
+    cfg_scale: float = Field(title="CFG scale", default=3.5)
+    sampler_name: str = Field(title="Sampler", default='Default')
+    warmup: bool = Field(title="Warmup", default=True, description="Run single uncached generate before measurements")
+
+
+def register_api(queue_lock):
+    from modules import cache_benchmark
+
+    def post_cache_benchmark(req: ReqCacheBenchmark):
+        if not shared.sd_loaded or shared.sd_model is None:
+            raise HTTPException(status_code=400, detail="Model not loaded")
+        with queue_lock:
+            jobid = shared.state.begin('Benchmark', api=True)
+            try:
+                return cache_benchmark.run(**vars(req))
+            finally:
+                shared.state.end(jobid)
+
+    shared.api.add_api_route("/sdapi/v1/benchmark/cache", post_cache_benchmark, methods=["POST"], response_model=dict)
@@ -0,0 +1,140 @@
+import io
+import os
+import json
+import uuid
+import struct
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel # pylint: disable=no-name-in-module
+from starlette.concurrency import run_in_threadpool
+from PIL import Image
+from modules import shared
+from modules.api import models, helpers
+
+
+list_fields = {'init_images', 'inputs', 'inits', 'images', 'masks'} # uploaded parts with these names are appended instead of assigned
+output_modes = ['multipart', 'binary', 'file']
+result_fields = {'images', 'processed', 'image'} # response fields that hold encoded output images, params and info echoes are never rewritten
+
+
+def assign(params: dict, path: str, value: str):
+    """assign value to dotted path such as mask, init_images or ip_adapter.0.images"""
+    keys = path.split('.')
+    target = params
+    for key in keys[:-1]:
+        if isinstance(target, list):
+            target = target[int(key)]
+        else:
+            target = target.setdefault(key, {})
+    key = keys[-1]
+    if isinstance(target.get(key, None), list) or (key in list_fields and target.get(key, None) is None):
+        target.setdefault(key, [])
+        if target[key] is None:
+            target[key] = []
+        target[key].append(value)
+    else:
+        target[key] = value
+
+
+async def parse(request: Request):
+    """parse json body or multipart form with json params part and raw image parts referenced as part:<n>"""
+    content_type = request.headers.get('content-type', '')
+    if not content_type.startswith('multipart/form-data'):
+        return await request.json(), []
+    form = await request.form()
+    params = {}
+    inputs = []
+    for name, value in form.multi_items():
+        if hasattr(value, 'read'):
+            continue
+        if name in {'params', 'json'}:
+            params = json.loads(value)
+    for name, value in form.multi_items():
+        if not hasattr(value, 'read'):
+            if name not in {'params', 'json'}:
+                assign(params, name, value)
+            continue
+        assign(params, name, f'part:{len(inputs)}')
+        inputs.append(await value.read())
+    return params, inputs
+
+
+def encode(image: Image.Image):
+    buffered = io.BytesIO()
+    helpers.save_image(image, fn=buffered, ext=shared.opts.samples_format)
+    image_format = Image.registered_extensions()[f'.{shared.opts.samples_format}']
+    return buffered.getvalue(), Image.MIME.get(image_format, 'application/octet-stream')
+
+
+def run(fn, req, inputs: list):
+    helpers.transport.inputs = inputs
+    helpers.transport.outputs = []
+    try:
+        res = fn(req)
+        return res, helpers.transport.outputs
+    finally:
+        helpers.transport.inputs = None
+        helpers.transport.outputs = None
+
+
+def replace(data: dict, fn, count: int):
+    """replace result references created by encode_pil_to_base64 in image fields of response using fn"""
+    def reference(value):
+        if isinstance(value, str) and value.startswith('result:') and value[7:].isdigit() and int(value[7:]) < count:
+            return fn(value)
+        return value
+    for key in result_fields.intersection(data):
+        value = data[key]
+        data[key] = [reference(v) for v in value] if isinstance(value, list) else reference(value)
+    return data
+
+
+def respond(res, outputs: list, output: str):
+    if not isinstance(res, BaseModel):
+        return res
+    data = res.dict()
+    if output == 'file':
+        folder = shared.opts.outdir_save
+        os.makedirs(folder, exist_ok=True)
+        files = []
+        for image in outputs:
+            fn = os.path.join(folder, f'api-{uuid.uuid4().hex[:16]}.{shared.opts.samples_format}')
+            helpers.save_image(image, fn=fn, ext=shared.opts.samples_format)
+            files.append(os.path.abspath(fn))
+        return JSONResponse(replace(data, lambda ref: files[int(ref[7:])], len(files)))
+    parts = [encode(image) for image in outputs]
+    if output == 'binary': # length-prefixed frames: json metadata followed by images in part order
+        chunks = [json.dumps(data).encode('utf-8')] + [content for content, _mime in parts]
+        body = b''.join(struct.pack('>I', len(chunk)) + chunk for chunk in chunks)
+        return Response(content=body, media_type='application/octet-stream', headers={ 'X-Parts': str(len(parts)) })
+    boundary = uuid.uuid4().hex
+    chunks = [f'--{boundary}\r\nContent-Type: application/json\r\nContent-Disposition: inline; name="json"\r\n\r\n'.encode('utf-8'), json.dumps(data).encode('utf-8'), b'\r\n']
+    for i, (content, mime) in enumerate(parts):
+        chunks.append(f'--{boundary}\r\nContent-Type: {mime}\r\nContent-Disposition: inline; name="result:{i}"\r\nContent-Length: {len(content)}\r\n\r\n'.encode('utf-8'))
+        chunks.append(content)
+        chunks.append(b'\r\n')
+    chunks.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return Response(content=b''.join(chunks), media_type=f'multipart/mixed; boundary={boundary}')
+
+
+def register_api(api):
+    from modules.api import control
+
+    def endpoint(model, fn):
+        async def post_binary(request: Request, output: str = 'multipart'):
+            if output not in output_modes:
+                raise HTTPException(status_code=400, detail=f"Invalid output mode: {output} available={output_modes}")
+            params, inputs = await parse(request)
+            try:
+                req = model(**params)
+            except Exception as e:
+                raise HTTPException(status_code=422, detail=str(e)) from e
+            res, outputs = await run_in_threadpool(run, fn, req, inputs)
+            shared.log.debug(f'API binary: inputs={len(inputs)} size={sum(len(x) for x in inputs)} outputs={len(outputs)} mode={output}')
+            return await run_in_threadpool(respond, res, outputs, output)
+        return post_binary
+
+    shared.api.add_api_route("/sdapi/v1/txt2img/binary", endpoint(models.ReqTxt2Img, api.generate.post_text2img), methods=["POST"])
+    shared.api.add_api_route("/sdapi/v1/img2img/binary", endpoint(models.ReqImg2Img, api.generate.post_img2img), methods=["POST"])
+    shared.api.add_api_route("/sdapi/v1/control/binary", endpoint(control.ReqControl, api.control.post_control), methods=["POST"])
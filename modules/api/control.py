@@ -188,8 +188,8 @@ class APIControl():
             shared.state.end(jobid)
 
         # return
-        b64images = list(map(helpers.encode_pil_to_base64, output_images)) if send_images else []
-        b64processed = list(map(helpers.encode_pil_to_base64, output_processed)) if send_images else []
+        b64images = helpers.encode_images(output_images) if send_images else []
+        b64processed = helpers.encode_images(output_processed) if send_images else []
         self.sanitize_b64(req)
         req.units = requested
         return ResControl(images=b64images, processed=b64processed, params=vars(req), info=output_info)
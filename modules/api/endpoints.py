@@ -1,4 +1,5 @@
 from typing import Optional
+from fastapi import Depends
 from fastapi.exceptions import HTTPException
 from modules import shared
 from modules.api import models, helpers
@@ -217,6 +218,10 @@ def post_pnginfo(req: models.ReqImageInfo):
     script_callbacks.infotext_pasted_callback(geninfo, params)
     return models.ResImageInfo(info=geninfo, items=items, parameters=params)
 
+def get_generation_log(req: models.ReqGenerationLog = Depends()):
+    from modules.images_log import generation_log
+    return generation_log.query(filename=req.filename, seed=req.seed, since=req.since, until=req.until, search=req.search, limit=req.limit, offset=req.offset)
+
 def get_latent_history():
     return shared.history.list
 
@@ -4,12 +4,15 @@ import time
 import base64
 from typing import List, Union
 from urllib.parse import quote, unquote
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.websockets import WebSocket, WebSocketState
 from pydantic import BaseModel, Field # pylint: disable=no-name-in-module
 from PIL import Image
 from modules import shared, images, files_cache, modelstats
+from modules.api.gallery_cache import ThumbnailCache
+from modules.api.gallery_index import GalleryIndex, SORT_KEYS
 
 
 debug = shared.log.debug if os.environ.get('SD_BROWSER_DEBUG', None) is not None else lambda *args, **kwargs: None
@@ -29,6 +32,7 @@ OPTS_FOLDERS = [
     "outdir_img2img_grids",
     "outdir_control_grids",
 ]
+THUMB_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.tiff', '.jp2', '.jxl', '.gif', '.mp4']
 
 ### class definitions
 
@@ -72,6 +76,13 @@ class ConnectionManager:
 
 def register_api(app: FastAPI): # register api
     manager = ConnectionManager()
+    thumbs = ThumbnailCache()
+    index = GalleryIndex()
+
+    def folder_files(folder: str):
+        if index.enabled:
+            return index.get(folder).files()
+        return list(files_cache.list_files(folder, recursive=True))
 
     def get_video_thumbnail(filepath):
         from modules.video import get_video_params
@@ -143,24 +154,61 @@ def register_api(app: FastAPI): # register api
         debug(f'Browser folders: {folders}')
         return JSONResponse(content=folders)
 
+    def get_thumbnail(filepath):
+        if filepath.lower().endswith('.mp4'):
+            return get_video_thumbnail(filepath)
+        return get_image_thumbnail(filepath)
+
     # @app.get("/sdapi/v1/browser/thumb", response_model=dict)
-    async def get_thumb(file: str):
+    async def get_thumb(request: Request, file: str):
         try:
             decoded = unquote(file).replace('%3A', ':')
-            if decoded.lower().endswith('.mp4'):
-                return JSONResponse(content=get_video_thumbnail(decoded))
-            else:
-                return JSONResponse(content=get_image_thumbnail(decoded))
+            key = thumbs.key(decoded) if thumbs.enabled else None
+            if key is None:
+                content = await run_in_threadpool(get_thumbnail, decoded)
+                return JSONResponse(content=content)
+            headers = { 'ETag': f'"{key}"', 'Cache-Control': 'no-cache' }
+            if request.headers.get('if-none-match', None) == headers['ETag']:
+                return Response(status_code=304, headers=headers)
+            data = await run_in_threadpool(thumbs.get, key)
+            if data is None:
+                _key, data = await run_in_threadpool(thumbs.generate, decoded, get_thumbnail, key)
+            return Response(content=data, media_type='application/json', headers=headers)
         except Exception as e:
             shared.log.error(f'Gallery: {file} {e}')
             content = { 'error': str(e) }
             return JSONResponse(content=content)
 
+    # @app.get("/sdapi/v1/browser/cache", response_model=dict)
+    def get_cache():
+        return JSONResponse(content={ **thumbs.stats(), 'index': index.stats() })
+
+    # @app.get("/sdapi/v1/browser/index", response_model=dict)
+    def get_index(folder: str, sort: str = 'mtime', order: str = 'desc', offset: int = 0, limit: int = 500):
+        if sort not in SORT_KEYS or order not in ['asc', 'desc']:
+            return JSONResponse(content={ 'error': f'invalid sort={sort} order={order} available={SORT_KEYS}' }, status_code=400)
+        try:
+            t0 = time.time()
+            res = index.get(unquote(folder)).listing(sort=sort, order=order, offset=max(0, offset), limit=max(0, limit))
+            debug(f'Gallery index: folder="{folder}" total={res["total"]} offset={offset} items={len(res["items"])} time={time.time()-t0:.3f}')
+            return res
+        except Exception as e:
+            shared.log.error(f'Gallery index: {folder} {e}')
+            return JSONResponse(content={ 'error': str(e) }, status_code=404)
+
+    # @app.get("/sdapi/v1/browser/changes", response_model=dict)
+    def get_changes(folder: str, cursor: str = ''):
+        try:
+            return index.get(unquote(folder)).changes(cursor)
+        except Exception as e:
+            shared.log.error(f'Gallery index: {folder} {e}')
+            return JSONResponse(content={ 'error': str(e) }, status_code=404)
+
     # @app.get("/sdapi/v1/browser/files", response_model=list)
     async def ht_files(folder: str):
         try:
             t0 = time.time()
-            files = files_cache.directory_files(folder, recursive=True)
+            files = await run_in_threadpool(folder_files, folder)
             lines = []
             for f in files:
                 file = os.path.relpath(f, folder)
@@ -177,6 +225,9 @@ def register_api(app: FastAPI): # register api
     shared.api.add_api_route("/sdapi/v1/browser/folders", get_folders, methods=["GET"], response_model=List[str])
     shared.api.add_api_route("/sdapi/v1/browser/thumb", get_thumb, methods=["GET"], response_model=dict)
     shared.api.add_api_route("/sdapi/v1/browser/files", ht_files, methods=["GET"], response_model=list)
+    shared.api.add_api_route("/sdapi/v1/browser/cache", get_cache, methods=["GET"], response_model=dict)
+    shared.api.add_api_route("/sdapi/v1/browser/index", get_index, methods=["GET"], response_model=dict)
+    shared.api.add_api_route("/sdapi/v1/browser/changes", get_changes, methods=["GET"], response_model=dict)
 
     @app.websocket("/sdapi/v1/browser/files")
     async def ws_files(ws: WebSocket):
@@ -186,7 +237,7 @@ def register_api(app: FastAPI): # register api
             folder = unquote(folder).replace('%3A', ':')
             t0 = time.time()
             numFiles = 0
-            files = files_cache.list_files(folder, recursive=True)
+            files = await run_in_threadpool(folder_files, folder)
             # files = list(files_cache.directory_files(folder, recursive=True))
             # files.sort(key=os.path.getmtime)
             for f in files:
@@ -197,7 +248,8 @@ def register_api(app: FastAPI): # register api
                 await manager.send(ws, msg)
             await manager.send(ws, '#END#')
             t1 = time.time()
-            shared.log.debug(f'Gallery: type=ws folder="{folder}" files={numFiles} time={t1-t0:.3f}')
+            queued = await run_in_threadpool(thumbs.prefetch, [f for f in files if os.path.splitext(f)[1].lower() in THUMB_EXTENSIONS], get_thumbnail)
+            shared.log.debug(f'Gallery: type=ws folder="{folder}" files={numFiles} prefetch={queued} time={t1-t0:.3f}')
         except Exception as e:
             debug(f'Browser WS error: {e}')
         manager.disconnect(ws)
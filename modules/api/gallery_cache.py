@@ -0,0 +1,182 @@
+import os
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from modules import shared, paths
+
+
+debug = shared.log.debug if os.environ.get('SD_BROWSER_DEBUG', None) is not None else lambda *args, **kwargs: None
+
+
+class ThumbnailCache:
+    """content-addressed on-disk thumbnail store keyed by file path, size, mtime and thumbnail geometry"""
+
+    def __init__(self, folder: str = None, workers: int = 2):
+        self.folder = folder or os.path.join(paths.data_path, 'cache', 'thumbs')
+        self.lock = threading.Lock()
+        self.entries: dict[str, list] = {} # key: [bytes, atime]
+        self.pending: set[str] = set()
+        self.total = 0
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sd-thumbs')
+
+    @property
+    def budget(self) -> int:
+        return int(shared.opts.browser_thumb_cache_size) * 1024 * 1024
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def key(self, filepath: str):
+        try:
+            stat = os.stat(filepath)
+        except Exception:
+            return None
+        fixed = shared.opts.browser_fixed_width
+        size = shared.opts.extra_networks_card_size
+        token = f'{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}|{size}|{fixed}'
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], f'{key}.json')
+
+    def load(self):
+        if self.loaded:
+            return
+        t0 = time.time()
+        with self.lock:
+            self.loaded = True
+            if not os.path.isdir(self.folder):
+                return
+            for root, _dirs, files in os.walk(self.folder):
+                for f in files:
+                    if not f.endswith('.json'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, f))
+                    except Exception:
+                        continue
+                    self.entries[f[:-5]] = [stat.st_size, stat.st_mtime]
+                    self.total += stat.st_size
+        t1 = time.time()
+        shared.log.debug(f'Gallery cache: folder="{self.folder}" items={len(self.entries)} size={self.total} budget={self.budget} time={t1-t0:.3f}')
+
+    def get(self, key: str):
+        self.load()
+        with self.lock:
+            entry = self.entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        fn = self.path(key)
+        try:
+            with open(fn, 'rb') as f:
+                data = f.read()
+            now = time.time()
+            os.utime(fn, (now, now)) # mtime of the cache entry doubles as persistent lru timestamp
+            entry[1] = now
+            self.hits += 1
+            return data
+        except Exception:
+            with self.lock:
+                self.remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes):
+        self.load()
+        fn = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            tmp = f'{fn}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, fn)
+        except Exception as e:
+            shared.log.error(f'Gallery cache: file="{fn}" {e}')
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total -= self.entries[key][0]
+            self.entries[key] = [len(data), time.time()]
+            self.total += len(data)
+            self.evict()
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.total -= entry[0]
+        try:
+            os.remove(self.path(key))
+        except Exception:
+            pass
+
+    def evict(self):
+        budget = self.budget
+        if self.total <= budget:
+            return
+        target = int(0.9 * budget)
+        for key, _entry in sorted(self.entries.items(), key=lambda kv: kv[1][1]):
+            if self.total <= target:
+                break
+            self.remove(key)
+            self.evictions += 1
+        debug(f'Gallery cache evict: items={len(self.entries)} size={self.total} budget={budget} evictions={self.evictions}')
+
+    def generate(self, filepath: str, fn, key: str = None):
+        key = key or self.key(filepath)
+        if key is None:
+            return None, None
+        content = fn(filepath)
+        if content is None or len(content) == 0: # do not cache failures
+            return key, orjson.dumps(content or {}) # pylint: disable=no-member
+        data = orjson.dumps(content) # pylint: disable=no-member
+        if self.enabled:
+            self.put(key, data)
+        return key, data
+
+    def prefetch(self, files: list, fn):
+        if not self.enabled:
+            return 0
+        self.load()
+        queued = 0
+        for filepath in files:
+            key = self.key(filepath)
+            if key is None:
+                continue
+            with self.lock:
+                if key in self.entries or key in self.pending:
+                    continue
+                self.pending.add(key)
+            self.executor.submit(self.background, filepath, fn, key)
+            queued += 1
+        debug(f'Gallery cache prefetch: files={len(files)} queued={queued}')
+        return queued
+
+    def background(self, filepath: str, fn, key: str):
+        try:
+            if key not in self.entries:
+                self.generate(filepath, fn, key)
+        except Exception as e:
+            debug(f'Gallery cache prefetch: file="{filepath}" {e}')
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+
+    def stats(self):
+        return {
+            'items': len(self.entries),
+            'size': self.total,
+            'budget': self.budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'pending': len(self.pending),
+        }
@@ -0,0 +1,228 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from PIL import Image
+from modules import shared, paths, images
+
+
+debug = shared.log.debug if os.environ.get('SD_BROWSER_DEBUG', None) is not None else lambda *args, **kwargs: None
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp', '.tiff', '.jp2', '.jxl', '.gif']
+SORT_KEYS = ['mtime', 'name', 'size']
+MAX_DELETED = 10000 # deletion records kept for change feed, older cursors get reset
+
+
+def read_metadata(filepath: str) -> dict:
+    """image dimensions and generation info read from file header without decoding pixels"""
+    try:
+        with Image.open(filepath) as image:
+            geninfo, _items = images.read_info_from_image(image)
+            return { 'width': image.width, 'height': image.height, 'geninfo': geninfo }
+    except Exception as e:
+        debug(f'Gallery index: file="{filepath}" {e}')
+        return { 'width': None, 'height': None, 'geninfo': None }
+
+
+class FolderIndex:
+    """persistent index of single gallery folder maintained by mtime sweep
+    every change gets increasing sequence number so clients can request changes since cursor"""
+
+    def __init__(self, folder: str, executor: ThreadPoolExecutor):
+        self.folder = folder
+        key = hashlib.sha256(os.path.abspath(folder).encode('utf-8')).hexdigest()[:16]
+        self.fn = os.path.join(paths.data_path, 'cache', 'gallery', f'{key}.json')
+        self.executor = executor
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict] = {} # relative path: entry
+        self.deleted: dict[str, int] = {} # relative path: seq of deletion
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.floor = 0 # oldest seq for which deletions are still known
+        self.swept = 0
+        self.sweeping = False
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.fn):
+            return
+        try:
+            with open(self.fn, 'rb') as f:
+                data = orjson.loads(f.read()) # pylint: disable=no-member
+            self.entries = data['entries']
+            self.deleted = data.get('deleted', {})
+            self.epoch = data['epoch']
+            self.seq = data['seq']
+            self.floor = data.get('floor', 0)
+            debug(f'Gallery index: load folder="{self.folder}" files={len(self.entries)} seq={self.seq}')
+        except Exception as e:
+            shared.log.warning(f'Gallery index: file="{self.fn}" {e}')
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = orjson.dumps({ 'folder': self.folder, 'epoch': self.epoch, 'seq': self.seq, 'floor': self.floor, 'entries': self.entries, 'deleted': self.deleted }) # pylint: disable=no-member
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.fn), exist_ok=True)
+            tmp = f'{self.fn}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.fn)
+        except Exception as e:
+            shared.log.error(f'Gallery index: file="{self.fn}" {e}')
+
+    def scan(self) -> dict:
+        found = {}
+        stack = [self.folder]
+        while len(stack) > 0:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir():
+                                stack.append(entry.path)
+                            elif entry.is_file():
+                                stat = entry.stat()
+                                found[os.path.relpath(entry.path, self.folder)] = (stat.st_size, stat.st_mtime)
+                        except OSError:
+                            continue
+            except OSError as e:
+                debug(f'Gallery index: folder="{current}" {e}')
+        return found
+
+    def update(self, rel: str, values: dict):
+        with self.lock:
+            entry = self.entries.get(rel, None)
+            if entry is None:
+                return
+            self.seq += 1
+            entry.update(values)
+            entry['seq'] = self.seq
+            self.dirty = True
+
+    def sweep(self):
+        """compare folder with index and record added, modified and deleted files"""
+        t0 = time.time()
+        found = self.scan()
+        added, modified, removed = [], [], []
+        with self.lock:
+            for rel in list(self.entries.keys()):
+                if rel not in found:
+                    self.seq += 1
+                    self.entries.pop(rel)
+                    self.deleted[rel] = self.seq
+                    removed.append(rel)
+            for rel, (size, mtime) in found.items():
+                entry = self.entries.get(rel, None)
+                if entry is not None and entry['size'] == size and entry['mtime'] == mtime:
+                    continue
+                self.seq += 1
+                (modified if entry is not None else added).append(rel)
+                self.entries[rel] = { 'file': rel, 'size': size, 'mtime': mtime, 'width': None, 'height': None, 'geninfo': None, 'seq': self.seq }
+                self.deleted.pop(rel, None)
+            if len(self.deleted) > MAX_DELETED:
+                ordered = sorted(self.deleted.items(), key=lambda kv: kv[1])
+                for rel, s in ordered[:len(ordered) - MAX_DELETED]:
+                    self.deleted.pop(rel)
+                    self.floor = max(self.floor, s)
+            if len(added) + len(modified) + len(removed) > 0:
+                self.dirty = True
+            self.swept = time.time()
+        pending = [rel for rel in added + modified if os.path.splitext(rel)[1].lower() in IMAGE_EXTENSIONS]
+        self.save()
+        if len(pending) > 0: # listing is usable immediately, dimensions and geninfo arrive later as regular changes
+            self.executor.submit(self.extract, pending)
+        t1 = time.time()
+        shared.log.debug(f'Gallery index: sweep folder="{self.folder}" files={len(found)} added={len(added)} modified={len(modified)} removed={len(removed)} metadata={len(pending)} seq={self.seq} time={t1-t0:.3f}')
+
+    def extract(self, pending: list):
+        t0 = time.time()
+        for i, rel in enumerate(pending):
+            self.update(rel, read_metadata(os.path.join(self.folder, rel)))
+            if i % 1000 == 999:
+                self.save()
+        self.save()
+        debug(f'Gallery index: metadata folder="{self.folder}" files={len(pending)} time={time.time()-t0:.3f}')
+
+    def background(self):
+        try:
+            self.sweep()
+        except Exception as e:
+            shared.log.error(f'Gallery index: folder="{self.folder}" {e}')
+        finally:
+            self.sweeping = False
+
+    def refresh(self, wait: bool = False):
+        """start sweep when index is older than configured interval, blocks only when index was never built"""
+        if wait and self.swept == 0 and len(self.entries) == 0:
+            self.sweep()
+            return
+        if self.sweeping or time.time() - self.swept < shared.opts.browser_index_interval:
+            return
+        self.sweeping = True
+        self.executor.submit(self.background)
+
+    def cursor(self) -> str:
+        return f'{self.epoch}:{self.seq}'
+
+    def listing(self, sort: str = 'mtime', order: str = 'desc', offset: int = 0, limit: int = 0) -> dict:
+        with self.lock:
+            entries = list(self.entries.values())
+            cursor = self.cursor()
+        if sort == 'name':
+            entries.sort(key=lambda e: e['file'].lower(), reverse=order == 'desc')
+        else:
+            entries.sort(key=lambda e: (e[sort], e['file']), reverse=order == 'desc')
+        items = entries[offset:offset + limit] if limit > 0 else entries[offset:]
+        return { 'folder': self.folder, 'cursor': cursor, 'total': len(entries), 'offset': offset, 'items': items }
+
+    def changes(self, cursor: str) -> dict:
+        """entries changed and files deleted since cursor, cursor from different epoch requires full reload"""
+        try:
+            epoch, seq = cursor.split(':', 1)
+            seq = int(seq)
+        except Exception:
+            epoch, seq = None, -1
+        with self.lock:
+            if epoch != self.epoch or seq > self.seq or seq < self.floor:
+                return { 'folder': self.folder, 'cursor': self.cursor(), 'reset': True, 'changed': [], 'deleted': [] }
+            changed = sorted([e for e in self.entries.values() if e['seq'] > seq], key=lambda e: e['seq'])
+            deleted = [rel for rel, s in self.deleted.items() if s > seq]
+            return { 'folder': self.folder, 'cursor': self.cursor(), 'reset': False, 'changed': changed, 'deleted': deleted }
+
+    def files(self) -> list:
+        with self.lock:
+            return [os.path.join(self.folder, rel) for rel in self.entries]
+
+
+class GalleryIndex:
+    def __init__(self, workers: int = 2):
+        self.folders: dict[str, FolderIndex] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sd-gallery-index')
+
+    @property
+    def enabled(self) -> bool:
+        return shared.opts.browser_index
+
+    def get(self, folder: str, wait: bool = True) -> FolderIndex:
+        if not os.path.isdir(folder):
+            raise FileNotFoundError(f'folder not found: {folder}')
+        with self.lock:
+            index = self.folders.get(folder, None)
+            if index is None:
+                index = FolderIndex(folder, self.executor)
+                self.folders[folder] = index
+        index.refresh(wait=wait)
+        return index
+
+    def stats(self):
+        return { folder: { 'files': len(index.entries), 'seq': index.seq, 'swept': index.swept, 'sweeping': index.sweeping } for folder, index in self.folders.items() }
@@ -1,11 +1,15 @@
+import json
+import time
 from threading import Lock
 from fastapi.responses import JSONResponse
 from modules import errors, shared, scripts_manager, ui
-from modules.api import models, script, helpers
+from modules.api import models, script, helpers, jobs
 from modules.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, process_images
+from modules.processing_helpers import get_fixed_seed
 
 
 errors.install()
+batch_fields = ['prompt', 'negative_prompt', 'seed', 'subseed', 'send_images'] # fields which may differ between requests merged into single batch
 
 
 class APIGenerate():
@@ -110,6 +114,7 @@ class APIGenerate():
             for key, value in getattr(txt2imgreq, "extra", {}).items():
                 setattr(p, key, value)
             jobid = shared.state.begin('API-TXT', api=True)
+            jobs.acquired(jobid)
             script_args = script.init_script_args(p, txt2imgreq, self.default_script_arg_txt2img, selectable_scripts, selectable_script_idx, script_runner)
             p.script_args = tuple(script_args) # Need to pass args as tuple here
             if selectable_scripts is not None:
@@ -122,11 +127,83 @@ class APIGenerate():
         if processed is None or processed.images is None or len(processed.images) == 0:
             b64images = []
         else:
-            b64images = list(map(helpers.encode_pil_to_base64, processed.images)) if send_images else []
+            b64images = helpers.encode_images(processed.images) if send_images else []
         self.sanitize_b64(txt2imgreq)
         info = processed.js() if processed else ''
         return models.ResTxt2Img(images=b64images, parameters=vars(txt2imgreq), info=info)
 
+    def batch_key(self, txt2imgreq: models.ReqTxt2Img):
+        """compatibility key of requests that can be merged into single batched pipeline call or none if request cannot be batched"""
+        if txt2imgreq.script_name or txt2imgreq.script_args or txt2imgreq.alwayson_scripts or txt2imgreq.ip_adapter or txt2imgreq.face or txt2imgreq.extra:
+            return None
+        if txt2imgreq.batch_size != 1 or txt2imgreq.n_iter != 1 or not isinstance(txt2imgreq.prompt, str) or not isinstance(txt2imgreq.negative_prompt, str):
+            return None
+        args = { k: v for k, v in vars(txt2imgreq).items() if k not in batch_fields }
+        return json.dumps(args, sort_keys=True, default=str)
+
+    def post_text2img_batch(self, requests: list[models.ReqTxt2Img]):
+        """run compatible requests as single batch and split images and infotexts back per request"""
+        t0 = time.time()
+        script_runner = scripts_manager.scripts_txt2img
+        if not script_runner.scripts:
+            script_runner.initialize_scripts(False)
+            ui.create_ui(None)
+        if not self.default_script_arg_txt2img:
+            self.default_script_arg_txt2img = script.init_default_script_args(script_runner)
+        txt2imgreq = requests[0]
+        populate = txt2imgreq.copy(update={
+            "sampler_name": helpers.validate_sampler_name(txt2imgreq.sampler_name or txt2imgreq.sampler_index),
+            "do_not_save_samples": not txt2imgreq.save_images,
+            "do_not_save_grid": True,
+            "prompt": [req.prompt for req in requests],
+            "negative_prompt": [req.negative_prompt for req in requests],
+            "seed": [get_fixed_seed(req.seed) for req in requests],
+            "subseed": [get_fixed_seed(req.subseed) for req in requests],
+            "batch_size": len(requests),
+            "n_iter": 1,
+        })
+        if populate.sampler_name:
+            populate.sampler_index = None
+        args = self.sanitize_args(populate)
+        args.pop('send_images', True)
+        with self.queue_lock:
+            p = StableDiffusionProcessingTxt2Img(sd_model=shared.sd_model, **args)
+            p.scripts = script_runner
+            p.outpath_grids = shared.opts.outdir_grids or shared.opts.outdir_txt2img_grids
+            p.outpath_samples = shared.opts.outdir_samples or shared.opts.outdir_txt2img_samples
+            jobid = shared.state.begin('API-TXT', api=True)
+            jobs.acquired(jobid)
+            script_args = script.init_script_args(p, txt2imgreq, self.default_script_arg_txt2img, None, None, script_runner)
+            p.script_args = tuple(script_args)
+            processed = process_images(p)
+            processed = scripts_manager.scripts_txt2img.after(p, processed, *script_args)
+            p.close()
+            shared.state.end(jobid)
+        images = processed.images[processed.index_of_first_image:] if processed is not None and processed.images is not None else []
+        infotexts = processed.infotexts[processed.index_of_first_image:] if processed is not None else []
+        info = json.loads(processed.js()) if processed is not None else {}
+        per = max(1, len(images) // len(requests))
+        if len(images) % len(requests) != 0:
+            shared.log.warning(f'API batch: requests={len(requests)} images={len(images)} mismatch')
+        results = []
+        for i, req in enumerate(requests):
+            item = info.copy()
+            for field in ['all_prompts', 'all_negative_prompts', 'all_seeds', 'all_subseeds']:
+                item[field] = info.get(field, [])[i:i+1]
+            item['prompt'] = item['all_prompts'][0] if len(item['all_prompts']) > 0 else req.prompt
+            item['negative_prompt'] = item['all_negative_prompts'][0] if len(item['all_negative_prompts']) > 0 else req.negative_prompt
+            item['seed'] = item['all_seeds'][0] if len(item['all_seeds']) > 0 else req.seed
+            item['subseed'] = item['all_subseeds'][0] if len(item['all_subseeds']) > 0 else req.subseed
+            item['batch_size'] = 1
+            item['index_of_first_image'] = 0
+            item['infotexts'] = infotexts[i*per:(i+1)*per]
+            b64images = helpers.encode_images(images[i*per:(i+1)*per]) if req.send_images else []
+            self.sanitize_b64(req)
+            results.append(models.ResTxt2Img(images=b64images, parameters=vars(req), info=json.dumps(item)))
+        t1 = time.time()
+        shared.log.debug(f'API batch: requests={len(requests)} images={len(images)} time={t1-t0:.2f} its={(p.steps * len(images)) / (t1 - t0):.2f}')
+        return results
+
     def post_img2img(self, img2imgreq: models.ReqImg2Img):
         self.prepare_face_module(img2imgreq)
         init_images = img2imgreq.init_images
@@ -162,6 +239,7 @@ class APIGenerate():
             for key, value in getattr(img2imgreq, "extra", {}).items():
                 setattr(p, key, value)
             jobid = shared.state.begin('API-IMG', api=True)
+            jobs.acquired(jobid)
             script_args = script.init_script_args(p, img2imgreq, self.default_script_arg_img2img, selectable_scripts, selectable_script_idx, script_runner)
             p.script_args = tuple(script_args) # Need to pass args as tuple here
             if selectable_scripts is not None:
@@ -174,7 +252,7 @@ class APIGenerate():
         if processed is None or processed.images is None or len(processed.images) == 0:
             b64images = []
         else:
-            b64images = list(map(helpers.encode_pil_to_base64, processed.images)) if send_images else []
+            b64images = helpers.encode_images(processed.images) if send_images else []
         if not img2imgreq.include_init_images:
             img2imgreq.init_images = None
             img2imgreq.mask = None
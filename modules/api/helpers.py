@@ -1,5 +1,6 @@
 import io
 import base64
+import threading
 from PIL import Image, PngImagePlugin
 import piexif
 import piexif.helper
@@ -7,6 +8,9 @@ from fastapi.exceptions import HTTPException
 from modules import shared, sd_samplers
 
 
+transport = threading.local() # per-request binary transport: inputs are raw uploaded parts referenced as part:<n> and outputs are images referenced as result:<n>
+
+
 def validate_sampler_name(name):
     config = sd_samplers.all_samplers_map.get(name, None)
     if config is None:
@@ -17,6 +21,16 @@ def validate_sampler_name(name):
 def decode_base64_to_image(encoding, quiet=False):
     if encoding is None:
         return None
+    if isinstance(encoding, Image.Image):
+        return encoding
+    if isinstance(encoding, str) and encoding.startswith("part:") and getattr(transport, 'inputs', None) is not None:
+        try:
+            return Image.open(io.BytesIO(transport.inputs[int(encoding[5:])]))
+        except Exception as e:
+            shared.log.warning(f'API cannot decode image: part={encoding} {e}')
+            if not quiet:
+                raise HTTPException(status_code=422, detail=f"Invalid image part: {encoding}") from e
+            return None
     if encoding.startswith("data:image/"):
         encoding = encoding.split(";")[1].split(",")[1]
     try:
@@ -49,6 +63,18 @@ def encode_pil_to_base64(image):
     return b64
 
 
+def encode_images(images: list):
+    """encode images as base64 or when binary transport is active reference them by part id"""
+    outputs = getattr(transport, 'outputs', None)
+    if outputs is None:
+        return list(map(encode_pil_to_base64, images))
+    parts = []
+    for image in images:
+        parts.append(f'result:{len(outputs)}')
+        outputs.append(image)
+    return parts
+
+
 def upscaler_to_index(name: str):
     try:
         return [x.name.lower() for x in shared.sd_upscalers].index(name.lower())
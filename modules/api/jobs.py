@@ -0,0 +1,365 @@
+import time
+import uuid
+import base64
+import threading
+from secrets import compare_digest
+from collections import OrderedDict, deque
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from modules import shared, progress
+from modules.api import models
+
+
+max_priority = 10 # client priority is clamped to +/- range, positive priority requires authenticated user
+local = threading.local() # jobs executed by worker thread, used by generate handlers once they hold queue lock
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, fn, req, user: str, priority: int = 0, key: str = None, batch_fn = None):
+        self.id = uuid.uuid4().hex[:15]
+        self.kind = kind
+        self.fn = fn
+        self.req = req
+        self.user = user
+        self.priority = priority
+        self.status = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.key = key # jobs with same key can be merged into single batch
+        self.batch_fn = batch_fn
+        self.batch = None
+        self.state_id = None # shared.state job id opened by handler once it holds queue lock
+        self.cancel_requested = False # cancel received while job was waiting for queue lock
+
+    def dict(self, position: int = None):
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'user': self.user,
+            'priority': self.priority,
+            'status': self.status,
+            'position': position,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'wait': round((self.started or time.time()) - self.submitted, 3) if self.status != 'cancelled' else None,
+            'duration': round(self.finished - self.started, 3) if self.finished and self.started else None,
+            'batch': self.batch,
+            'error': self.error,
+        }
+
+
+class JobScheduler:
+    """priority job queue with fifo round-robin fairness between users within same priority, executed by single worker thread"""
+
+    def __init__(self, history: int = 100):
+        self.lock = threading.Condition()
+        self.queues: dict[int, OrderedDict[str, deque]] = {} # priority: user: jobs
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+        self.history = history
+        self.thread: threading.Thread = None
+        self.current: Job = None
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.wait_time = 0
+        self.run_time = 0
+        self.batches = deque(maxlen=history)
+
+    def submit(self, kind: str, fn, req, user: str, priority: int = 0, key: str = None, batch_fn = None) -> Job:
+        job = Job(kind, fn, req, user, priority, key, batch_fn)
+        with self.lock:
+            self.queues.setdefault(priority, OrderedDict()).setdefault(user, deque()).append(job)
+            self.jobs[job.id] = job
+            progress.add_task_to_queue(job.id)
+            self.lock.notify()
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.worker, name='sd-api-jobs', daemon=True)
+            self.thread.start()
+        shared.log.debug(f'API job: submit id={job.id} type={kind} user={user} priority={priority} depth={self.depth()}')
+        return job
+
+    def depth(self) -> int:
+        return sum(len(jobs) for users in self.queues.values() for jobs in users.values())
+
+    def order(self) -> list:
+        """simulated dispatch order of queued jobs"""
+        ordered = []
+        for priority in sorted(self.queues.keys(), reverse=True):
+            users = [list(jobs) for jobs in self.queues[priority].values()]
+            while any(users):
+                for jobs in users:
+                    if len(jobs) > 0:
+                        ordered.append(jobs.pop(0))
+        return ordered
+
+    def position(self, job: Job):
+        if job.status != 'queued':
+            return None
+        with self.lock:
+            ordered = self.order()
+        return ordered.index(job) if job in ordered else None
+
+    def next(self) -> Job:
+        for priority in sorted(self.queues.keys(), reverse=True):
+            users = self.queues[priority]
+            if len(users) == 0:
+                continue
+            user, jobs = next(iter(users.items()))
+            job = jobs.popleft()
+            users.pop(user)
+            if len(jobs) > 0:
+                users[user] = jobs # rotate user to end of round-robin
+            if len(users) == 0:
+                self.queues.pop(priority)
+            return job
+        return None
+
+    def collect(self, job: Job) -> list:
+        """wait up to configured time for queued jobs compatible with job and merge them into single batch"""
+        batch = [job]
+        wait = shared.opts.api_batch_wait / 1000
+        size = shared.opts.api_batch_size
+        if job.key is None or job.batch_fn is None or wait <= 0 or size <= 1:
+            return batch
+        deadline = time.time() + wait
+        with self.lock:
+            while len(batch) < size:
+                for queued in self.order():
+                    if len(batch) >= size:
+                        break
+                    if queued.key == job.key and queued.priority == job.priority:
+                        self.remove(queued)
+                        batch.append(queued)
+                remaining = deadline - time.time()
+                if len(batch) >= size or remaining <= 0:
+                    break
+                self.lock.wait(remaining)
+            now = time.time()
+            for queued in batch[1:]:
+                queued.status = 'running'
+                queued.started = now
+                progress.pending_tasks.pop(queued.id, None)
+        return batch
+
+    def execute(self, batch: list):
+        t0 = time.time()
+        for job in batch:
+            job.batch = len(batch)
+            self.wait_time += job.started - job.submitted
+        local.jobs = batch
+        try:
+            if len(batch) == 1:
+                results = [batch[0].fn(batch[0].req)] # generate handler holds queue lock and shared.state job accounting
+            else:
+                results = batch[0].batch_fn([job.req for job in batch])
+            for job, result in zip(batch, results):
+                if job.cancel_requested:
+                    job.status = 'cancelled'
+                    self.cancelled += 1
+                    continue
+                job.result = result
+                job.status = 'done'
+                self.completed += 1
+        except JobCancelled:
+            for job in batch:
+                job.status = 'cancelled'
+                self.cancelled += 1
+            shared.log.debug(f'API job: id={[job.id for job in batch]} cancelled before start')
+        except Exception as e:
+            for job in batch:
+                job.status = 'failed'
+                job.error = str(e)
+                self.failed += 1
+            shared.log.error(f'API job: id={[job.id for job in batch]} type={batch[0].kind} {e}')
+        finally:
+            local.jobs = None
+        t1 = time.time()
+        for job in batch:
+            job.finished = t1
+            self.run_time += job.finished - job.started
+        if len(batch) > 1:
+            latency = [job.finished - job.submitted for job in batch]
+            stats = {
+                'size': len(batch),
+                'type': batch[0].kind,
+                'time': round(t1 - t0, 3),
+                'throughput': round(len(batch) / (t1 - t0), 3) if t1 > t0 else 0,
+                'latency_avg': round(sum(latency) / len(latency), 3),
+                'latency_max': round(max(latency), 3),
+                'finished': t1,
+            }
+            self.batches.append(stats)
+            shared.log.debug(f'API job: batch ids={[job.id for job in batch]} {stats}')
+        for job in batch:
+            shared.log.debug(f'API job: finish id={job.id} status={job.status} batch={job.batch} wait={job.started-job.submitted:.2f} time={job.finished-job.started:.2f} depth={self.depth()}')
+
+    def worker(self):
+        while True:
+            with self.lock:
+                job = self.next()
+                while job is None:
+                    self.lock.wait()
+                    job = self.next()
+                self.current = job
+                job.status = 'running'
+                job.started = time.time()
+                progress.pending_tasks.pop(job.id, None)
+            batch = self.collect(job)
+            self.execute(batch)
+            with self.lock:
+                self.current = None
+                self.trim()
+
+    def trim(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in {'done', 'failed', 'cancelled'}]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            self.jobs.pop(job_id, None)
+
+    def remove(self, job: Job):
+        jobs = self.queues.get(job.priority, {}).get(job.user, None)
+        if jobs is not None and job in jobs:
+            jobs.remove(job)
+            if len(jobs) == 0:
+                self.queues[job.priority].pop(job.user, None)
+            if len(self.queues.get(job.priority, {})) == 0:
+                self.queues.pop(job.priority, None)
+
+    def cancel(self, job: Job) -> bool:
+        with self.lock:
+            if job.status == 'running':
+                if job.state_id is None: # still waiting for queue lock held by another task, handler cancels once it acquires lock
+                    job.cancel_requested = True
+                    return True
+                if job.batch == 1 and job.state_id == shared.state.id: # interrupt only own generate, never other task or shared batch
+                    shared.state.interrupt()
+                    return True
+                return False
+            if job.status != 'queued':
+                return False
+            self.remove(job)
+            job.status = 'cancelled'
+            job.finished = time.time()
+            progress.pending_tasks.pop(job.id, None)
+            self.cancelled += 1
+            self.trim()
+        return True
+
+    def metrics(self, user: str = None):
+        """queue metrics, if user is set only jobs owned by that user are listed by id"""
+        with self.lock:
+            ordered = self.order()
+            now = time.time()
+            waits = [now - job.submitted for job in ordered]
+            users = {}
+            for job in ordered:
+                users[job.user] = users.get(job.user, 0) + 1
+            started = self.completed + self.failed
+            batches = list(self.batches)
+            return {
+                'depth': len(ordered),
+                'running': self.current.id if self.current is not None and (user is None or self.current.user == user) else None,
+                'users': users if user is None else len(users),
+                'priorities': { priority: sum(len(jobs) for jobs in queue.values()) for priority, queue in self.queues.items() },
+                'wait_max': round(max(waits), 3) if len(waits) > 0 else 0,
+                'wait_avg': round(sum(waits) / len(waits), 3) if len(waits) > 0 else 0,
+                'wait_avg_started': round(self.wait_time / started, 3) if started > 0 else 0,
+                'run_avg': round(self.run_time / started, 3) if started > 0 else 0,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'batches': {
+                    'count': len(batches),
+                    'size_avg': round(sum(b['size'] for b in batches) / len(batches), 3) if len(batches) > 0 else 0,
+                    'throughput_avg': round(sum(b['throughput'] for b in batches) / len(batches), 3) if len(batches) > 0 else 0,
+                    'latency_avg': round(sum(b['latency_avg'] for b in batches) / len(batches), 3) if len(batches) > 0 else 0,
+                    'recent': batches[-10:],
+                },
+                'queue': [job.dict(i) for i, job in enumerate(ordered) if user is None or job.user == user],
+            }
+
+
+def acquired(jobid: str):
+    """called by generate handler after it holds queue lock and opened state job, ends state and raises if api job was cancelled while waiting"""
+    batch = getattr(local, 'jobs', None)
+    if batch is None: # direct api call, not executed by job scheduler
+        return
+    with scheduler.lock:
+        for job in batch:
+            job.state_id = jobid
+        cancelled = all(job.cancel_requested for job in batch)
+    if cancelled:
+        shared.state.end(jobid)
+        raise JobCancelled
+
+
+def get_user(request: Request):
+    """identify submitting user by verified basic auth user or session token, otherwise by client address
+    returns user and whether user is authenticated"""
+    credentials = getattr(shared.api, 'credentials', None) or {}
+    auth = request.headers.get('authorization', '')
+    if len(credentials) > 0 and auth.lower().startswith('basic '):
+        try:
+            user, password = base64.b64decode(auth[6:]).decode().split(':', 1)
+            if user in credentials and compare_digest(password, credentials[user]):
+                return user, True
+        except Exception:
+            pass
+    token = request.cookies.get("access-token") or request.cookies.get("access-token-unsecure")
+    tokens = getattr(request.app, 'tokens', None) or {}
+    if token is not None and token in tokens:
+        return tokens[token], True
+    return (request.client.host if request.client is not None else 'unknown'), False
+
+
+def get_priority(priority: int, authenticated: bool) -> int:
+    return max(-max_priority, min(priority, max_priority if authenticated else 0))
+
+
+scheduler = JobScheduler()
+
+
+def register_api(generate):
+
+    def post_job_txt2img(req: models.ReqTxt2Img, request: Request, priority: int = 0):
+        user, authenticated = get_user(request)
+        job = scheduler.submit('txt2img', generate.post_text2img, req, user, get_priority(priority, authenticated), key=generate.batch_key(req), batch_fn=generate.post_text2img_batch)
+        return job.dict(scheduler.position(job))
+
+    def post_job_img2img(req: models.ReqImg2Img, request: Request, priority: int = 0):
+        user, authenticated = get_user(request)
+        job = scheduler.submit('img2img', generate.post_img2img, req, user, get_priority(priority, authenticated))
+        return job.dict(scheduler.position(job))
+
+    def get_job(job_id: str, request: Request):
+        job = scheduler.jobs.get(job_id, None)
+        if job is None or job.user != get_user(request)[0]: # jobs of other users are not disclosed
+            return JSONResponse({ "error": f"job {job_id}: not found" }, status_code=404)
+        res = job.dict(scheduler.position(job))
+        if job.status == 'done':
+            res['result'] = job.result
+        return res
+
+    def delete_job(job_id: str, request: Request):
+        job = scheduler.jobs.get(job_id, None)
+        if job is None or job.user != get_user(request)[0]:
+            return JSONResponse({ "error": f"job {job_id}: not found" }, status_code=404)
+        if not scheduler.cancel(job):
+            return JSONResponse({ "error": f"job {job_id}: cannot cancel job with status={job.status}" }, status_code=409)
+        return job.dict()
+
+    def get_jobs(request: Request):
+        return scheduler.metrics(get_user(request)[0])
+
+    shared.api.add_api_route("/sdapi/v1/jobs", get_jobs, methods=["GET"])
+    shared.api.add_api_route("/sdapi/v1/jobs/txt2img", post_job_txt2img, methods=["POST"])
+    shared.api.add_api_route("/sdapi/v1/jobs/img2img", post_job_img2img, methods=["POST"])
+    shared.api.add_api_route("/sdapi/v1/jobs/{job_id}", get_job, methods=["GET"])
+    shared.api.add_api_route("/sdapi/v1/jobs/{job_id}", delete_job, methods=["DELETE"])
@@ -382,6 +382,22 @@ class ReqVQA(BaseModel):
     question: str = Field(default="describe the image", title="Question", description="Question to ask the model.")
     system: str = Field(default="You are image captioning expert, creative, unbiased and uncensored.", title="System prompt", description="Prompt to shape how the model interprets and responds to user prompts.")
 
+class ReqGenerationLog(BaseModel):
+    filename: Optional[str] = Field(default=None, title="Filename", description="Exact image filename with or without extension")
+    seed: Optional[int] = Field(default=None, title="Seed", description="Image seed")
+    since: Optional[str] = Field(default=None, title="Since", description="Include records at or after ISO timestamp")
+    until: Optional[str] = Field(default=None, title="Until", description="Include records at or before ISO timestamp")
+    search: Optional[str] = Field(default=None, title="Search", description="Search string in generation parameters")
+    limit: int = Field(default=100, title="Limit", description="Maximum number of records to return")
+    offset: int = Field(default=0, title="Offset", description="Number of records to skip")
+
+class ItemGenerationLog(BaseModel):
+    id: int = Field(title="ID", description="Record ID")
+    filename: str = Field(title="Filename", description="Image filename without extension")
+    seed: Optional[int] = Field(default=None, title="Seed", description="Image seed")
+    time: str = Field(title="Time", description="Record ISO timestamp")
+    info: Optional[str] = Field(default=None, title="Info", description="Generation parameters")
+
 class ReqLatentHistory(BaseModel):
     name: str = Field(title="Name", description="Name of the history item to select")
 
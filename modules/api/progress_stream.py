@@ -0,0 +1,209 @@
+import io
+import os
+import json
+import time
+import base64
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from modules import shared
+from modules.api.gallery import ConnectionManager
+
+
+debug = shared.log.debug if os.environ.get('SD_PREVIEW_DEBUG', None) is not None else lambda *args, **kwargs: None
+queue_size = 16 # slow clients drop oldest events instead of stalling broadcast
+ws_send_timeout = 10 # seconds, websocket client that cannot accept a frame within timeout is disconnected
+sse_keepalive = 15 # seconds
+
+
+class ProgressStream:
+    """single poller of shared.state that pushes progress and job events to websocket and sse subscribers, live preview is encoded once per id_live_preview"""
+
+    def __init__(self):
+        self.manager = ConnectionManager()
+        self.previews: dict = {} # subscriber: wants preview
+        self.sockets: dict[WebSocket, asyncio.Queue] = {} # websocket: outgoing messages drained by per-client sender task
+        self.queues: list[asyncio.Queue] = []
+        self.task: asyncio.Task = None
+        self.job = None
+        self.last = None
+        self.id_live_preview = -1
+        self.encoded = 0
+        self.sent = 0
+
+    def subscribers(self) -> int:
+        return len(self.sockets) + len(self.queues)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while self.subscribers() > 0:
+            try:
+                await self.tick()
+            except Exception as e:
+                debug(f'Progress stream: {e}')
+            await asyncio.sleep(max(shared.opts.live_preview_refresh_period, 50) / 1000)
+        self.job = None
+        self.last = None
+        debug(f'Progress stream: idle encoded={self.encoded} sent={self.sent}')
+
+    def status(self):
+        state = shared.state
+        step = max(state.sampling_step, 0)
+        steps = max(state.sampling_steps, 1)
+        job_no = max(state.job_no, 0)
+        job_count = max(state.job_count, 1)
+        progress = min((steps * job_no + step) / (steps * job_count), 1)
+        elapsed = time.time() - state.time_start if state.time_start is not None else 0
+        eta = (elapsed / progress) - elapsed if progress > 0 else None
+        return {
+            'type': 'progress',
+            'id': state.id,
+            'job': state.job,
+            'step': step,
+            'steps': steps,
+            'job_no': job_no,
+            'job_count': job_count,
+            'progress': round(progress, 2),
+            'eta': round(eta, 2) if eta is not None else None,
+            'textinfo': state.textinfo,
+            'paused': state.paused,
+            'id_live_preview': state.id_live_preview,
+        }
+
+    def preview(self):
+        state = shared.state
+        if state.api:
+            state.do_set_current_image()
+        else:
+            state.set_current_image()
+        id_live_preview, image = state.id_live_preview, state.current_image
+        if image is None or id_live_preview == self.id_live_preview:
+            return None, None
+        self.id_live_preview = id_live_preview
+        buffered = io.BytesIO()
+        image.save(buffered, format='jpeg', quality=60)
+        self.encoded += 1
+        return id_live_preview, buffered.getvalue()
+
+    async def tick(self):
+        state = shared.state
+        active = state.job != '' and state.job_count > 0
+        job = (state.id, state.job) if active else None
+        if job != self.job:
+            if self.job is not None:
+                await self.publish({ 'type': 'job', 'event': 'end', 'id': self.job[0], 'job': self.job[1], 'timestamp': time.time() })
+            if job is not None:
+                await self.publish({ 'type': 'job', 'event': 'start', 'id': job[0], 'job': job[1], 'timestamp': state.time_start })
+            self.job = job
+            self.last = None
+            self.id_live_preview = -1 # state.begin restarts preview ids
+        if not active:
+            return
+        status = self.status()
+        changed = { k: v for k, v in status.items() if k != 'eta' }
+        if changed != self.last:
+            self.last = changed
+            await self.publish(status)
+        if any(self.previews.values()):
+            id_live_preview, data = await run_in_threadpool(self.preview)
+            if data is not None:
+                await self.publish_preview(id_live_preview, data)
+
+    def put(self, queue: asyncio.Queue, item):
+        if queue.full():
+            queue.get_nowait() # drop oldest so client resumes with latest state
+        queue.put_nowait(item)
+
+    def sse(self, event: str, data: str):
+        return f'event: {event}\ndata: {data}\n\n'
+
+    async def sender(self, ws: WebSocket, queue: asyncio.Queue):
+        """send queued messages to single websocket client so slow client cannot stall broadcast to others"""
+        try:
+            while True:
+                items = await queue.get()
+                for item in items: # preview header and binary frame are queued together
+                    await asyncio.wait_for(self.manager.send(ws, item), timeout=ws_send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            debug(f'Progress stream: client={ws.client.host} disconnect {e.__class__.__name__} {e}')
+            self.sockets.pop(ws, None)
+            try:
+                await asyncio.wait_for(ws.close(), timeout=ws_send_timeout)
+            except Exception:
+                pass
+
+    async def publish(self, msg: dict):
+        text = json.dumps(msg)
+        for queue in list(self.sockets.values()):
+            self.put(queue, [text])
+        for queue in list(self.queues):
+            self.put(queue, self.sse(msg['type'], text))
+
+    async def publish_preview(self, id_live_preview: int, data: bytes):
+        header = json.dumps({ 'type': 'preview', 'id_live_preview': id_live_preview, 'format': 'jpeg', 'size': len(data) })
+        for ws, queue in list(self.sockets.items()):
+            if self.previews.get(ws, False):
+                self.put(queue, [header, data]) # binary frame follows its header
+        queues = [queue for queue in self.queues if self.previews.get(queue, False)]
+        if len(queues) > 0:
+            text = json.dumps({ 'type': 'preview', 'id_live_preview': id_live_preview, 'image': f'data:image/jpeg;base64,{base64.b64encode(data).decode("ascii")}' })
+            for queue in queues:
+                self.put(queue, self.sse('preview', text))
+
+
+def register_api(app: FastAPI):
+    stream = ProgressStream()
+
+    @app.websocket("/sdapi/v1/progress/stream")
+    async def ws_progress(ws: WebSocket, preview: bool = True):
+        task = None
+        try:
+            await stream.manager.connect(ws)
+            stream.previews[ws] = preview
+            stream.sockets[ws] = asyncio.Queue(maxsize=queue_size)
+            task = asyncio.get_running_loop().create_task(stream.sender(ws, stream.sockets[ws]))
+            stream.start()
+            while True:
+                await ws.receive_text() # client messages are ignored, used only to detect disconnect
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            debug(f'Progress stream WS error: {e}')
+        if task is not None:
+            task.cancel()
+        stream.sockets.pop(ws, None)
+        stream.previews.pop(ws, None)
+        if ws in stream.manager.active:
+            stream.manager.disconnect(ws)
+
+    async def sse_progress(request: Request, preview: bool = True):
+        queue = asyncio.Queue(maxsize=queue_size)
+        stream.queues.append(queue)
+        stream.previews[queue] = preview
+        stream.start()
+        debug(f'Progress stream SSE connect: client={request.client.host if request.client else None}')
+
+        async def events():
+            try:
+                while not await request.is_disconnected():
+                    try:
+                        yield await asyncio.wait_for(queue.get(), timeout=sse_keepalive)
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+            finally:
+                stream.previews.pop(queue, None)
+                if queue in stream.queues:
+                    stream.queues.remove(queue)
+                debug(f'Progress stream SSE disconnect: client={request.client.host if request.client else None}')
+
+        return StreamingResponse(events(), media_type='text/event-stream', headers={ 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no' })
+
+    shared.api.add_api_route("/sdapi/v1/progress/stream", sse_progress, methods=["GET"])
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import torch
+import numpy as np
+from modules import shared, devices, paths
+
+
+baseline_settings = {
+    'teacache_enabled': False,
+    'para_cache_enabled': False,
+    'cache_dit_enabled': False,
+    'faster_cache_enabled': False,
+    'pab_enabled': False,
+}
+default_methods = { # method: list of settings, each setting is set of option overrides on top of baseline
+    'teacache': [{ 'teacache_enabled': True, 'teacache_profile': False, 'teacache_thresh': t } for t in [0.15, 0.25, 0.4]],
+    'cachedit': [{ 'cache_dit_enabled': True, 'cache_dit_threshold': t } for t in [0.08, 0.12, 0.2]],
+    'fastercache': [{ 'faster_cache_enabled': True }],
+    'pab': [{ 'pab_enabled': True }],
+    'fbcache': [{ 'para_cache_enabled': True, 'para_diff_threshold': 0.1 }], # cannot be removed from loaded model so only single setting is measured and it runs last
+}
+default_prompts = [
+    'photo of a red vintage car parked on a cobblestone street, golden hour',
+    'portrait of an old fisherman with a weathered face, studio lighting',
+    'watercolor painting of a mountain lake surrounded by pine trees',
+]
+default_seeds = [42, 1234]
+
+
+def reset_caches():
+    """remove step caches left on model by previous run since apply functions only install and never remove them"""
+    model = shared.sd_model
+    transformer = getattr(model, 'transformer', None)
+    if transformer is not None:
+        if getattr(transformer.__class__, 'enable_teacache', False):
+            transformer.__class__.enable_teacache = False
+        if hasattr(transformer, 'disable_cache'):
+            try:
+                transformer.disable_cache()
+            except Exception:
+                pass # no faster cache or pab installed
+    if getattr(model, 'has_cache_dit', False):
+        try:
+            import cache_dit
+            cache_dit.disable_cache(model)
+            model.has_cache_dit = False
+        except Exception as e:
+            shared.log.warning(f'Cache benchmark: cache-dit {e}')
+
+
+def supported(method: str):
+    transformer = getattr(shared.sd_model, 'transformer', None)
+    if transformer is None:
+        return 'model has no transformer'
+    if method == 'teacache' and not transformer.__class__.forward.__name__.startswith('teacache'):
+        return 'teacache forward not installed, load model with teacache enabled'
+    if method == 'fbcache':
+        from modules import para_attention
+        if not any(shared.sd_model.__class__.__name__.startswith(x) for x in para_attention.supported_models):
+            return 'model not supported'
+    if method in ['fastercache', 'pab'] and not hasattr(transformer, 'enable_cache'):
+        return 'model not supported'
+    return None
+
+
+def similarity(a, b):
+    """psnr and ssim on luminance computed with gaussian window, higher is closer to baseline"""
+    def luma(image):
+        return torch.from_numpy(np.array(image.convert('L'), dtype=np.float32) / 255.0).unsqueeze(0).unsqueeze(0)
+    if a.size != b.size:
+        b = b.resize(a.size)
+    x, y = luma(a), luma(b)
+    mse = torch.mean((x - y) ** 2).item()
+    psnr = 10 * torch.log10(torch.tensor(1.0 / mse)).item() if mse > 0 else 100.0
+    g = torch.exp(-(torch.arange(11, dtype=torch.float32) - 5) ** 2 / (2 * 1.5 ** 2))
+    g = g / g.sum()
+    window = torch.outer(g, g).reshape(1, 1, 11, 11)
+    blur = lambda t: torch.nn.functional.conv2d(t, window) # pylint: disable=unnecessary-lambda-assignment
+    mu_x, mu_y = blur(x), blur(y)
+    var_x, var_y, cov = blur(x * x) - mu_x ** 2, blur(y * y) - mu_y ** 2, blur(x * y) - mu_x * mu_y
+    c1, c2 = 0.01 ** 2, 0.03 ** 2
+    ssim = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2))
+    return psnr, ssim.mean().item()
+
+
+def generate(prompt: str, seed: int, settings: dict, params: dict):
+    from modules.processing import StableDiffusionProcessingTxt2Img, process_images
+    reset_caches()
+    p = StableDiffusionProcessingTxt2Img(
+        sd_model=shared.sd_model,
+        prompt=prompt,
+        seed=seed,
+        do_not_save_samples=True,
+        do_not_save_grid=True,
+        override_settings={ **baseline_settings, **settings },
+        **params,
+    )
+    if devices.device.type == 'cuda':
+        torch.cuda.synchronize(devices.device)
+        torch.cuda.reset_peak_memory_stats(devices.device)
+    t0 = time.time()
+    processed = process_images(p)
+    if devices.device.type == 'cuda':
+        torch.cuda.synchronize(devices.device)
+    t1 = time.time()
+    peak = torch.cuda.max_memory_allocated(devices.device) if devices.device.type == 'cuda' else None
+    p.close()
+    image = processed.images[0] if processed is not None and len(processed.images) > 0 else None
+    return image, t1 - t0, peak
+
+
+def run(methods: dict = None, prompts: list = None, seeds: list = None, steps: int = 20, width: int = 1024, height: int = 1024, cfg_scale: float = 3.5, sampler_name: str = 'Default', warmup: bool = True):
+    """run fixed prompt and seed matrix for uncached baseline and each cache method and setting, compare timing, memory and similarity to baseline"""
+    methods = methods if methods is not None else default_methods
+    prompts = prompts or default_prompts
+    seeds = seeds or default_seeds
+    params = { 'steps': steps, 'width': width, 'height': height, 'cfg_scale': cfg_scale, 'sampler_name': sampler_name }
+    matrix = [(prompt, seed) for prompt in prompts for seed in seeds]
+    t0 = time.time()
+    shared.log.info(f'Cache benchmark: model="{shared.sd_model.sd_checkpoint_info.name}" methods={list(methods)} prompts={len(prompts)} seeds={len(seeds)} params={params}')
+    if warmup:
+        generate(matrix[0][0], matrix[0][1], {}, params)
+    results = []
+    notes = []
+    baseline = {}
+
+    def measure(method: str, settings: dict):
+        walls, peaks, psnrs, ssims = [], [], [], []
+        for prompt, seed in matrix:
+            if shared.state.interrupted:
+                break
+            image, wall, peak = generate(prompt, seed, settings, params)
+            if image is None:
+                continue
+            walls.append(wall)
+            if peak is not None:
+                peaks.append(peak)
+            if method == 'none':
+                baseline[(prompt, seed)] = image
+            elif (prompt, seed) in baseline:
+                psnr, ssim = similarity(baseline[(prompt, seed)], image)
+                psnrs.append(psnr)
+                ssims.append(ssim)
+        if len(walls) == 0:
+            return { 'method': method, 'settings': settings, 'error': 'no images generated' }
+        wall = sum(walls) / len(walls)
+        return {
+            'method': method,
+            'settings': settings,
+            'images': len(walls),
+            'wall': round(wall, 3),
+            'its': round(steps / wall, 3),
+            'peak': round(max(peaks) / 1024 / 1024 / 1024, 3) if len(peaks) > 0 else None,
+            'psnr': round(sum(psnrs) / len(psnrs), 3) if len(psnrs) > 0 else None,
+            'ssim': round(sum(ssims) / len(ssims), 4) if len(ssims) > 0 else None,
+        }
+
+    try:
+        results.append(measure('none', {}))
+        for method, settings_list in sorted(methods.items(), key=lambda m: m[0] == 'fbcache'): # fbcache always runs last
+            reason = supported(method)
+            if reason is not None:
+                shared.log.warning(f'Cache benchmark: method={method} skip: {reason}')
+                results.append({ 'method': method, 'settings': {}, 'error': reason })
+                continue
+            for i, settings in enumerate(settings_list):
+                if shared.state.interrupted:
+                    break
+                if method == 'fbcache' and i > 0:
+                    results.append({ 'method': method, 'settings': settings, 'error': 'not measured: first-block cache from first setting cannot be changed' })
+                    continue
+                res = measure(method, settings)
+                shared.log.debug(f'Cache benchmark: {res}')
+                results.append(res)
+    finally:
+        reset_caches()
+        if any(res['method'] == 'fbcache' and 'wall' in res for res in results):
+            notes.append('first-block cache stays installed on loaded model until model is reloaded')
+            shared.log.warning(f'Cache benchmark: {notes[-1]}')
+    base_wall = results[0].get('wall', None)
+    for res in results:
+        res['speedup'] = round(base_wall / res['wall'], 3) if base_wall and res.get('wall', None) else None
+    report = {
+        'model': shared.sd_model.sd_checkpoint_info.name,
+        'cls': shared.sd_model.__class__.__name__,
+        'params': params,
+        'prompts': prompts,
+        'seeds': seeds,
+        'created': time.time(),
+        'time': round(time.time() - t0, 2),
+        'results': results,
+        'notes': notes,
+    }
+    fn = os.path.join(paths.data_path, 'benchmark', f'cache-{time.strftime("%Y%m%d-%H%M%S")}.json')
+    try:
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        report['file'] = fn
+    except Exception as e:
+        shared.log.error(f'Cache benchmark: file="{fn}" {e}')
+    print_table(report)
+    return report
+
+
+def print_table(report: dict):
+    from rich.table import Table
+    table = Table(title=f'Cache benchmark: model={report["model"]} steps={report["params"]["steps"]} size={report["params"]["width"]}x{report["params"]["height"]}')
+    for column in ['method', 'settings', 'wall', 'it/s', 'speedup', 'peak gb', 'psnr', 'ssim']:
+        table.add_column(column)
+    for res in report['results']:
+        settings = ' '.join(f'{k}={v}' for k, v in res['settings'].items() if not k.endswith('_enabled'))
+        if 'error' in res:
+            table.add_row(res['method'], settings, res['error'], '', '', '', '', '')
+            continue
+        table.add_row(res['method'], settings, str(res['wall']), str(res['its']), str(res['speedup']), str(res['peak']), str(res['psnr']), str(res['ssim']))
+    shared.console.print(table)
+    for note in report.get('notes', []):
+        shared.console.print(f'Note: {note}')
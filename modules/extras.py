@@ -103,32 +103,10 @@ def run_modelmerger(id_task, **kwargs):  # pylint: disable=unused-argument
     if kwargs.pop("unload", False):
         sd_models.unload_model_weights()
 
-    try:
-        theta_0 = merge.merge_models(**kwargs)
-    except Exception as e:
-        return fail(f"{e}")
-
-    try:
-        theta_0 = theta_0.to_dict() #TensorDict -> Dict if necessary
-    except Exception:
-        pass
-
-    bake_in_vae_filename = sd_vae.vae_dict.get(kwargs.get("bake_in_vae", None), None)
-    if bake_in_vae_filename is not None:
-        shared.log.info(f"Merge VAE='{bake_in_vae_filename}'")
-        shared.state.textinfo = 'Merge VAE'
-        vae_dict = sd_vae.load_vae_dict(bake_in_vae_filename)
-        for key in vae_dict.keys():
-            theta_0_key = 'first_stage_model.' + key
-            if theta_0_key in theta_0:
-                theta_0[theta_0_key] = to_half(vae_dict[key], kwargs.get("precision", "fp16") == "fp16")
-        del vae_dict
-
     ckpt_dir = shared.opts.ckpt_dir or sd_models.model_path
     filename = kwargs.get("custom_name", "Unnamed_Merge")
     filename += "." + kwargs.get("checkpoint_format", None)
     output_modelname = os.path.join(ckpt_dir, filename)
-    shared.state.textinfo = "merge saving"
     metadata = None
     if kwargs.get("save_metadata", False):
         metadata = {"format": "pt", "sd_merge_models": {}}
@@ -165,10 +143,54 @@ def run_modelmerger(id_task, **kwargs):  # pylint: disable=unused-argument
 
     if os.path.exists(output_modelname) and not kwargs.get("overwrite", False):
         return [*[gr.Dropdown.update(choices=sd_models.checkpoint_titles()) for _ in range(4)], f"Model alredy exists: {output_modelname}"]
-    if extension.lower() == ".safetensors":
-        safetensors.torch.save_file(theta_0, output_modelname, metadata=metadata)
+
+    bake_in_vae_filename = sd_vae.vae_dict.get(kwargs.get("bake_in_vae", None), None)
+    streaming = kwargs.pop("streaming", False)
+    if streaming and (extension.lower() != ".safetensors" or not all(m.lower().endswith(".safetensors") for m in kwargs["models"].values())):
+        shared.log.warning("Merge: streaming mode requires safetensors models, using in-memory merge")
+        streaming = False
+    if streaming and kwargs.get("re_basin", False):
+        shared.log.warning("Merge: streaming mode does not support rebasin, using in-memory merge")
+        streaming = False
+
+    if streaming:
+        overrides = {}
+        if bake_in_vae_filename is not None:
+            shared.log.info(f"Merge VAE='{bake_in_vae_filename}'")
+            vae_dict = sd_vae.load_vae_dict(bake_in_vae_filename)
+            overrides = {'first_stage_model.' + key: to_half(value, kwargs.get("precision", "fp16") == "fp16") for key, value in vae_dict.items()}
+            del vae_dict
+        shared.state.textinfo = "merge streaming"
+        try:
+            merge.merge_models_streaming(output_file=output_modelname, metadata=metadata, overrides=overrides, **kwargs)
+        except Exception as e:
+            return fail(f"{e}")
     else:
-        torch.save(theta_0, output_modelname)
+        try:
+            theta_0 = merge.merge_models(**kwargs)
+        except Exception as e:
+            return fail(f"{e}")
+
+        try:
+            theta_0 = theta_0.to_dict() #TensorDict -> Dict if necessary
+        except Exception:
+            pass
+
+        if bake_in_vae_filename is not None:
+            shared.log.info(f"Merge VAE='{bake_in_vae_filename}'")
+            shared.state.textinfo = 'Merge VAE'
+            vae_dict = sd_vae.load_vae_dict(bake_in_vae_filename)
+            for key in vae_dict.keys():
+                theta_0_key = 'first_stage_model.' + key
+                if theta_0_key in theta_0:
+                    theta_0[theta_0_key] = to_half(vae_dict[key], kwargs.get("precision", "fp16") == "fp16")
+            del vae_dict
+
+        shared.state.textinfo = "merge saving"
+        if extension.lower() == ".safetensors":
+            safetensors.torch.save_file(theta_0, output_modelname, metadata=metadata)
+        else:
+            torch.save(theta_0, output_modelname)
 
     t1 = time.time()
     shared.log.info(f"Merge complete: saved='{output_modelname}' time={t1-t0:.2f}")
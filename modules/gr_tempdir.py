@@ -46,6 +46,9 @@ def pil_to_temp_file(self, img: Image, dir: str, format="png") -> str: # pylint:
     """
     folder = dir
     already_saved_as = getattr(img, 'already_saved_as', None)
+    if already_saved_as is not None:
+        from modules import images
+        images.save_wait(already_saved_as) # image may still be queued in save worker pool
     exists = os.path.isfile(already_saved_as) if already_saved_as is not None else False
     debug(f'Image lookup: {already_saved_as} exists={exists}')
     if already_saved_as and exists:
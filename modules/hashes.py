@@ -1,22 +1,31 @@
+import time
+import mmap
 import hashlib
 import os.path
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from rich import progress, errors
 from modules import shared
 from modules.paths import data_path
+from modules.hashes_store import store
 
-cache_filename = os.path.join(data_path, "cache.json")
+cache_filename = os.path.join(data_path, "cache.json") # legacy read-only cache used as fallback for entries not yet in store
 cache_data = None
 progress_ok = True
+hash_thread: threading.Thread = None
+hash_block = 16 * 1024 * 1024 # read size, multiple of page size
+stats = { 'files': 0, 'bytes': 0, 'time': 0 }
 
 
 def init_cache():
     global cache_data # pylint: disable=global-statement
     if cache_data is None:
         cache_data = {} if not os.path.isfile(cache_filename) else shared.readfile(cache_filename, lock=True)
+    store.open()
 
 
 def dump_cache():
-    shared.writefile(cache_data, cache_filename)
+    store.commit()
 
 
 def cache(subsection):
@@ -28,31 +37,96 @@ def cache(subsection):
     return s
 
 
-def calculate_sha256(filename, quiet=False):
-    global progress_ok # pylint: disable=global-statement
+def hash_file(filename, offset: int = 0, callback=None):
+    """sha256 of file content from offset using large aligned reads overlapped with hashing or memory-mapped view
+    hashlib releases gil for large buffers so multiple files can be hashed concurrently in a thread pool"""
     hash_sha256 = hashlib.sha256()
-    blksize = 1024 * 1024
-    if not quiet:
-        if progress_ok:
-            try:
-                with progress.open(filename, 'rb', description=f'[cyan]Calculating hash: [yellow]{filename}', auto_refresh=True, console=shared.console) as f:
-                    for chunk in iter(lambda: f.read(blksize), b""):
+    size = os.path.getsize(filename)
+    if offset >= size:
+        return hash_sha256.hexdigest()
+    with open(filename, 'rb', buffering=0) as f:
+        if shared.opts.hash_mmap:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                for start in range(offset, size, hash_block):
+                    with view[start:start + hash_block] as chunk:
                         hash_sha256.update(chunk)
-            except errors.LiveError:
-                shared.log.warning('Hash: attempting to use function in a thread')
-                progress_ok = False
-        if not progress_ok:
-            with open(filename, 'rb') as f:
-                for chunk in iter(lambda: f.read(blksize), b""):
-                    hash_sha256.update(chunk)
-    else:
-        with open(filename, 'rb') as f:
-            for chunk in iter(lambda: f.read(blksize), b""):
-                hash_sha256.update(chunk)
+                        if callback is not None:
+                            callback(len(chunk))
+            return hash_sha256.hexdigest()
+        f.seek(offset)
+        buffers = [memoryview(bytearray(hash_block)), memoryview(bytearray(hash_block))]
+        first = hash_block - (offset % hash_block) # first read ends on block boundary so following reads are aligned
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='sd-hash-read') as reader:
+            i = 0
+            pending = reader.submit(f.readinto, buffers[i][:first])
+            while True:
+                n = pending.result()
+                if not n:
+                    break
+                current = buffers[i]
+                i = 1 - i
+                pending = reader.submit(f.readinto, buffers[i]) # read next block while current one is hashed
+                hash_sha256.update(current[:n])
+                if callback is not None:
+                    callback(n)
     return hash_sha256.hexdigest()
 
 
+def addnet_offset(filename):
+    with open(filename, 'rb') as f:
+        n = int.from_bytes(f.read(8), "little")
+    return n + 8
+
+
+def hash_progress(filename, offset: int = 0, quiet: bool = False):
+    """hash file with progress and throughput reported to console and shared state"""
+    global progress_ok # pylint: disable=global-statement
+    total = max(0, os.path.getsize(filename) - offset)
+    done = 0
+    t0 = time.time()
+
+    def update(n):
+        nonlocal done
+        done += n
+        stats['bytes'] += n
+        if not quiet:
+            shared.state.sampling_step = done // 1024 // 1024
+            shared.state.textinfo = f'Hash: {os.path.basename(filename)} {round(done/1024/1024/(time.time()-t0+1e-9))}MB/s'
+
+    if not quiet:
+        shared.state.sampling_steps = total // 1024 // 1024
+    if not quiet and progress_ok:
+        try:
+            with progress.Progress(progress.TextColumn('[cyan]Calculating hash: [yellow]{task.description}'), progress.BarColumn(), progress.DownloadColumn(), progress.TransferSpeedColumn(), console=shared.console) as pbar:
+                task = pbar.add_task(description=filename, total=total)
+
+                def update_pbar(n):
+                    update(n)
+                    pbar.update(task, advance=n)
+
+                value = hash_file(filename, offset, callback=update_pbar)
+        except errors.LiveError:
+            shared.log.warning('Hash: attempting to use function in a thread')
+            progress_ok = False
+    if quiet or not progress_ok:
+        value = hash_file(filename, offset, callback=update)
+    t1 = time.time()
+    stats['files'] += 1
+    stats['time'] += t1 - t0
+    if not quiet:
+        shared.log.debug(f'Hash: file="{filename}" size={total} time={t1-t0:.2f} rate={round(total/1024/1024/(t1-t0+1e-9))}MB/s mmap={shared.opts.hash_mmap}')
+    return value
+
+
+def calculate_sha256(filename, quiet=False):
+    return hash_progress(filename, 0, quiet=quiet)
+
+
 def sha256_from_cache(filename, title, use_addnet_hash=False):
+    kind = 'addnet' if use_addnet_hash else 'sha256'
+    cached_sha256 = store.get_hash(kind, filename)
+    if cached_sha256 is not None:
+        return cached_sha256
     hashes = cache("hashes-addnet") if use_addnet_hash else cache("hashes")
     if title not in hashes:
         return None
@@ -61,12 +135,11 @@ def sha256_from_cache(filename, title, use_addnet_hash=False):
     ondisk_mtime = os.path.getmtime(filename) if os.path.isfile(filename) else 0
     if ondisk_mtime > cached_mtime or cached_sha256 is None:
         return None
+    store.set_hash(kind, filename, cached_sha256, title) # migrate legacy entry
     return cached_sha256
 
 
-def sha256(filename, title, use_addnet_hash=False):
-    global progress_ok # pylint: disable=global-statement
-    hashes = cache("hashes-addnet") if use_addnet_hash else cache("hashes")
+def sha256(filename, title, use_addnet_hash=False, quiet=False):
     sha256_value = sha256_from_cache(filename, title, use_addnet_hash)
     if sha256_value is not None:
         return sha256_value
@@ -74,38 +147,78 @@ def sha256(filename, title, use_addnet_hash=False):
         return None
     if not os.path.isfile(filename):
         return None
-    jobid = shared.state.begin("Hash")
-    if use_addnet_hash:
-        if progress_ok:
-            try:
-                with progress.open(filename, 'rb', description=f'[cyan]Calculating hash: [yellow]{filename}', auto_refresh=True, console=shared.console) as f:
-                    sha256_value = addnet_hash_safetensors(f)
-            except errors.LiveError:
-                shared.log.warning('Hash: attempting to use function in a thread')
-                progress_ok = False
-        if not progress_ok:
-            with open(filename, 'rb') as f:
-                sha256_value = addnet_hash_safetensors(f)
-    else:
-        sha256_value = calculate_sha256(filename)
-    hashes[title] = {
-        "mtime": os.path.getmtime(filename),
-        "sha256": sha256_value
-    }
-    shared.state.end(jobid)
-    dump_cache()
+    jobid = shared.state.begin("Hash") if not quiet else None
+    offset = addnet_offset(filename) if use_addnet_hash else 0
+    sha256_value = hash_progress(filename, offset, quiet=quiet)
+    store.set_hash('addnet' if use_addnet_hash else 'sha256', filename, sha256_value, title)
+    if jobid is not None:
+        shared.state.end(jobid)
     return sha256_value
 
 
+def hash_items():
+    """list of (filename, title, use_addnet_hash, setter) for all known models that do not have cached hash"""
+    from modules import sd_checkpoint
+    from modules.lora import lora_load
+    items = []
+    for ckpt in list(sd_checkpoint.checkpoints_list.values()):
+        if ckpt.sha256 is None and os.path.isfile(ckpt.filename):
+            def set_ckpt(v, ckpt=ckpt):
+                ckpt.sha256 = v
+                ckpt.shorthash = v[0:10] if v is not None else None
+            items.append((ckpt.filename, f"checkpoint/{ckpt.name}", False, set_ckpt))
+    for net in list(lora_load.available_networks.values()):
+        if not net.hash and os.path.isfile(net.filename):
+            items.append((net.filename, f"lora/{net.name}", net.is_safetensors, net.set_hash))
+    return items
+
+
+def hash_all(threads: int = None):
+    """hash all known models without cached hash using thread pool, runs in background and does not block caller"""
+    global hash_thread # pylint: disable=global-statement
+    if shared.cmd_opts.no_hashing:
+        return None
+    if hash_thread is not None and hash_thread.is_alive():
+        return hash_thread
+    threads = threads or shared.opts.hash_threads
+
+    def run():
+        t0 = time.time()
+        items = hash_items()
+        done = 0
+        size = 0
+
+        def hash_item(item):
+            filename, title, use_addnet_hash, setter = item
+            try:
+                setter(sha256(filename, title, use_addnet_hash=use_addnet_hash, quiet=True))
+                return os.path.getsize(filename)
+            except Exception as e:
+                shared.log.error(f'Hash: file="{filename}" {e}')
+                return 0
+
+        with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='sd-hash') as executor:
+            for n in executor.map(hash_item, items):
+                done += 1
+                size += n
+        store.commit()
+        t1 = time.time()
+        if done > 0:
+            shared.log.info(f'Hash: background items={done} size={round(size/1024/1024/1024, 2)} threads={threads} time={t1-t0:.2f} rate={round(size/1024/1024/(t1-t0+1e-9))}MB/s')
+
+    hash_thread = threading.Thread(target=run, name='sd-hash', daemon=True)
+    hash_thread.start()
+    return hash_thread
+
+
 def addnet_hash_safetensors(b):
     """kohya-ss hash for safetensors from https://github.com/kohya-ss/sd-scripts/blob/main/library/train_util.py"""
     hash_sha256 = hashlib.sha256()
-    blksize = 1024 * 1024
     b.seek(0)
     header = b.read(8)
     n = int.from_bytes(header, "little")
     offset = n + 8
     b.seek(offset)
-    for chunk in iter(lambda: b.read(blksize), b""):
+    for chunk in iter(lambda: b.read(hash_block), b""):
         hash_sha256.update(chunk)
     return hash_sha256.hexdigest()
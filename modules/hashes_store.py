@@ -0,0 +1,121 @@
+import os
+import time
+import json
+import atexit
+import sqlite3
+import threading
+from modules import shared
+from modules.paths import data_path
+
+
+schema = """
+CREATE TABLE IF NOT EXISTS hashes (kind TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, mtime INTEGER NOT NULL, title TEXT, sha256 TEXT NOT NULL, PRIMARY KEY (kind, path));
+CREATE INDEX IF NOT EXISTS hashes_title ON hashes (kind, title);
+CREATE TABLE IF NOT EXISTS metadata (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime INTEGER NOT NULL, data TEXT NOT NULL);
+"""
+commit_items = 64 # commit after number of pending writes
+commit_interval = 5.0 # or after number of seconds since first pending write
+
+
+def stat(filename: str):
+    try:
+        s = os.stat(filename)
+        return s.st_size, s.st_mtime_ns
+    except Exception:
+        return None, None
+
+
+class FileStore:
+    """sqlite store for file hashes and safetensors metadata keyed by path and validated by size and mtime"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.lock = threading.RLock()
+        self.conn: sqlite3.Connection = None
+        self.pending = 0
+        self.pending_since = 0
+        self.hits = 0
+        self.misses = 0
+
+    def open(self):
+        if self.conn is not None:
+            return self.conn
+        with self.lock:
+            if self.conn is None:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                conn = sqlite3.connect(self.filename, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('PRAGMA synchronous=NORMAL')
+                conn.executescript(schema)
+                self.conn = conn
+                atexit.register(self.commit)
+        return self.conn
+
+    def write(self, sql: str, args: tuple):
+        with self.lock:
+            conn = self.open()
+            conn.execute(sql, args)
+            if self.pending == 0:
+                self.pending_since = time.time()
+            self.pending += 1
+            if self.pending >= commit_items or time.time() - self.pending_since > commit_interval:
+                self.commit()
+
+    def commit(self):
+        with self.lock:
+            if self.conn is None or self.pending == 0:
+                return
+            try:
+                self.conn.commit()
+            except Exception as e:
+                shared.log.error(f'Cache store: file="{self.filename}" {e}')
+            self.pending = 0
+
+    def get_hash(self, kind: str, filename: str):
+        size, mtime = stat(filename)
+        if size is None:
+            return None
+        with self.lock:
+            row = self.open().execute('SELECT sha256 FROM hashes WHERE kind = ? AND path = ? AND size = ? AND mtime = ?', (kind, os.path.abspath(filename), size, mtime)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set_hash(self, kind: str, filename: str, sha256: str, title: str = None):
+        size, mtime = stat(filename)
+        if size is None or sha256 is None:
+            return
+        self.write('INSERT OR REPLACE INTO hashes (kind, path, size, mtime, title, sha256) VALUES (?, ?, ?, ?, ?, ?)', (kind, os.path.abspath(filename), size, mtime, title, sha256))
+
+    def get_metadata(self, filename: str):
+        size, mtime = stat(filename)
+        if size is None:
+            return None
+        with self.lock:
+            row = self.open().execute('SELECT data FROM metadata WHERE path = ? AND size = ? AND mtime = ?', (os.path.abspath(filename), size, mtime)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            return json.loads(row[0])
+        except Exception:
+            return None
+
+    def set_metadata(self, filename: str, data: dict):
+        size, mtime = stat(filename)
+        if size is None:
+            return
+        self.write('INSERT OR REPLACE INTO metadata (path, size, mtime, data) VALUES (?, ?, ?, ?)', (os.path.abspath(filename), size, mtime, json.dumps(data)))
+
+    def stats(self):
+        with self.lock:
+            conn = self.open()
+            hashes = conn.execute('SELECT COUNT(*) FROM hashes').fetchone()[0]
+            metadata = conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        return { 'hashes': hashes, 'metadata': metadata, 'hits': self.hits, 'misses': self.misses, 'pending': self.pending }
+
+
+store = FileStore(os.path.join(data_path, 'cache.db'))
@@ -4,14 +4,16 @@ import os
 import sys
 import json
 import queue
+import atexit
+import time
 import random
-import datetime
 import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 import numpy as np
 import piexif
 import piexif.helper
 from PIL import Image, PngImagePlugin, ExifTags, ImageDraw
-from modules import sd_samplers, shared, script_callbacks, errors, paths
+from modules import sd_samplers, shared, script_callbacks, errors, paths, images_log
 from modules.images_grid import image_grid, get_grid_size, split_grid, combine_grid, check_grid_size, get_font, draw_grid_annotations, draw_prompt_matrix, GridAnnotation, Grid # pylint: disable=unused-import
 from modules.images_resize import resize_image # pylint: disable=unused-import
 from modules.images_namegen import FilenameGenerator, get_next_sequence_number # pylint: disable=unused-import
@@ -42,99 +44,157 @@ def sanitize_filename_part(text, replace_spaces=True):
     return text
 
 
-def atomically_save_image():
+def atomically_save_image(image, filename, extension, params, exifinfo, filename_txt, is_grid):
     Image.MAX_IMAGE_PIXELS = None # disable check in Pillow and rely on check below to allow large custom image sizes
-    while True:
-        image, filename, extension, params, exifinfo, filename_txt, is_grid = save_queue.get()
-        jobid = shared.state.begin('Save image')
+    with save_lock:
         shared.state.image_history += 1
         if len(exifinfo) > 2:
             with open(paths.params_path, "w", encoding="utf8") as file:
                 file.write(exifinfo)
-        fn = filename + extension
-        filename = filename.strip()
-        if extension[0] != '.': # add dot if missing
-            extension = '.' + extension
+    fn = filename + extension
+    filename = filename.strip()
+    if extension[0] != '.': # add dot if missing
+        extension = '.' + extension
+    try:
+        image_format = Image.registered_extensions()[extension]
+    except Exception:
+        shared.log.warning(f'Save: unknown image format: {extension}')
+        image_format = 'JPEG'
+    exifinfo = (exifinfo or "") if shared.opts.image_metadata else ""
+    # additional metadata saved in files
+    if shared.opts.save_txt and len(exifinfo) > 0:
         try:
-            image_format = Image.registered_extensions()[extension]
-        except Exception:
-            shared.log.warning(f'Save: unknown image format: {extension}')
-            image_format = 'JPEG'
-        exifinfo = (exifinfo or "") if shared.opts.image_metadata else ""
-        # additional metadata saved in files
-        if shared.opts.save_txt and len(exifinfo) > 0:
-            try:
-                with open(filename_txt, "w", encoding="utf8") as file:
-                    file.write(f"{exifinfo}\n")
-                shared.log.info(f'Save: text="{filename_txt}" len={len(exifinfo)}')
-            except Exception as e:
-                shared.log.warning(f'Save failed: description={filename_txt} {e}')
-
-        # actual save
-        if image_format == 'PNG':
-            pnginfo_data = PngImagePlugin.PngInfo()
-            for k, v in params.pnginfo.items():
-                pnginfo_data.add_text(k, str(v))
-            debug_save(f'Save pnginfo: {params.pnginfo.items()}')
-            save_args = { 'compress_level': 6, 'pnginfo': pnginfo_data if shared.opts.image_metadata else None }
-        elif image_format == 'JPEG':
-            if image.mode == 'RGBA':
-                shared.log.warning('Save: removing alpha channel')
-                image = image.convert("RGB")
-            elif image.mode == 'I;16':
-                image = image.point(lambda p: p * 0.0038910505836576).convert("L")
-            save_args = { 'optimize': True, 'quality': shared.opts.jpeg_quality }
-            if shared.opts.image_metadata:
-                debug_save(f'Save exif: {exifinfo}')
-                save_args['exif'] = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(exifinfo, encoding="unicode") } })
-        elif image_format == 'WEBP':
-            if image.mode == 'I;16':
-                image = image.point(lambda p: p * 0.0038910505836576).convert("RGB")
-            save_args = { 'optimize': True, 'quality': shared.opts.jpeg_quality, 'lossless': shared.opts.webp_lossless }
-            if shared.opts.image_metadata:
-                debug_save(f'Save exif: {exifinfo}')
-                save_args['exif'] = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(exifinfo, encoding="unicode") } })
-        elif image_format == 'JXL':
-            if image.mode == 'I;16':
-                image = image.point(lambda p: p * 0.0038910505836576).convert("RGB")
-            elif image.mode not in {"RGB", "RGBA"}:
-                image = image.convert("RGBA")
-            save_args = { 'optimize': True, 'quality': shared.opts.jpeg_quality, 'lossless': shared.opts.webp_lossless }
-            if shared.opts.image_metadata:
-                debug_save(f'Save exif: {exifinfo}')
-                save_args['exif'] = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(exifinfo, encoding="unicode") } })
-        else:
-            save_args = { 'quality': shared.opts.jpeg_quality }
+            with open(filename_txt, "w", encoding="utf8") as file:
+                file.write(f"{exifinfo}\n")
+            shared.log.info(f'Save: text="{filename_txt}" len={len(exifinfo)}')
+        except Exception as e:
+            shared.log.warning(f'Save failed: description={filename_txt} {e}')
+
+    # actual save
+    if image_format == 'PNG':
+        pnginfo_data = PngImagePlugin.PngInfo()
+        for k, v in params.pnginfo.items():
+            pnginfo_data.add_text(k, str(v))
+        debug_save(f'Save pnginfo: {params.pnginfo.items()}')
+        save_args = { 'compress_level': 6, 'pnginfo': pnginfo_data if shared.opts.image_metadata else None }
+    elif image_format == 'JPEG':
+        if image.mode == 'RGBA':
+            shared.log.warning('Save: removing alpha channel')
+            image = image.convert("RGB")
+        elif image.mode == 'I;16':
+            image = image.point(lambda p: p * 0.0038910505836576).convert("L")
+        save_args = { 'optimize': True, 'quality': shared.opts.jpeg_quality }
+        if shared.opts.image_metadata:
+            debug_save(f'Save exif: {exifinfo}')
+            save_args['exif'] = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(exifinfo, encoding="unicode") } })
+    elif image_format == 'WEBP':
+        if image.mode == 'I;16':
+            image = image.point(lambda p: p * 0.0038910505836576).convert("RGB")
+        save_args = { 'optimize': True, 'quality': shared.opts.jpeg_quality, 'lossless': shared.opts.webp_lossless }
+        if shared.opts.image_metadata:
+            debug_save(f'Save exif: {exifinfo}')
+            save_args['exif'] = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(exifinfo, encoding="unicode") } })
+    elif image_format == 'JXL':
+        if image.mode == 'I;16':
+            image = image.point(lambda p: p * 0.0038910505836576).convert("RGB")
+        elif image.mode not in {"RGB", "RGBA"}:
+            image = image.convert("RGBA")
+        save_args = { 'optimize': True, 'quality': shared.opts.jpeg_quality, 'lossless': shared.opts.webp_lossless }
+        if shared.opts.image_metadata:
+            debug_save(f'Save exif: {exifinfo}')
+            save_args['exif'] = piexif.dump({ "Exif": { piexif.ExifIFD.UserComment: piexif.helper.UserComment.dump(exifinfo, encoding="unicode") } })
+    else:
+        save_args = { 'quality': shared.opts.jpeg_quality }
+    try:
+        debug_save(f'Save args: {save_args}')
+        image.save(fn, format=image_format, **save_args)
+    except Exception as e:
+        shared.log.error(f'Save failed: file="{fn}" format={image_format} args={save_args} {e}')
+        errors.display(e, 'Image save')
+    size = os.path.getsize(fn) if os.path.exists(fn) else 0
+    what = 'grid' if is_grid else 'image'
+    shared.log.info(f'Save: {what}="{fn}" type={image_format} width={image.width} height={image.height} size={size}')
+
+    if shared.opts.save_log_fn != '' and len(exifinfo) > 0:
         try:
-            debug_save(f'Save args: {save_args}')
-            image.save(fn, format=image_format, **save_args)
+            record = images_log.generation_log.append(filename, exifinfo)
+            shared.log.info(f'Save: log="{images_log.generation_log.fn}" id={record}')
         except Exception as e:
-            shared.log.error(f'Save failed: file="{fn}" format={image_format} args={save_args} {e}')
-            errors.display(e, 'Image save')
-        size = os.path.getsize(fn) if os.path.exists(fn) else 0
-        what = 'grid' if is_grid else 'image'
-        shared.log.info(f'Save: {what}="{fn}" type={image_format} width={image.width} height={image.height} size={size}')
-
-        if shared.opts.save_log_fn != '' and len(exifinfo) > 0:
-            fn = os.path.join(paths.data_path, shared.opts.save_log_fn)
-            if not fn.endswith('.json'):
-                fn += '.json'
-            entries = shared.readfile(fn, silent=True)
-            idx = len(list(entries))
-            if idx == 0:
-                entries = []
-            entry = { 'id': idx, 'filename': filename, 'time': datetime.datetime.now().isoformat(), 'info': exifinfo }
-            entries.append(entry)
-            shared.writefile(entries, fn, mode='w', silent=True)
-            shared.log.info(f'Save: json="{fn}" records={len(entries)}')
+            shared.log.error(f'Save failed: log="{images_log.generation_log.fn}" {e}')
+    with save_lock:
         shared.state.outputs(filename)
-        shared.state.end(jobid)
-        save_queue.task_done()
 
 
+def save_callbacks():
+    while True:
+        future, params, slots = save_queue.get()
+        try:
+            future.result()
+            script_callbacks.image_saved_callback(params)
+        except Exception as e:
+            errors.display(e, 'Image save')
+        finally:
+            if save_pending.get(params.filename, None) is future:
+                save_pending.pop(params.filename, None)
+            slots.release()
+            save_queue.task_done()
+
+
+def save_submit(item, params):
+    """encode and write image in worker pool, limit number of in-flight images and fire callbacks in submission order"""
+    global save_pool, save_slots # pylint: disable=global-statement
+    workers = int(shared.opts.save_workers)
+    depth = max(1, int(shared.opts.save_queue_depth))
+    if save_pool is None or save_pool._max_workers != workers: # pylint: disable=protected-access
+        if save_pool is not None:
+            save_pool.shutdown(wait=False)
+        save_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sd-save')
+    if save_slots is None or save_slots[0] != depth:
+        save_slots = (depth, threading.BoundedSemaphore(depth))
+    slots = save_slots[1]
+    if not slots.acquire(blocking=False):
+        t0 = time.time()
+        slots.acquire() # backpressure: wait for oldest images to finish saving
+        debug_save(f'Save queue: depth={depth} wait={time.time()-t0:.3f}')
+    try:
+        future = save_pool.submit(atomically_save_image, *item)
+    except RuntimeError: # executor is shutting down
+        future = Future()
+        atomically_save_image(*item)
+        future.set_result(None)
+    save_pending[params.filename] = future
+    save_queue.put((future, params, slots))
+    return future
+
+
+def save_wait(filename: str = None):
+    """wait for specific pending image save to complete or flush all pending saves if filename is not specified"""
+    if filename is None:
+        save_queue.join()
+        return True
+    future = save_pending.get(filename, None)
+    if future is None:
+        return False
+    try:
+        future.result()
+    except Exception:
+        pass
+    return True
+
+
+save_lock = threading.Lock() # guards shared files and state updated by concurrent save workers
+save_pool: ThreadPoolExecutor = None
+save_slots = None
+save_pending: dict[str, Future] = {}
 save_queue = queue.Queue()
-save_thread = threading.Thread(target=atomically_save_image, daemon=True)
+save_thread = threading.Thread(target=save_callbacks, daemon=True)
 save_thread.start()
+atexit.register(save_wait)
+
+
+class SaveResult(tuple):
+    """filename, text filename and exif info returned by save_image, future completes once image is written"""
+    future: Future = None
 
 
 def save_image(image,
@@ -213,13 +273,23 @@ def save_image(image,
     exifinfo += params.pnginfo.get(pnginfo_section_name, '')
     filename, extension = os.path.splitext(params.filename)
     filename_txt = f"{filename}.txt" if shared.opts.save_txt and len(exifinfo) > 0 else None
-    save_queue.put((params.image, filename, extension, params, exifinfo, filename_txt, grid)) # actual save is executed in a thread that polls data from queue
-    save_queue.join()
+    item = (params.image, filename, extension, params, exifinfo, filename_txt, grid)
     if not hasattr(params.image, 'already_saved_as'):
         debug(f'Image marked: "{params.filename}"')
         params.image.already_saved_as = params.filename
-    script_callbacks.image_saved_callback(params)
-    return params.filename, filename_txt, exifinfo
+    if shared.opts.save_workers > 0:
+        future = save_submit(item, params) # actual save is executed by worker pool and callbacks are fired by callback thread once save completes
+    else:
+        save_wait()
+        jobid = shared.state.begin('Save image')
+        atomically_save_image(*item)
+        shared.state.end(jobid)
+        script_callbacks.image_saved_callback(params)
+        future = Future()
+        future.set_result(None)
+    res = SaveResult((params.filename, filename_txt, exifinfo))
+    res.future = future
+    return res
 
 
 def safe_decode_string(s: bytes):
@@ -0,0 +1,136 @@
+import os
+import re
+import time
+import sqlite3
+import datetime
+import threading
+from modules import shared, paths
+
+
+re_seed = re.compile(r'\bSeed: (-?\d+)')
+schema = """
+CREATE TABLE IF NOT EXISTS log (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL, seed INTEGER, time TEXT NOT NULL, info TEXT);
+CREATE INDEX IF NOT EXISTS log_filename ON log (filename);
+CREATE INDEX IF NOT EXISTS log_seed ON log (seed);
+CREATE INDEX IF NOT EXISTS log_time ON log (time);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class GenerationLog:
+    """append-only sqlite generation log with indexes by filename, seed and time"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conn: sqlite3.Connection = None
+        self.fn: str = None
+
+    def filename(self):
+        if shared.opts.save_log_fn is None or len(shared.opts.save_log_fn) == 0:
+            return None
+        fn = os.path.join(paths.data_path, shared.opts.save_log_fn)
+        base, ext = os.path.splitext(fn)
+        if ext.lower() in {'.json', '.db'}:
+            fn = base
+        return fn + '.db'
+
+    def open(self):
+        fn = self.filename()
+        if fn is None:
+            self.close()
+            return None
+        if self.conn is not None and self.fn == fn:
+            return self.conn
+        self.close()
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        self.conn = sqlite3.connect(fn, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(schema)
+        self.fn = fn
+        self.migrate()
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn = None
+        self.fn = None
+
+    def migrate(self):
+        """one-time import of legacy json log which was rewritten in full on every save"""
+        legacy = os.path.splitext(self.fn)[0] + '.json'
+        if not os.path.isfile(legacy):
+            return
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', ('imported',)).fetchone()
+        if row is not None:
+            return
+        t0 = time.time()
+        entries = shared.readfile(legacy, silent=True)
+        if not isinstance(entries, list):
+            entries = []
+        rows = []
+        for entry in entries:
+            if not isinstance(entry, dict) or 'filename' not in entry:
+                continue
+            info = entry.get('info', '') or ''
+            rows.append((entry['filename'], self.seed(info), entry.get('time', ''), info))
+        with self.conn:
+            self.conn.executemany('INSERT INTO log (filename, seed, time, info) VALUES (?, ?, ?, ?)', rows)
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', ('imported', legacy))
+        shared.log.info(f'Generation log: import="{legacy}" db="{self.fn}" records={len(rows)} time={time.time()-t0:.2f}')
+
+    def seed(self, info: str):
+        match = re_seed.search(info or '')
+        return int(match.group(1)) if match is not None else None
+
+    def append(self, filename: str, info: str):
+        with self.lock:
+            conn = self.open()
+            if conn is None:
+                return None
+            with conn:
+                cursor = conn.execute('INSERT INTO log (filename, seed, time, info) VALUES (?, ?, ?, ?)', (filename, self.seed(info), datetime.datetime.now().isoformat(), info))
+            return cursor.lastrowid
+
+    def query(self, filename: str = None, seed: int = None, since: str = None, until: str = None, search: str = None, limit: int = 100, offset: int = 0):
+        where, args = [], []
+        if filename:
+            where.append('filename IN (?, ?)') # log stores filenames without extension
+            args += [filename, os.path.splitext(filename)[0]]
+        if seed is not None:
+            where.append('seed = ?')
+            args.append(seed)
+        if since:
+            where.append('time >= ?')
+            args.append(since)
+        if until:
+            where.append('time <= ?')
+            args.append(until)
+        if search:
+            where.append('info LIKE ?')
+            args.append(f'%{search}%')
+        sql = 'SELECT id, filename, seed, time, info FROM log'
+        if len(where) > 0:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY id DESC LIMIT ? OFFSET ?'
+        args += [max(0, int(limit)), max(0, int(offset))]
+        with self.lock:
+            conn = self.open()
+            if conn is None:
+                return []
+            return [dict(row) for row in conn.execute(sql, args).fetchall()]
+
+    def count(self):
+        with self.lock:
+            conn = self.open()
+            if conn is None:
+                return 0
+            return conn.execute('SELECT COUNT(*) FROM log').fetchone()[0]
+
+
+generation_log = GenerationLog()
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from modules import shared, paths
+
+
+image_ext = ['.png', '.jpg', '.jpeg', '.webp', '.jxl']
+
+
+def list_files(batch_files, batch_folder, batch_str, recursive):
+    files = []
+    if batch_files is not None:
+        files += [f.name for f in batch_files]
+    if batch_folder is not None:
+        files += [f.name for f in batch_folder]
+    if batch_str is not None and len(batch_str) > 0 and os.path.exists(batch_str) and os.path.isdir(batch_str):
+        from modules.files_cache import list_files as list_folder
+        files += list(list_folder(batch_str, ext_filter=image_ext, recursive=recursive))
+    return files
+
+
+def load_image(file: str, size: int = 0):
+    image = Image.open(file)
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if size > 0 and (image.width > size or image.height > size):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return image
+
+
+def prefetch(files: list, preprocess, workers: int, lookahead: int):
+    """decode and preprocess images in background threads ahead of consumer, yields file and image or exception in input order"""
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='sd-caption-load')
+    pending = deque()
+    queue = iter(files)
+    try:
+        for file in queue:
+            pending.append((file, executor.submit(preprocess, file)))
+            if len(pending) >= lookahead:
+                break
+        while len(pending) > 0:
+            file, future = pending.popleft()
+            nxt = next(queue, None)
+            if nxt is not None:
+                pending.append((nxt, executor.submit(preprocess, nxt)))
+            try:
+                yield file, future.result()
+            except Exception as e:
+                yield file, e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SidecarWriter:
+    """writes caption sidecar files on background thread so model does not wait on disk"""
+
+    def __init__(self, mode: str = 'w'):
+        self.mode = mode
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sd-caption-write')
+        self.written = 0
+
+    def write(self, file: str, prompt: str):
+        txt_file = os.path.splitext(file)[0] + '.txt'
+        if self.mode == 'a':
+            prompt = '\n' + prompt
+        try:
+            with open(txt_file, self.mode, encoding='utf-8') as f:
+                f.write(prompt)
+            self.written += 1
+        except Exception as e:
+            shared.log.error(f'Caption batch: file="{txt_file}" {e}')
+
+    def add(self, file: str, prompt: str):
+        self.executor.submit(self.write, file, prompt)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class Manifest:
+    """append-only record of captioned files so interrupted batch can resume, keyed by folder, captioning params and sidecar write mode"""
+
+    def __init__(self, files: list, params: list):
+        folder = os.path.dirname(os.path.abspath(files[0])) if len(files) > 0 else ''
+        key = hashlib.sha256(json.dumps([folder] + [str(p) for p in params]).encode('utf-8')).hexdigest()[:16]
+        self.fn = os.path.join(paths.data_path, 'cache', 'caption', f'{key}.jsonl')
+        self.done: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        if os.path.isfile(self.fn):
+            with open(self.fn, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done[entry['file']] = entry
+                    except Exception:
+                        pass # partial line from interrupted write
+
+    @staticmethod
+    def mtime(file: str):
+        try:
+            return os.path.getmtime(file)
+        except Exception:
+            return None
+
+    def completed(self, file: str):
+        entry = self.done.get(file, None)
+        if entry is None or entry.get('mtime', None) != self.mtime(file):
+            return None
+        return entry
+
+    def add(self, file: str, prompt: str):
+        entry = { 'file': file, 'mtime': self.mtime(file), 'prompt': prompt }
+        with self.lock:
+            self.done[file] = entry
+            os.makedirs(os.path.dirname(self.fn), exist_ok=True)
+            with open(self.fn, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+def run(files: list, fn, params: list, batch_size: int = 1, write: bool = False, append: bool = False, size: int = 0, desc: str = 'Caption'):
+    """caption files in batches using fn(images) -> prompts while next batch is decoded and previous results are written"""
+    t0 = time.time()
+    prompts = {} # file: prompt, returned in input file order
+    manifest = Manifest(files, params + [write, append]) if shared.opts.interrogate_batch_resume else None
+    writer = SidecarWriter('a' if append else 'w') if write else None
+    todo = files
+    if manifest is not None:
+        todo = []
+        for file in files:
+            entry = manifest.completed(file)
+            if entry is not None:
+                prompts[file] = entry['prompt']
+                if writer is not None and not os.path.isfile(os.path.splitext(file)[0] + '.txt'): # sidecar removed since previous run
+                    writer.add(file, entry['prompt'])
+            else:
+                todo.append(file)
+    skipped = len(files) - len(todo)
+    batch_size = max(1, batch_size)
+    workers = max(1, shared.opts.interrogate_batch_workers)
+    processed = 0
+    failed = 0
+    t_model = 0
+
+    def flush(batch):
+        nonlocal processed, failed, t_model
+        t1 = time.time()
+        try:
+            results = fn([image for _file, image in batch])
+        except Exception as e:
+            shared.log.error(f'Caption batch: files={len(batch)} {e}')
+            failed += len(batch)
+            return
+        t_model += time.time() - t1
+        for (file, _image), prompt in zip(batch, results):
+            prompts[file] = prompt
+            if writer is not None:
+                writer.add(file, prompt)
+            if manifest is not None:
+                manifest.add(file, prompt)
+            processed += 1
+
+    import rich.progress as rp
+    pbar = rp.Progress(rp.TextColumn(f'[cyan]{desc}:'), rp.BarColumn(), rp.MofNCompleteColumn(), rp.TaskProgressColumn(), rp.TimeRemainingColumn(), rp.TimeElapsedColumn(), rp.TextColumn('[cyan]{task.description}'), console=shared.console)
+    with pbar:
+        task = pbar.add_task(total=len(files), completed=skipped, description='starting...')
+        batch = []
+        for file, image in prefetch(todo, lambda f: load_image(f, size), workers=workers, lookahead=batch_size + workers):
+            if shared.state.interrupted:
+                break
+            if isinstance(image, Exception):
+                shared.log.error(f'Caption batch: file="{file}" {image}')
+                failed += 1
+                continue
+            batch.append((file, image))
+            if len(batch) >= batch_size:
+                n = len(batch)
+                flush(batch)
+                batch.clear()
+                pbar.update(task, advance=n, description=file)
+        if len(batch) > 0 and not shared.state.interrupted:
+            n = len(batch)
+            flush(batch)
+            pbar.update(task, advance=n, description='')
+    if writer is not None:
+        writer.close()
+    t1 = time.time()
+    shared.log.info(f'Caption batch: files={len(files)} processed={processed} resumed={skipped} failed={failed} batch={batch_size} workers={workers} model={t_model:.2f} time={t1-t0:.2f} rate={processed/(t1-t0) if t1 > t0 else 0:.2f}')
+    return [prompts[file] for file in files if file in prompts]
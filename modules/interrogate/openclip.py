@@ -31,25 +31,6 @@ re_topn = re.compile(r"\.top(\d+)\.")
 load_lock = threading.Lock()
 
 
-class BatchWriter:
-    def __init__(self, folder, mode='w'):
-        self.folder = folder
-        self.csv = None
-        self.file = None
-        self.mode = mode
-
-    def add(self, file, prompt):
-        txt_file = os.path.splitext(file)[0] + ".txt"
-        if self.mode == 'a':
-            prompt = '\n' + prompt
-        with open(os.path.join(self.folder, txt_file), self.mode, encoding='utf-8') as f:
-            f.write(prompt)
-
-    def close(self):
-        if self.file is not None:
-            self.file.close()
-
-
 def update_interrogate_params():
     if ci is not None:
         ci.caption_max_length=shared.opts.interrogate_clip_max_length
@@ -152,46 +133,43 @@ def interrogate_image(image, clip_model, blip_model, mode):
     return prompt
 
 
+def generate_captions(images: list):
+    """single batched caption model generate call, clip ranking remains per image"""
+    if hasattr(ci, '_prepare_caption'):
+        ci._prepare_caption() # pylint: disable=protected-access
+    inputs = ci.caption_processor(images=images, return_tensors="pt").to(ci.device)
+    if not ci.config.caption_model_name.startswith('git-'):
+        inputs = inputs.to(ci.dtype)
+    with devices.inference_context():
+        tokens = ci.caption_model.generate(**inputs, max_new_tokens=ci.config.caption_max_length)
+    return [caption.strip() for caption in ci.caption_processor.batch_decode(tokens, skip_special_tokens=True)]
+
+
+def interrogate_images(images: list, mode):
+    captions = [None] * len(images)
+    if mode != 'negative' and len(images) > 1:
+        try:
+            captions = generate_captions(images)
+        except Exception as e:
+            shared.log.warning(f'Interrogate batch: type=clip batched caption failed: {e}')
+    return [interrogate(image, mode, caption=caption) for image, caption in zip(images, captions)]
+
+
 def interrogate_batch(batch_files, batch_folder, batch_str, clip_model, blip_model, mode, write, append, recursive):
-    files = []
-    if batch_files is not None:
-        files += [f.name for f in batch_files]
-    if batch_folder is not None:
-        files += [f.name for f in batch_folder]
-    if batch_str is not None and len(batch_str) > 0 and os.path.exists(batch_str) and os.path.isdir(batch_str):
-        from modules.files_cache import list_files
-        files += list(list_files(batch_str, ext_filter=['.png', '.jpg', '.jpeg', '.webp', '.jxl'], recursive=recursive))
+    from modules.interrogate import batching
+    files = batching.list_files(batch_files, batch_folder, batch_str, recursive)
     if len(files) == 0:
         shared.log.warning('Interrogate batch: type=clip no images')
         return ''
     jobid = shared.state.begin('Interrogate batch')
-    prompts = []
-
     load_interrogator(clip_model, blip_model)
-    if write:
-        file_mode = 'w' if not append else 'a'
-        writer = BatchWriter(os.path.dirname(files[0]), mode=file_mode)
-    import rich.progress as rp
-    pbar = rp.Progress(rp.TextColumn('[cyan]Caption:'), rp.BarColumn(), rp.MofNCompleteColumn(), rp.TaskProgressColumn(), rp.TimeRemainingColumn(), rp.TimeElapsedColumn(), rp.TextColumn('[cyan]{task.description}'), console=shared.console)
-    with pbar:
-        task = pbar.add_task(total=len(files), description='starting...')
-        for file in files:
-            pbar.update(task, advance=1, description=file)
-            try:
-                if shared.state.interrupted:
-                    break
-                image = Image.open(file).convert('RGB')
-                prompt = interrogate(image, mode)
-                prompts.append(prompt)
-                if write:
-                    writer.add(file, prompt)
-            except OSError as e:
-                shared.log.error(f'Interrogate batch: {e}')
-    if write:
-        writer.close()
-    ci.config.quiet = False
-    unload_clip_model()
-    shared.state.end(jobid)
+    params = ['clip', clip_model, blip_model, mode, shared.opts.interrogate_clip_min_flavors, shared.opts.interrogate_clip_max_flavors]
+    try:
+        prompts = batching.run(files, lambda images: interrogate_images(images, mode), params, batch_size=shared.opts.interrogate_batch_size, write=write, append=append)
+    finally:
+        ci.config.quiet = False
+        unload_clip_model()
+        shared.state.end(jobid)
     return '\n\n'.join(prompts)
 
 
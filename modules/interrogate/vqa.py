@@ -201,6 +201,7 @@ def qwen(question: str, image: Image.Image, repo: str = None, system_prompt: str
         loaded = repo
         devices.torch_gc()
     sd_models.move_model(model, devices.device)
+    images = image if isinstance(image, list) else [image]
     question = question.replace('<', '').replace('>', '').replace('_', ' ')
     system_prompt = system_prompt or shared.opts.interrogate_vlm_system
     conversation = [
@@ -211,13 +212,14 @@ def qwen(question: str, image: Image.Image, repo: str = None, system_prompt: str
         {
             "role": "user",
             "content": [
-                {"type": "image", "image": b64(image)},
+                {"type": "image", "image": b64(images[0])},
                 {"type": "text", "text": question},
             ],
         }
     ]
     text_prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
-    inputs = processor(text=[text_prompt], images=[image], padding=True, return_tensors="pt")
+    processor.tokenizer.padding_side = 'left' # batched generate appends to end of each row
+    inputs = processor(text=[text_prompt] * len(images), images=images, padding=True, return_tensors="pt")
     inputs = inputs.to(devices.device, devices.dtype)
     output_ids = model.generate(
         **inputs,
@@ -377,6 +379,7 @@ def smol(question: str, image: Image.Image, repo: str = None, system_prompt: str
         loaded = repo
         devices.torch_gc()
     sd_models.move_model(model, devices.device)
+    images = image if isinstance(image, list) else [image]
     question = question.replace('<', '').replace('>', '').replace('_', ' ')
     system_prompt = system_prompt or shared.opts.interrogate_vlm_system
     conversation = [
@@ -387,13 +390,14 @@ def smol(question: str, image: Image.Image, repo: str = None, system_prompt: str
         {
             "role": "user",
             "content": [
-                {"type": "image", "image": b64(image)},
+                {"type": "image", "image": b64(images[0])},
                 {"type": "text", "text": question},
             ],
         }
     ]
     text_prompt = processor.apply_chat_template(conversation, add_generation_prompt=True)
-    inputs = processor(text=text_prompt, images=[image], padding=True, return_tensors="pt")
+    processor.tokenizer.padding_side = 'left'
+    inputs = processor(text=[text_prompt] * len(images), images=[[img] for img in images], padding=True, return_tensors="pt")
     inputs = inputs.to(devices.device, devices.dtype)
     output_ids = model.generate(
         **inputs,
@@ -423,12 +427,12 @@ def git(question: str, image: Image.Image, repo: str = None):
     if len(question) > 0:
         input_ids = processor(text=question, add_special_tokens=False).input_ids
         input_ids = [processor.tokenizer.cls_token_id] + input_ids
-        input_ids = torch.tensor(input_ids).unsqueeze(0)
+        input_ids = torch.tensor(input_ids).unsqueeze(0).repeat(pixel_values.shape[0], 1)
         git_dict['input_ids'] = input_ids.to(devices.device)
     with devices.inference_context():
         generated_ids = model.generate(**git_dict)
-    response = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-    return response
+    response = processor.batch_decode(generated_ids, skip_special_tokens=True)
+    return response if isinstance(image, list) else response[0]
 
 
 def blip(question: str, image: Image.Image, repo: str = None):
@@ -445,10 +449,15 @@ def blip(question: str, image: Image.Image, repo: str = None):
         loaded = repo
         devices.torch_gc()
     sd_models.move_model(model, devices.device)
-    inputs = processor(image, question, return_tensors="pt")
+    if isinstance(image, list):
+        inputs = processor(image, [question] * len(image), padding=True, return_tensors="pt")
+    else:
+        inputs = processor(image, question, return_tensors="pt")
     inputs = inputs.to(devices.device, devices.dtype)
     with devices.inference_context():
         outputs = model.generate(**inputs)
+    if isinstance(image, list):
+        return processor.batch_decode(outputs, skip_special_tokens=True)
     response = processor.decode(outputs[0], skip_special_tokens=True)
     return response
 
@@ -580,7 +589,8 @@ def florence(question: str, image: Image.Image, repo: str = None, revision: str
         task = question.split('>', 1)[0] + '>'
     else:
         task = '<MORE_DETAILED_CAPTION>'
-    inputs = processor(text=task, images=image, return_tensors="pt")
+    images = image if isinstance(image, list) else [image]
+    inputs = processor(text=[task] * len(images), images=images, return_tensors="pt")
     input_ids = inputs['input_ids'].to(devices.device)
     pixel_values = inputs['pixel_values'].to(devices.device, devices.dtype)
     with devices.inference_context():
@@ -589,9 +599,9 @@ def florence(question: str, image: Image.Image, repo: str = None, revision: str
             pixel_values=pixel_values,
             **get_kwargs()
         )
-        generated_text = processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-        response = processor.post_process_generation(generated_text, task="task", image_size=(image.width, image.height))
-    return response
+        generated_text = processor.batch_decode(generated_ids, skip_special_tokens=False)
+        response = [processor.post_process_generation(text, task="task", image_size=(img.width, img.height)) for text, img in zip(generated_text, images)]
+    return response if isinstance(image, list) else response[0]
 
 
 def sa2(question: str, image: Image.Image, repo: str = None):
@@ -723,61 +733,68 @@ def interrogate(question:str='', system_prompt:str=None, prompt:str=None, image:
     return answer
 
 
+def batched(repo: str):
+    """batched generate entry point for models whose processor accepts list of images"""
+    repo = repo.lower()
+    if 'git' in repo:
+        return git
+    if 'blip' in repo:
+        return blip
+    if 'florence' in repo:
+        return florence
+    if 'qwen' in repo or 'torii' in repo:
+        return qwen
+    if 'smol' in repo:
+        return smol
+    return None
+
+
+def interrogate_batch(question:str='', system_prompt:str=None, prompt:str=None, images:list=None, model_name:str=None):
+    global quant_args # pylint: disable=global-statement
+    if quant_args is None:
+        quant_args = model_quant.create_config(module='LLM')
+    model_name = model_name or shared.opts.interrogate_vlm_model
+    vqa_model = vlm_models.get(model_name, None)
+    fn = batched(vqa_model) if vqa_model is not None else None
+    if fn is None or len(images) == 1:
+        return [interrogate(question, system_prompt, prompt, image, model_name, quiet=True) for image in images]
+    if prompt is not None and len(prompt) > 0:
+        question = prompt
+    if len(question) < 2:
+        question = "Describe the image."
+    from modules import modelloader
+    modelloader.hf_login()
+    try:
+        if fn in [qwen, smol]:
+            answers = fn(question, images, vqa_model, system_prompt)
+        else:
+            answers = fn(question, images, vqa_model)
+    except Exception as e:
+        errors.display(e, 'VQA')
+        answers = ['error'] * len(images)
+    return [clean(answer, question) for answer in answers]
+
+
 def batch(model_name, system_prompt, batch_files, batch_folder, batch_str, question, prompt, write, append, recursive):
-    class BatchWriter:
-        def __init__(self, folder, mode='w'):
-            self.folder = folder
-            self.csv = None
-            self.file = None
-            self.mode = mode
-
-        def add(self, file, prompt):
-            txt_file = os.path.splitext(file)[0] + ".txt"
-            if self.mode == 'a':
-                prompt = '\n' + prompt
-            with open(os.path.join(self.folder, txt_file), self.mode, encoding='utf-8') as f:
-                f.write(prompt)
-
-        def close(self):
-            if self.file is not None:
-                self.file.close()
-
-    files = []
-    if batch_files is not None:
-        files += [f.name for f in batch_files]
-    if batch_folder is not None:
-        files += [f.name for f in batch_folder]
-    if batch_str is not None and len(batch_str) > 0 and os.path.exists(batch_str) and os.path.isdir(batch_str):
-        from modules.files_cache import list_files
-        files += list(list_files(batch_str, ext_filter=['.png', '.jpg', '.jpeg', '.webp', '.jxl'], recursive=recursive))
+    from modules.interrogate import batching
+    files = batching.list_files(batch_files, batch_folder, batch_str, recursive)
     if len(files) == 0:
         shared.log.warning('Interrogate batch: type=vlm no images')
         return ''
     jobid = shared.state.begin('Interrogate batch')
-    prompts = []
-    if write:
-        mode = 'w' if not append else 'a'
-        writer = BatchWriter(os.path.dirname(files[0]), mode=mode)
     orig_offload = shared.opts.interrogate_offload
     shared.opts.interrogate_offload = False
-    import rich.progress as rp
-    pbar = rp.Progress(rp.TextColumn('[cyan]Caption:'), rp.BarColumn(), rp.MofNCompleteColumn(), rp.TaskProgressColumn(), rp.TimeRemainingColumn(), rp.TimeElapsedColumn(), rp.TextColumn('[cyan]{task.description}'), console=shared.console)
-    with pbar:
-        task = pbar.add_task(total=len(files), description='starting...')
-        for file in files:
-            pbar.update(task, advance=1, description=file)
-            try:
-                if shared.state.interrupted:
-                    break
-                image = Image.open(file)
-                prompt = interrogate(question, system_prompt, prompt, image, model_name, quiet=True)
-                prompts.append(prompt)
-                if write:
-                    writer.add(file, prompt)
-            except Exception as e:
-                shared.log.error(f'Interrogate batch: {e}')
-    if write:
-        writer.close()
-    shared.opts.interrogate_offload = orig_offload
-    shared.state.end(jobid)
+    model_name = model_name or shared.opts.interrogate_vlm_model
+    repo = vlm_models.get(model_name, None)
+    batch_size = shared.opts.interrogate_batch_size if repo is not None and batched(repo) is not None else 1
+    params = ['vlm', model_name, system_prompt, question, prompt, get_kwargs()]
+    shared.log.debug(f'Interrogate batch: type=vlm model="{model_name}" files={len(files)} batch={batch_size}')
+    try:
+        prompts = batching.run(files, lambda images: interrogate_batch(question, system_prompt, prompt, images, model_name), params, batch_size=batch_size, write=write, append=append)
+    finally:
+        shared.opts.interrogate_offload = orig_offload
+        if shared.opts.interrogate_offload and model is not None:
+            sd_models.move_model(model, devices.cpu, force=True)
+        devices.torch_gc(force=True, reason='vqa')
+        shared.state.end(jobid)
     return '\n\n'.join(prompts)
@@ -9,13 +9,16 @@ import os
 import time
 import json
 from PIL import Image
+import torch
 import diffusers
 import transformers
 from modules import processing, shared, devices, sd_models, errors, model_quant
+from modules.ipadapter_cache import cache
 
 
 clip_loaded = None
 adapters_loaded = []
+encoder_pending = None # adapter names whose image encoder was skipped because all embeds were cached
 CLIP_ID = "h94/IP-Adapter"
 OPEN_ID = "openai/clip-vit-large-patch14"
 SIGLIP_ID = 'google/siglip-so400m-patch14-384'
@@ -138,6 +141,9 @@ def crop_images(images, crops):
 
 
 def unapply(pipe, unload: bool = False): # pylint: disable=arguments-differ
+    if cache.job_hits + cache.job_misses > 0:
+        shared.log.info(f'IP adapter cache: {cache.stats()}')
+        cache.reset()
     if len(adapters_loaded) == 0:
         return
     try:
@@ -160,8 +166,8 @@ def unapply(pipe, unload: bool = False): # pylint: disable=arguments-differ
         pass
 
 
-def load_image_encoder(pipe: diffusers.DiffusionPipeline, adapter_names: list[str]):
-    global clip_loaded # pylint: disable=global-statement
+def get_encoder(adapter_names: list[str]):
+    clip_repo, clip_subfolder = CLIP_ID, None
     for adapter_name in adapter_names:
         # which clip to use
         clip_repo = CLIP_ID
@@ -184,7 +190,16 @@ def load_image_encoder(pipe: diffusers.DiffusionPipeline, adapter_names: list[st
                 clip_subfolder = None
             else:
                 shared.log.error(f'IP adapter: unknown model type: {adapter_name}')
-                return False
+                return None
+    return clip_repo, clip_subfolder
+
+
+def load_image_encoder(pipe: diffusers.DiffusionPipeline, adapter_names: list[str]):
+    global clip_loaded # pylint: disable=global-statement
+    encoder = get_encoder(adapter_names)
+    if encoder is None:
+        return False
+    clip_repo, clip_subfolder = encoder
 
     # load image encoder used by ip adapter
     if pipe.image_encoder is None or clip_loaded != f'{clip_repo}/{clip_subfolder}':
@@ -216,6 +231,36 @@ def load_image_encoder(pipe: diffusers.DiffusionPipeline, adapter_names: list[st
     return True
 
 
+def install_cache(pipe):
+    """wrap pipeline encode_image so registered adapter images are served from embeds cache and encoder is activated only on miss"""
+    cls = pipe.__class__
+    if not hasattr(cls, 'encode_image') or getattr(cls.encode_image, 'cached', False):
+        return
+    original = cls.encode_image
+
+    def encode_image(self, image, *args, **kwargs):
+        global encoder_pending # pylint: disable=global-statement
+        base = cache.lookup(image)
+        if base is None and encoder_pending is None:
+            return original(self, image, *args, **kwargs)
+        if base is not None:
+            key = cache.key(base, args, kwargs)
+            device = kwargs.get('device', None) or next((a for a in args if isinstance(a, torch.device)), None)
+            embeds = cache.get(key, device)
+            if embeds is not None:
+                return embeds
+        if encoder_pending is not None: # unexpected miss such as pipeline generated negative image
+            load_image_encoder(self, encoder_pending)
+            encoder_pending = None
+        embeds = original(self, image, *args, **kwargs)
+        if base is not None:
+            cache.put(key, embeds)
+        return embeds
+
+    encode_image.cached = True
+    cls.encode_image = encode_image
+
+
 def load_feature_extractor(pipe):
     # load feature extractor used by ip adapter
     if pipe.feature_extractor is None:
@@ -285,7 +330,7 @@ def parse_params(p: processing.StableDiffusionProcessing, adapters: list, adapte
 
 
 def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapter_scales=[1.0], adapter_crops=[False], adapter_starts=[0.0], adapter_ends=[1.0], adapter_images=[]):
-    global adapters_loaded # pylint: disable=global-statement
+    global adapters_loaded, encoder_pending # pylint: disable=global-statement
     # overrides
     if hasattr(p, 'ip_adapter_names'):
         if isinstance(p.ip_adapter_names, str):
@@ -323,7 +368,20 @@ def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapt
         shared.log.error(f'IP adapter: pipeline not supported: {pipe.__class__.__name__}')
         return False
 
-    if not load_image_encoder(pipe, adapter_names):
+    encoder_pending = None
+    bases = []
+    nunchaku = hasattr(pipe, 'transformer') and 'Nunchaku' in pipe.transformer.__class__.__name__ # encodes images outside of pipeline
+    if cache.enabled and hasattr(pipe, 'encode_image') and not nunchaku:
+        encoder = get_encoder(adapter_names)
+        if encoder is None:
+            return False
+        cache.clear()
+        bases = [cache.base(images, f'{encoder[0]}/{encoder[1]}', crop, f'{adapter["repo"]}/{adapter["name"]}') for images, crop, adapter in zip(adapter_images, adapter_crops, adapters)]
+        install_cache(pipe)
+    cached = len(bases) > 0 and all(cache.contains(base) for base in bases)
+    if cached: # skip encoder activation and face crop, encoder is loaded lazily if pipeline encodes anything else
+        encoder_pending = adapter_names
+    elif not load_image_encoder(pipe, adapter_names):
         return False
 
     if not load_feature_extractor(pipe):
@@ -370,12 +428,17 @@ def apply(pipe, p: processing.StableDiffusionProcessing, adapter_names=[], adapt
                 shared.log.debug(f'IP adapter load: engine=nunchaku scale={adapter_scales[0]} repo="{repos}"')
             else:
                 shared.log.error('IP adapter: Nunchaku only supports single adapter')
-        p.task_args['ip_adapter_image'] = crop_images(adapter_images, adapter_crops)
+        p.task_args['ip_adapter_image'] = crop_images(adapter_images, adapter_crops if not cached else [False] * len(adapter_crops))
+        if len(bases) > 0:
+            images = p.task_args['ip_adapter_image']
+            for image, base in zip(images if images is adapter_images else [images], bases):
+                cache.register(image, base)
         if len(adapter_masks) > 0:
             p.cross_attention_kwargs = { 'ip_adapter_masks': adapter_masks }
         p.extra_generation_params["IP Adapter"] = ';'.join(ip_str)
         t1 = time.time()
-        shared.log.info(f'IP adapter: {ip_str} image={adapter_images} mask={adapter_masks is not None} time={t1-t0:.2f}')
+        cache_str = f' cache={"hit" if cached else "miss"} rate={cache.rate:.2f}' if len(bases) > 0 else ''
+        shared.log.info(f'IP adapter: {ip_str} image={adapter_images} mask={adapter_masks is not None}{cache_str} time={t1-t0:.2f}')
     except Exception as e:
         shared.log.error(f'IP adapter load: adapters={adapter_names} repo={repos} folders={subfolders} names={names} {e}')
         errors.display(e, 'IP adapter: type=adapter')
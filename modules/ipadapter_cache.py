@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from safetensors.torch import save_file, safe_open
+from modules import shared, devices, paths
+
+
+debug = shared.log.trace if os.environ.get('SD_IPADAPTER_DEBUG', None) is not None else lambda *args, **kwargs: None
+
+
+def image_hash(image) -> str:
+    h = hashlib.sha256(f'{image.mode}:{image.width}x{image.height}'.encode('utf-8'))
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def tensor_size(t) -> int:
+    return t.numel() * t.element_size() if isinstance(t, torch.Tensor) else 0
+
+
+def flatten(value):
+    if isinstance(value, torch.Tensor):
+        return 'tensor', [value]
+    return 'tuple', list(value)
+
+
+def unflatten(kind: str, tensors: list):
+    return tensors[0] if kind == 'tensor' else tuple(tensors)
+
+
+class ImageEmbedsCache:
+    """ip adapter image encoder outputs keyed by image content, encoder and crop setting
+    held in ram with lru eviction under byte budget and optionally mirrored to disk"""
+
+    def __init__(self, folder: str = None):
+        self.folder = folder or os.path.join(paths.data_path, 'cache', 'ipadapter')
+        self.lock = threading.Lock()
+        self.items: OrderedDict[str, tuple] = OrderedDict() # key: (kind, cpu tensors, size)
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self.job_hits = 0
+        self.job_misses = 0
+        self.images: dict[int, tuple] = {} # id of adapter image list passed to pipeline: (image list, base key)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sd-ipadapter-cache')
+
+    @property
+    def budget(self) -> int:
+        return int(shared.opts.ipadapter_cache_size) * 1024 * 1024
+
+    @property
+    def disk(self) -> bool:
+        return shared.opts.ipadapter_cache_disk
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0 or self.disk
+
+    @property
+    def rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses > 0 else 0
+
+    def base(self, images: list, encoder: str, crop: bool, adapter: str) -> str:
+        """key prefix shared by all encode calls for same images, encoder, crop and adapter"""
+        images = images if isinstance(images, list) else [images]
+        token = str([encoder, crop, adapter] + [image_hash(image) for image in images])
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+
+    def key(self, base: str, args: tuple, kwargs: dict) -> str:
+        """full key adds encode arguments such as num_images_per_prompt and output_hidden_states, device is ignored"""
+        params = [a for a in args if not isinstance(a, (torch.device, str))] + [(k, v) for k, v in sorted(kwargs.items()) if k != 'device']
+        return f'{base}-{hashlib.sha256(str(params).encode("utf-8")).hexdigest()[:16]}'
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], f'{key}.safetensors')
+
+    def contains(self, base: str) -> bool:
+        with self.lock:
+            if any(k.startswith(base) for k in self.items):
+                return True
+        if self.disk:
+            folder = os.path.dirname(self.path(base))
+            return os.path.isdir(folder) and any(f.startswith(base) for f in os.listdir(folder))
+        return False
+
+    def clear(self):
+        self.images.clear()
+
+    def reset(self):
+        self.job_hits = 0
+        self.job_misses = 0
+
+    def register(self, images, base: str):
+        self.images[id(images)] = (images, base) # reference is kept so id stays valid for duration of job
+
+    def lookup(self, images):
+        entry = self.images.get(id(images), None)
+        return entry[1] if entry is not None and entry[0] is images else None
+
+    def get(self, key: str, device=None):
+        device = device or devices.device
+        with self.lock:
+            item = self.items.get(key, None)
+            if item is not None:
+                self.items.move_to_end(key)
+        if item is None and self.disk:
+            item = self.read(key)
+        if item is None:
+            self.misses += 1
+            self.job_misses += 1
+            return None
+        self.hits += 1
+        self.job_hits += 1
+        kind, tensors, _size = item
+        return unflatten(kind, [t.to(device, non_blocking=True) if t is not None else None for t in tensors])
+
+    def put(self, key: str, value):
+        kind, tensors = flatten(value)
+        tensors = [t.detach().to(devices.cpu, copy=True).contiguous() if isinstance(t, torch.Tensor) else None for t in tensors]
+        size = sum(tensor_size(t) for t in tensors)
+        if self.budget > 0:
+            self.store(key, (kind, tensors, size))
+        if self.disk:
+            self.executor.submit(self.write, key, kind, tensors)
+
+    def store(self, key: str, item: tuple):
+        with self.lock:
+            if key in self.items:
+                self.total -= self.items.pop(key)[2]
+            self.items[key] = item
+            self.total += item[2]
+            while len(self.items) > 1 and self.total > self.budget:
+                _key, evicted = self.items.popitem(last=False)
+                self.total -= evicted[2]
+
+    def read(self, key: str):
+        fn = self.path(key)
+        if not os.path.isfile(fn):
+            return None
+        try:
+            t0 = time.time()
+            with safe_open(fn, framework='pt', device='cpu') as f:
+                metadata = f.metadata()
+                names = json.loads(metadata['names'])
+                tensors = [f.get_tensor(name) if name is not None else None for name in names]
+            item = (metadata['kind'], tensors, sum(tensor_size(t) for t in tensors))
+            if self.budget > 0:
+                self.store(key, item)
+            debug(f'IP adapter cache: disk get={key} time={time.time()-t0:.3f}')
+            return item
+        except Exception as e:
+            debug(f'IP adapter cache: disk get={key} {e}')
+            return None
+
+    def write(self, key: str, kind: str, tensors: list):
+        fn = self.path(key)
+        try:
+            names = [str(i) if t is not None else None for i, t in enumerate(tensors)]
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            tmp = f'{fn}.tmp'
+            save_file({ name: t for name, t in zip(names, tensors) if name is not None }, tmp, metadata={ 'kind': kind, 'names': json.dumps(names) })
+            os.replace(tmp, fn)
+        except Exception as e:
+            shared.log.error(f'IP adapter cache: file="{fn}" {e}')
+
+    def stats(self) -> str:
+        return f'hits={self.job_hits} misses={self.job_misses} rate={self.rate:.2f} items={len(self.items)} size={self.total}'
+
+
+cache = ImageEmbedsCache()
@@ -222,7 +222,7 @@ class ExtraNetworkLora(extra_networks.ExtraNetwork):
             has_changed = self.changed(requested, include, exclude)
             if has_changed:
                 jobid = shared.state.begin('LoRA')
-                if len(l.previously_loaded_networks) > 0:
+                if len(l.previously_loaded_networks) > 0 and not networks.incremental(): # incremental activate removes previous networks per-layer
                     shared.log.info(f'Network unload: type=LoRA apply={[n.name for n in l.previously_loaded_networks]} mode={"fuse" if shared.opts.lora_fuse_diffusers else "backup"}')
                     networks.network_deactivate(include, exclude)
                 networks.network_activate(include, exclude)
@@ -235,7 +235,7 @@ class ExtraNetworkLora(extra_networks.ExtraNetwork):
             infotext(p)
             prompt(p)
             if has_changed and len(include) == 0: # print only once
-                shared.log.info(f'Network load: type=LoRA apply={[n.name for n in l.loaded_networks]} method={load_method} mode={"fuse" if shared.opts.lora_fuse_diffusers else "backup"} te={te_multipliers} unet={unet_multipliers} time={l.timer.summary}')
+                shared.log.info(f'Network load: type=LoRA apply={[n.name for n in l.loaded_networks]} method={load_method} mode={"fuse" if shared.opts.lora_fuse_diffusers else "backup"} te={te_multipliers} unet={unet_multipliers} time={l.timer.summary} cache={l.timer.cache}')
 
     def deactivate(self, p):
         if len(lora_diffusers.diffuser_loaded) > 0:
@@ -1,4 +1,5 @@
 from typing import Union
+from contextlib import contextmanager
 import re
 import time
 import torch
@@ -75,7 +76,46 @@ def network_backup_weights(self: Union[torch.nn.Conv2d, torch.nn.Linear, torch.n
     return backup_size
 
 
-def network_calc_weights(self: Union[torch.nn.Conv2d, torch.nn.Linear, torch.nn.GroupNorm, torch.nn.LayerNorm, diffusers.models.lora.LoRACompatibleLinear, diffusers.models.lora.LoRACompatibleConv], network_layer_name: str, use_previous: bool = False):
+def network_get_weight(self: Union[torch.nn.Conv2d, torch.nn.Linear, torch.nn.GroupNorm, torch.nn.LayerNorm, diffusers.models.lora.LoRACompatibleLinear, diffusers.models.lora.LoRACompatibleConv]):
+    if hasattr(self, "sdnq_dequantizer_backup"):
+        return self.sdnq_dequantizer_backup.to(devices.device)(
+            self.weight.to(devices.device),
+            self.sdnq_scale_backup.to(devices.device),
+            self.sdnq_zero_point_backup.to(devices.device) if self.sdnq_zero_point_backup is not None else None,
+            self.sdnq_svd_up_backup.to(devices.device) if self.sdnq_svd_up_backup is not None else None,
+            self.sdnq_svd_down_backup.to(devices.device) if self.sdnq_svd_down_backup is not None else None,
+            skip_quantized_matmul=self.sdnq_dequantizer_backup.use_quantized_matmul
+        )
+    elif hasattr(self, "sdnq_dequantizer"):
+        return self.sdnq_dequantizer.to(devices.device)(
+            self.weight.to(devices.device),
+            self.scale.to(devices.device),
+            self.zero_point.to(devices.device) if self.zero_point is not None else None,
+            self.svd_up.to(devices.device) if self.svd_up is not None else None,
+            self.svd_down.to(devices.device) if self.svd_down is not None else None,
+            skip_quantized_matmul=self.sdnq_dequantizer.use_quantized_matmul
+        )
+    else:
+        return self.weight.to(devices.device) # must perform calc on gpu due to performance
+
+
+def network_signature(net) -> tuple:
+    unet_multiplier = list(net.unet_multiplier) if isinstance(net.unet_multiplier, (list, tuple)) else net.unet_multiplier
+    return (net.te_multiplier, unet_multiplier, net.dyn_dim)
+
+
+@contextmanager
+def network_scale(net, signature: tuple):
+    current = (net.te_multiplier, net.unet_multiplier, net.dyn_dim)
+    net.te_multiplier, net.unet_multiplier, net.dyn_dim = signature
+    try:
+        yield
+    finally:
+        net.te_multiplier, net.unet_multiplier, net.dyn_dim = current
+
+
+def network_calc_weights(self: Union[torch.nn.Conv2d, torch.nn.Linear, torch.nn.GroupNorm, torch.nn.LayerNorm, diffusers.models.lora.LoRACompatibleLinear, diffusers.models.lora.LoRACompatibleConv], network_layer_name: str, use_previous: bool = False, delta: list = None):
+    """sum updown of all loaded networks for layer; if delta list of (net, signature, sign) is provided, only those contributions are computed using their recorded scale"""
     if shared.opts.diffusers_offload_mode == "none":
         try:
             self.to(devices.device)
@@ -83,36 +123,26 @@ def network_calc_weights(self: Union[torch.nn.Conv2d, torch.nn.Linear, torch.nn.
             pass
     batch_updown = None
     batch_ex_bias = None
-    loaded = l.loaded_networks if not use_previous else l.previously_loaded_networks
-    for net in loaded:
+    if delta is None:
+        loaded = l.loaded_networks if not use_previous else l.previously_loaded_networks
+        delta = [(net, None, 1) for net in loaded]
+    for net, signature, sign in delta:
         module = net.modules.get(network_layer_name, None)
         if module is None:
             continue
         try:
             t0 = time.time()
-            if hasattr(self, "sdnq_dequantizer_backup"):
-                weight = self.sdnq_dequantizer_backup.to(devices.device)(
-                    self.weight.to(devices.device),
-                    self.sdnq_scale_backup.to(devices.device),
-                    self.sdnq_zero_point_backup.to(devices.device) if self.sdnq_zero_point_backup is not None else None,
-                    self.sdnq_svd_up_backup.to(devices.device) if self.sdnq_svd_up_backup is not None else None,
-                    self.sdnq_svd_down_backup.to(devices.device) if self.sdnq_svd_down_backup is not None else None,
-                    skip_quantized_matmul=self.sdnq_dequantizer_backup.use_quantized_matmul
-                )
-            elif hasattr(self, "sdnq_dequantizer"):
-                weight = self.sdnq_dequantizer.to(devices.device)(
-                    self.weight.to(devices.device),
-                    self.scale.to(devices.device),
-                    self.zero_point.to(devices.device) if self.zero_point is not None else None,
-                    self.svd_up.to(devices.device) if self.svd_up is not None else None,
-                    self.svd_down.to(devices.device) if self.svd_down is not None else None,
-                    skip_quantized_matmul=self.sdnq_dequantizer.use_quantized_matmul
-                )
+            weight = network_get_weight(self)
+            if signature is not None:
+                with network_scale(net, signature):
+                    updown, ex_bias = module.calc_updown(weight)
             else:
-                weight = self.weight.to(devices.device) # must perform calc on gpu due to performance
-            updown, ex_bias = module.calc_updown(weight)
+                updown, ex_bias = module.calc_updown(weight)
             weight = None
             del weight
+            if sign < 0:
+                updown = -updown if updown is not None else None
+                ex_bias = -ex_bias if ex_bias is not None else None
 
             if updown is not None:
                 if batch_updown is not None:
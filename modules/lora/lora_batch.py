@@ -0,0 +1,98 @@
+import time
+import torch
+from modules import shared, devices
+from modules.lora import lora_common as l
+from modules.lora.lora_apply import network_scale
+from modules.lora.network_lora import NetworkModuleLora
+
+
+batch_memory = 1024 * 1024 * 1024 # max size of pending layer updowns before batch is flushed
+
+
+def network_eligible(self: torch.nn.Module, network_layer_name: str, contributions: list) -> bool:
+    """layer can use batched path if its weight is plain floating point and all contributions are conventional lora up/down pairs"""
+    if shared.opts.diffusers_offload_mode == "sequential":
+        return False
+    weight = getattr(self, 'weight', None)
+    if weight is None or not weight.dtype.is_floating_point:
+        return False
+    if hasattr(self, 'sdnq_dequantizer') or getattr(weight, 'quant_type', None) is not None or self.__class__.__name__ == 'Linear4bit':
+        return False
+    for net, signature, _sign in contributions:
+        module = net.modules.get(network_layer_name, None)
+        if module is None:
+            continue
+        if not isinstance(module, NetworkModuleLora) or module.mid_model is not None or module.dora_scale is not None or module.bias is not None:
+            return False
+        dyn_dim = signature[2] if signature is not None else net.dyn_dim
+        if dyn_dim is not None:
+            return False
+        up, down = module.up_model.weight, module.down_model.weight
+        if up.shape[0] * down[0].numel() != weight.numel(): # includes inpaint models which require padding
+            return False
+    return True
+
+
+class LayerBatch:
+    """collect lora up/down pairs across layers, compute same-shaped pairs using single batched matmul and apply results in bulk"""
+
+    def __init__(self, apply_fn):
+        self.apply_fn = apply_fn
+        self.layers = []
+        self.size = 0
+        self.flushes = 0
+        self.matmuls = 0
+
+    def add(self, module: torch.nn.Module, network_layer_name: str, device: torch.device, contributions: list, state=None):
+        t0 = time.time()
+        items = []
+        for net, signature, sign in contributions:
+            net_module = net.modules.get(network_layer_name, None)
+            if net_module is None:
+                continue
+            if signature is not None:
+                with network_scale(net, signature):
+                    scale = net_module.calc_scale() * net_module.multiplier()
+            else:
+                scale = net_module.calc_scale() * net_module.multiplier()
+            up = net_module.up_model.weight
+            down = net_module.down_model.weight
+            items.append((up.reshape(up.shape[0], -1), down.reshape(down.shape[0], -1), sign * scale))
+        self.layers.append((module, network_layer_name, device, items, state))
+        self.size += module.weight.numel() * module.weight.element_size()
+        l.timer.batch += time.time() - t0
+        if self.size >= batch_memory:
+            self.flush()
+
+    def flush(self):
+        if len(self.layers) == 0:
+            return
+        t0 = time.time()
+        groups = {}
+        for i, (module, _name, _device, items, _state) in enumerate(self.layers):
+            dtype = module.weight.dtype
+            for up, down, scale in items:
+                key = (tuple(up.shape), tuple(down.shape), dtype)
+                groups.setdefault(key, []).append((i, up, down, scale))
+        results = [None] * len(self.layers)
+        for (_up_shape, _down_shape, dtype), group in groups.items():
+            src = group[0][1].device
+            ups = torch.stack([g[1].to(src) for g in group]).to(devices.device, dtype=dtype, non_blocking=True)
+            downs = torch.stack([g[2].to(src) for g in group]).to(devices.device, dtype=dtype, non_blocking=True)
+            scales = torch.tensor([g[3] for g in group], device=devices.device, dtype=dtype).view(-1, 1, 1)
+            updowns = torch.bmm(ups, downs).mul_(scales)
+            self.matmuls += 1
+            for j, g in enumerate(group):
+                results[g[0]] = updowns[j] if results[g[0]] is None else results[g[0]] + updowns[j]
+            del ups, downs, scales, updowns
+        t1 = time.time()
+        l.timer.calc += t1 - t0
+        for i, (module, name, device, _items, state) in enumerate(self.layers):
+            updown = results[i].reshape(module.weight.shape) if results[i] is not None else None
+            results[i] = None
+            self.apply_fn(module, name, device, updown, None, state)
+        self.flushes += 1
+        if l.debug:
+            shared.log.debug(f'Network batch: type=LoRA layers={len(self.layers)} groups={len(groups)} size={self.size} calc={t1-t0:.3f} apply={time.time()-t1:.3f}')
+        self.layers.clear()
+        self.size = 0
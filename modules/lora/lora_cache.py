@@ -0,0 +1,92 @@
+from collections import OrderedDict
+import os
+import torch
+from modules import shared, devices
+from modules.lora import lora_common as l
+
+
+def tensor_size(t: torch.Tensor) -> int:
+    return t.numel() * t.element_size() if isinstance(t, torch.Tensor) else 0
+
+
+def weights_size(w: dict) -> int:
+    return sum(tensor_size(t) for t in w.values())
+
+
+def pin_tensor(t: torch.Tensor) -> torch.Tensor:
+    if not isinstance(t, torch.Tensor) or t.device.type != 'cpu' or t.is_pinned():
+        return t
+    try:
+        return t.pin_memory()
+    except Exception:
+        return t
+
+
+def pin_module(module):
+    """pin NetworkWeights tensors held by network module in host memory so repeated activations use faster page-locked h2d copies"""
+    if not shared.opts.lora_cache_pinned or not torch.cuda.is_available() or devices.backend not in {'cuda', 'rocm', 'zluda'}:
+        return
+    for k, v in list(vars(module).items()):
+        if k == 'sd_module': # model layer itself is not owned by network
+            continue
+        if isinstance(v, torch.nn.Module):
+            for p in v.parameters(recurse=True):
+                p.data = pin_tensor(p.data)
+        elif isinstance(v, torch.Tensor):
+            setattr(module, k, pin_tensor(v))
+
+
+class NetworkCache(OrderedDict):
+    """lora in-memory cache with lru ordering, trimmed by both item count and total size in bytes"""
+
+    def __init__(self):
+        super().__init__()
+        self.sizes: dict[str, int] = {}
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes.values())
+
+    @property
+    def budget(self) -> int:
+        return int(shared.opts.lora_cache_size) * 1024 * 1024
+
+    def get(self, name, default=None):
+        net = super().get(name, None)
+        if net is None:
+            l.timer.cache_miss += 1
+            return default
+        mtime = getattr(net, 'mtime', None)
+        filename = getattr(net.network_on_disk, 'filename', None)
+        if mtime is not None and filename is not None and os.path.isfile(filename) and os.path.getmtime(filename) != mtime: # file replaced on disk
+            self.pop(name, None)
+            l.timer.cache_miss += 1
+            return default
+        self.move_to_end(name)
+        l.timer.cache_hit += 1
+        return net
+
+    def put(self, name, net, size: int = 0):
+        self[name] = net
+        self.move_to_end(name)
+        self.sizes[name] = size
+
+    def pop(self, name, default=None):
+        self.sizes.pop(name, None)
+        return super().pop(name, default)
+
+    def clear(self):
+        self.sizes.clear()
+        super().clear()
+
+    def trim(self):
+        budget = self.budget
+        while len(self) > 0 and (len(self) > shared.opts.lora_in_memory_limit or (budget > 0 and self.total > budget)):
+            name = next(iter(self))
+            self.pop(name, None)
+            l.timer.cache_evict += 1
+        if l.debug:
+            shared.log.debug(f'Network cache: type=LoRA items={len(self)} size={self.total} budget={budget} stats={l.timer.cache}')
+
+    def __repr__(self):
+        return f'NetworkCache(items={list(self)} size={self.total})'
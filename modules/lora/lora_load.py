@@ -3,11 +3,11 @@ import os
 import time
 import concurrent
 from modules import shared, errors, sd_models, sd_models_compile, files_cache
-from modules.lora import network, lora_overrides, lora_convert, lora_diffusers
+from modules.lora import network, lora_overrides, lora_convert, lora_diffusers, lora_cache as cache
 from modules.lora import lora_common as l
 
 
-lora_cache = {}
+lora_cache = cache.NetworkCache()
 available_networks = {}
 available_network_aliases = {}
 forbidden_network_aliases = {}
@@ -108,8 +108,10 @@ def load_safetensors(name, network_on_disk: network.NetworkOnDisk) -> Union[netw
     state_dict = None
     del state_dict
     module_errors = 0
+    net_size = 0
     for key, weights in matched_networks.items():
         net_module = None
+        net_size += cache.weights_size(weights.w)
         for nettype in l.module_types:
             net_module = nettype.create_module(net, weights)
             if net_module is not None:
@@ -120,6 +122,7 @@ def load_safetensors(name, network_on_disk: network.NetworkOnDisk) -> Union[netw
             if l.debug:
                 shared.log.error(f'LoRA unhandled: name={name} key={key} weights={weights.w.keys()}')
         else:
+            cache.pin_module(net_module)
             net.modules[key] = net_module
     if module_errors > 0:
         shared.log.error(f'Network load: type=LoRA name="{name}" file="{network_on_disk.filename}" errors={module_errors} empty modules')
@@ -128,10 +131,10 @@ def load_safetensors(name, network_on_disk: network.NetworkOnDisk) -> Union[netw
         if l.debug:
             shared.log.debug(f'Network load: type=LoRA name="{name}" unmatched={keys_failed_to_match}')
     else:
-        shared.log.debug(f'Network load: type=LoRA name="{name}" type={set(network_types)} keys={len(matched_networks)} dtypes={dtypes} fuse={shared.opts.lora_fuse_diffusers}')
+        shared.log.debug(f'Network load: type=LoRA name="{name}" type={set(network_types)} keys={len(matched_networks)} dtypes={dtypes} size={net_size} fuse={shared.opts.lora_fuse_diffusers}')
     if len(matched_networks) == 0:
         return None
-    lora_cache[name] = net
+    lora_cache.put(name, net, net_size)
     net.bundle_embeddings = bundle_embeddings
     return net
 
@@ -275,9 +278,7 @@ def network_load(names, te_multipliers=None, unet_multipliers=None, dyn_dims=Non
         net.dyn_dim = dyn_dims[i] if dyn_dims else shared.opts.extra_networks_default_multiplier
         l.loaded_networks.append(net)
 
-    while len(lora_cache) > shared.opts.lora_in_memory_limit:
-        name = next(iter(lora_cache))
-        lora_cache.pop(name, None)
+    lora_cache.trim()
 
     if not skip_lora_load and len(lora_diffusers.diffuser_loaded) > 0:
         shared.log.debug(f'Network load: type=LoRA loaded={lora_diffusers.diffuser_loaded} available={sd_model.get_list_adapters()} active={sd_model.get_active_adapters()} scales={lora_diffusers.diffuser_scales}')
@@ -303,7 +304,7 @@ def network_load(names, te_multipliers=None, unet_multipliers=None, dyn_dims=Non
                 errors.display(e, 'LoRA')
 
     if len(l.loaded_networks) > 0 and l.debug:
-        shared.log.debug(f'Network load: type=LoRA loaded={[n.name for n in l.loaded_networks]} cache={list(lora_cache)}')
+        shared.log.debug(f'Network load: type=LoRA loaded={[n.name for n in l.loaded_networks]} cache={lora_cache} stats={l.timer.cache}')
 
     if recompile_model:
         shared.log.info("Network load: type=LoRA recompiling model")
@@ -3,11 +3,15 @@ class Timer():
     load: float = 0
     backup: float = 0
     calc: float = 0
+    batch: float = 0
     apply: float = 0
     move: float = 0
     restore: float = 0
     activate: float = 0
     deactivate: float = 0
+    cache_hit: int = 0
+    cache_miss: int = 0
+    cache_evict: int = 0
 
     @property
     def total(self):
@@ -17,22 +21,32 @@ class Timer():
     def summary(self):
         t = {}
         for k, v in self.__dict__.items():
+            if k.startswith('cache_'):
+                continue
             if v > 0.1:
                 t[k] = round(v, 2)
         return t
 
+    @property
+    def cache(self):
+        return { 'hit': self.cache_hit, 'miss': self.cache_miss, 'evict': self.cache_evict }
+
     def clear(self, complete: bool = False):
         self.backup = 0
         self.calc = 0
+        self.batch = 0
         self.apply = 0
         self.move = 0
         self.restore = 0
-        if complete:
+        if complete: # cache stats are per generation same as timings
             self.activate = 0
             self.deactivate = 0
+            self.cache_hit = 0
+            self.cache_miss = 0
+            self.cache_evict = 0
 
     def add(self, name, t):
         self.__dict__[name] += t
 
     def __str__(self):
-        return f'{self.__class__.__name__}({self.summary})'
+        return f'{self.__class__.__name__}({self.summary} cache={self.cache})'
@@ -1,14 +1,38 @@
 from contextlib import nullcontext
 import time
 import rich.progress as rp
-from modules.lora import lora_common as l
-from modules.lora.lora_apply import network_apply_weights, network_apply_direct, network_backup_weights, network_calc_weights
+from modules.lora import lora_common as l, lora_batch
+from modules.lora.lora_apply import network_apply_weights, network_apply_direct, network_backup_weights, network_calc_weights, network_signature
 from modules import shared, devices, sd_models
 
 
 applied_layers: list[str] = []
 
 
+def incremental():
+    return shared.opts.lora_fuse_diffusers and shared.opts.lora_incremental
+
+
+def network_layer_wanted(network_layer_name: str, signatures: dict) -> dict:
+    wanted = {}
+    for net in l.loaded_networks:
+        if network_layer_name in net.modules:
+            wanted[net.name] = (net, signatures[net.name])
+    return wanted
+
+
+def network_layer_delta(applied: dict, wanted: dict) -> list:
+    """per-layer difference between applied and wanted networks as list of (net, signature, sign)"""
+    delta = []
+    for name, (net, signature) in applied.items():
+        if name not in wanted or wanted[name][1] != signature or wanted[name][0] is not net:
+            delta.append((net, signature, -1))
+    for name, (net, signature) in wanted.items():
+        if name not in applied or applied[name][1] != signature or applied[name][0] is not net:
+            delta.append((net, signature, 1))
+    return delta
+
+
 def network_activate(include=[], exclude=[]):
     t0 = time.time()
     sd_model = getattr(shared.sd_model, "pipe", shared.sd_model)
@@ -34,41 +58,64 @@ def network_activate(include=[], exclude=[]):
         pbar = nullcontext()
     applied_weight = 0
     applied_bias = 0
+    use_delta = incremental()
+
+    def apply_layer(module, network_layer_name, device, batch_updown, batch_ex_bias, wanted):
+        nonlocal applied_weight, applied_bias
+        if use_delta or shared.opts.lora_fuse_diffusers:
+            network_apply_direct(module, batch_updown, batch_ex_bias, device=device)
+        else:
+            network_apply_weights(module, batch_updown, batch_ex_bias, device=device)
+        if batch_updown is not None or batch_ex_bias is not None:
+            applied_layers.append(network_layer_name)
+            applied_weight += 1 if batch_updown is not None else 0
+            applied_bias += 1 if batch_ex_bias is not None else 0
+        module.network_applied = wanted
+
     with devices.inference_context(), pbar:
         wanted_names = tuple((x.name, x.te_multiplier, x.unet_multiplier, x.dyn_dim) for x in l.loaded_networks) if len(l.loaded_networks) > 0 else ()
+        signatures = { x.name: network_signature(x) for x in l.loaded_networks }
+        batch = lora_batch.LayerBatch(apply_layer) if shared.opts.lora_batch_apply else None
         applied_layers.clear()
         backup_size = 0
+        skipped = 0
         for component in modules.keys():
             device = getattr(sd_model, component, None).device
             for _, module in modules[component]:
                 network_layer_name = getattr(module, 'network_layer_name', None)
-                current_names = getattr(module, "network_current_names", ())
-                if getattr(module, 'weight', None) is None or shared.state.interrupted or network_layer_name is None or current_names == wanted_names:
+                if getattr(module, 'weight', None) is None or shared.state.interrupted or network_layer_name is None:
+                    if task is not None:
+                        pbar.update(task, advance=1)
+                    continue
+                applied = getattr(module, "network_applied", {})
+                wanted = network_layer_wanted(network_layer_name, signatures)
+                delta = network_layer_delta(applied, wanted)
+                module.network_current_names = wanted_names
+                if len(delta) == 0: # layer is not affected by any network change
+                    skipped += 1
                     if task is not None:
                         pbar.update(task, advance=1)
                     continue
                 backup_size += network_backup_weights(module, network_layer_name, wanted_names)
-                batch_updown, batch_ex_bias = network_calc_weights(module, network_layer_name)
-                if shared.opts.lora_fuse_diffusers:
-                    network_apply_direct(module, batch_updown, batch_ex_bias, device=device)
+                contributions = delta if use_delta else [(net, None, 1) for net in l.loaded_networks] # incremental applies only difference between applied and wanted networks
+                if batch is not None and lora_batch.network_eligible(module, network_layer_name, contributions):
+                    batch.add(module, network_layer_name, device, contributions, wanted)
                 else:
-                    network_apply_weights(module, batch_updown, batch_ex_bias, device=device)
-                if batch_updown is not None or batch_ex_bias is not None:
-                    applied_layers.append(network_layer_name)
-                    applied_weight += 1 if batch_updown is not None else 0
-                    applied_bias += 1 if batch_ex_bias is not None else 0
-                batch_updown, batch_ex_bias = None, None
-                del batch_updown, batch_ex_bias
-                module.network_current_names = wanted_names
+                    batch_updown, batch_ex_bias = network_calc_weights(module, network_layer_name, delta=contributions)
+                    apply_layer(module, network_layer_name, device, batch_updown, batch_ex_bias, wanted)
+                    batch_updown, batch_ex_bias = None, None
+                    del batch_updown, batch_ex_bias
                 if task is not None:
                     bs = round(backup_size/1024/1024/1024, 2) if backup_size > 0 else None
-                    pbar.update(task, advance=1, description=f'networks={len(l.loaded_networks)} modules={active_components} layers={total} weights={applied_weight} bias={applied_bias} backup={bs} device={device}')
+                    pbar.update(task, advance=1, description=f'networks={len(l.loaded_networks)} modules={active_components} layers={total} weights={applied_weight} bias={applied_bias} skip={skipped} backup={bs} device={device}')
+            if batch is not None:
+                batch.flush()
 
         if task is not None and len(applied_layers) == 0:
             pbar.remove_task(task) # hide progress bar for no action
     l.timer.activate += time.time() - t0
     if l.debug and len(l.loaded_networks) > 0:
-        shared.log.debug(f'Network load: type=LoRA networks={[n.name for n in l.loaded_networks]} modules={active_components} layers={total} weights={applied_weight} bias={applied_bias} backup={round(backup_size/1024/1024/1024, 2)} fuse={shared.opts.lora_fuse_diffusers} device={device} time={l.timer.summary}')
+        shared.log.debug(f'Network load: type=LoRA networks={[n.name for n in l.loaded_networks]} modules={active_components} layers={total} weights={applied_weight} bias={applied_bias} skip={skipped} backup={round(backup_size/1024/1024/1024, 2)} fuse={shared.opts.lora_fuse_diffusers} incremental={use_delta} batch={batch.matmuls if batch is not None else None} device={device} time={l.timer.summary}')
     modules.clear()
     if len(applied_layers) > 0 or shared.opts.diffusers_offload_mode == "sequential":
         sd_models.set_diffuser_offload(sd_model, op="model")
@@ -120,6 +167,7 @@ def network_deactivate(include=[], exclude=[]):
                     applied_layers.append(network_layer_name)
                 del batch_updown, batch_ex_bias
                 module.network_current_names = ()
+                module.network_applied = {}
                 if task is not None:
                     pbar.update(task, advance=1, description=f'networks={len(l.previously_loaded_networks)} modules={active_components} layers={total} unapply={len(applied_layers)}')
 
@@ -1,7 +1,10 @@
 import os
+import json
+import struct
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import contextmanager
+from contextlib import contextmanager, ExitStack
 from typing import Dict, Optional, Tuple, Set
+import safetensors
 import safetensors.torch
 import torch
 from tensordict import TensorDict
@@ -402,3 +405,196 @@ def save_model(model, output_file, file_format) -> None:
         )
     else:
         torch.save({"state_dict": model}, f"{output_file}.ckpt")
+
+
+SAFETENSORS_DTYPES = {
+    torch.float64: "F64",
+    torch.float32: "F32",
+    torch.float16: "F16",
+    torch.bfloat16: "BF16",
+    torch.int64: "I64",
+    torch.int32: "I32",
+    torch.int16: "I16",
+    torch.int8: "I8",
+    torch.uint8: "U8",
+    torch.bool: "BOOL",
+}
+if hasattr(torch, "float8_e4m3fn"):
+    SAFETENSORS_DTYPES[torch.float8_e4m3fn] = "F8_E4M3"
+    SAFETENSORS_DTYPES[torch.float8_e5m2] = "F8_E5M2"
+
+
+class LazyTheta:
+    """memory-mapped safetensors model that loads a single tensor on access"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.keyset = set(handle.keys())
+
+    def keys(self):
+        return self.keyset
+
+    def __contains__(self, key):
+        return key in self.keyset
+
+    def __len__(self):
+        return len(self.keyset)
+
+    def __getitem__(self, key):
+        return self.handle.get_tensor(key)
+
+    def shape(self, key):
+        return self.handle.get_slice(key).get_shape()
+
+
+class StreamingWriter:
+    """incremental safetensors writer, header space is reserved up front so tensors are appended as soon as they are merged
+    output is split into numbered shards with an index file once shard_size bytes are exceeded"""
+
+    def __init__(self, output_file: str, shapes: Dict[str, list], metadata: Dict = None, shard_size: int = 0):
+        self.output_file = output_file
+        self.shapes = shapes # all keys that will be written, used to size reserved header
+        self.metadata = {k: str(v) for k, v in (metadata or {}).items()}
+        self.shard_size = shard_size
+        self.shards = []
+        self.weight_map = {}
+        self.total = 0
+        self.file = None
+        self.header = {}
+        self.reserved = 0
+        self.offset = 0
+
+    def shard_name(self, i: int, n: int = None) -> str:
+        base, ext = os.path.splitext(self.output_file)
+        return f"{base}-{i+1:05d}{ext}.tmp" if n is None else f"{base}-{i+1:05d}-of-{n:05d}{ext}"
+
+    def open(self):
+        remaining = [k for k in self.shapes if k not in self.weight_map]
+        reserved = len(json.dumps({"__metadata__": self.metadata})) + 64
+        for k in remaining:
+            reserved += len(json.dumps(k)) + 64 + 21 * (len(self.shapes[k]) + 2)
+        self.reserved = (reserved + 7) // 8 * 8 # keep tensor data 8-byte aligned
+        self.file = open(self.shard_name(len(self.shards)), "wb") # pylint: disable=consider-using-with
+        self.file.write(b" " * (8 + self.reserved))
+        self.header = {}
+        self.offset = 0
+
+    def close(self):
+        if self.file is None:
+            return
+        header = json.dumps({"__metadata__": self.metadata, **self.header}, separators=(",", ":")).encode("utf-8")
+        if len(header) > self.reserved:
+            raise RuntimeError(f"Merge streaming: header overflow size={len(header)} reserved={self.reserved}")
+        self.file.seek(0)
+        self.file.write(struct.pack("<Q", self.reserved))
+        self.file.write(header + b" " * (self.reserved - len(header)))
+        self.file.close()
+        self.shards.append(self.file.name)
+        self.file = None
+
+    def write(self, key: str, tensor: torch.Tensor):
+        tensor = tensor.detach().to("cpu").contiguous()
+        size = tensor.numel() * tensor.element_size()
+        if self.file is not None and self.shard_size > 0 and self.offset > 0 and self.offset + size > self.shard_size:
+            self.close()
+        if self.file is None:
+            self.open()
+        if size > 0:
+            self.file.write(tensor.reshape(-1).view(torch.uint8).numpy())
+        self.header[key] = {"dtype": SAFETENSORS_DTYPES[tensor.dtype], "shape": list(tensor.shape), "data_offsets": [self.offset, self.offset + size]}
+        self.offset += size
+        self.total += size
+        self.weight_map[key] = len(self.shards)
+
+    def finalize(self) -> list:
+        if self.file is None and len(self.shards) == 0:
+            self.open()
+        self.close()
+        if len(self.shards) == 1:
+            os.replace(self.shards[0], self.output_file)
+            return [self.output_file]
+        n = len(self.shards)
+        files = []
+        for i, tmp in enumerate(self.shards):
+            files.append(self.shard_name(i, n))
+            os.replace(tmp, files[-1])
+        index = {
+            "metadata": {"total_size": self.total, **self.metadata},
+            "weight_map": {k: os.path.basename(files[i]) for k, i in self.weight_map.items()},
+        }
+        with open(f"{self.output_file}.index.json", "w", encoding="utf8") as f:
+            json.dump(index, f, indent=2)
+        return files
+
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            self.shards.append(self.file.name)
+            self.file = None
+        for tmp in self.shards:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def merge_models_streaming(
+    models: Dict[str, os.PathLike],
+    output_file: str,
+    merge_mode: str,
+    precision: str = "fp16",
+    weights_clip: bool = False,
+    device: torch.device = None,
+    work_device: torch.device = None,
+    prune: bool = False,
+    shard_size: int = 0,
+    metadata: Dict = None,
+    overrides: Dict = None,
+    **kwargs,
+) -> list:
+    """merge memory-mapped safetensors models one key at a time and write result incrementally
+    peak memory is bounded by largest tensor times number of input models"""
+    overrides = overrides or {}
+    with ExitStack() as stack:
+        thetas = {k: LazyTheta(stack.enter_context(safetensors.safe_open(m, framework="pt", device="cpu"))) for k, m in models.items()}
+        keyset = set.intersection(*[set(m.keys()) for m in thetas.values() if len(m.keys())])
+        keys = list(thetas["model_a"].keys())
+        if prune: # same as un_prune_model, keys only present in secondary model are restored only when pruning
+            keys += [k for k in thetas["model_b"].keys() if "model" in k and KEY_POSITION_IDS not in k and k not in thetas["model_a"]]
+        shapes = {}
+        for key in keys:
+            source = thetas["model_a"] if key in thetas["model_a"] else thetas["model_b"]
+            shapes[key] = max([source.shape(key)] + [m.shape(key) for m in thetas.values() if key in m], key=len)
+        weight_matcher = WeightClass(thetas["model_a"], **kwargs)
+        writer = StreamingWriter(output_file, shapes, metadata, shard_size)
+
+        def load(theta, key):
+            tensor = overrides[key] if key in overrides else theta[key]
+            tensor = tensor.to(device)
+            if precision == "fp16" and tensor.is_floating_point():
+                tensor = tensor.half()
+            return tensor
+
+        import rich.progress as p
+        try:
+            with p.Progress(p.TextColumn('[cyan]{task.description}'), p.BarColumn(), p.TaskProgressColumn(), p.TimeRemainingColumn(), p.TimeElapsedColumn(), p.TextColumn('[cyan]keys={task.fields[keys]}'), console=console) as progress:
+                task = progress.add_task(description="Merging", total=len(keys), keys=len(keys))
+                for key in keys:
+                    if key == KEY_POSITION_IDS:
+                        writer.write(key, torch.tensor([list(range(MAX_TOKENS))], dtype=torch.int64))
+                    elif key not in thetas["model_a"]:
+                        writer.write(key, load(thetas["model_b"], key))
+                    elif key in overrides or KEY_POSITION_IDS in key or key not in keyset or (prune and not key.startswith(("model.diffusion_model.", "cond_stage_model."))):
+                        if not prune or "model" in key or key in overrides:
+                            writer.write(key, load(thetas["model_a"], key))
+                    else:
+                        key_thetas = {k: {key: load(m, key)} for k, m in thetas.items()}
+                        merged = merge_key(key, key_thetas, weight_matcher, merge_mode, precision, weights_clip, device, work_device)
+                        writer.write(key, merged)
+                        del key_thetas, merged
+                    progress.update(task, advance=1)
+            files = writer.finalize()
+        except BaseException:
+            writer.abort()
+            raise
+    log_vram("streaming merge")
+    log.info(f"Merge streaming: keys={len(writer.weight_map)} size={writer.total} shards={len(files)} file='{output_file}'")
+    return files
@@ -1,9 +1,9 @@
 import numpy as np
 import torch
 from PIL import Image
-from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, TimeElapsedColumn
 import modules.postprocess.esrgan_model_arch as arch
-from modules import images, devices, shared
+from modules import devices, shared
+from modules.postprocess import tiling
 from modules.upscaler import Upscaler, UpscalerData, compile_upscaler
 
 
@@ -191,30 +191,15 @@ def upscale_without_tiling(model, img):
 def esrgan_upscale(model, img):
     if shared.opts.upscaler_tile_size == 0:
         return upscale_without_tiling(model, img)
-
-    grid = images.split_grid(img, shared.opts.upscaler_tile_size, shared.opts.upscaler_tile_size, shared.opts.upscaler_tile_overlap)
-    newtiles = []
-    scale_factor = 1
-
-    with Progress(TextColumn('[cyan]{task.description}'), BarColumn(), TaskProgressColumn(), TimeRemainingColumn(), TimeElapsedColumn(), console=shared.console) as progress:
-        total = 0
-        for _y, _h, row in grid.tiles:
-            total += len(row)
-        task = progress.add_task(description="Upscaling", total=total)
-        for y, h, row in grid.tiles:
-            if shared.state.interrupted:
-                break
-            newrow = []
-            for tiledata in row:
-                if shared.state.interrupted:
-                    break
-                x, w, tile = tiledata
-                output = upscale_without_tiling(model, tile)
-                scale_factor = output.width // tile.width
-                newrow.append([x * scale_factor, w * scale_factor, output])
-                progress.update(task, advance=1, description="Upscaling")
-            newtiles.append([y * scale_factor, h * scale_factor, newrow])
-
-    newgrid = images.Grid(newtiles, grid.tile_w * scale_factor, grid.tile_h * scale_factor, grid.image_w * scale_factor, grid.image_h * scale_factor, grid.overlap * scale_factor)
-    output = images.combine_grid(newgrid)
-    return output
+    img = np.array(img)
+    img = img[:, :, ::-1]
+    img = np.ascontiguousarray(np.transpose(img, (2, 0, 1))) / 255
+    img = torch.from_numpy(img).float()
+    img = img.unsqueeze(0).to(devices.device)
+    with devices.inference_context():
+        output = tiling.tiled_forward(model, img)
+    output = output.squeeze().float().clamp_(0, 1).cpu().numpy()
+    output = 255. * np.moveaxis(output, 0, 2)
+    output = output.astype(np.uint8)
+    output = output[:, :, ::-1]
+    return Image.fromarray(output, 'RGB')
@@ -1,5 +1,4 @@
 import os
-import math
 import queue
 import threading
 import cv2
@@ -7,9 +6,9 @@ import numpy as np
 import torch
 from torch import nn
 from torch.nn import functional as F
-from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, TimeElapsedColumn
 from modules import devices, shared
 from modules.upscaler import compile_upscaler
+from modules.postprocess import tiling
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -122,75 +121,8 @@ class RealESRGANer():
         self.output = self.model(self.img)
 
     def tile_process(self):
-        """It will first crop input images to tiles, and then process each tile.
-        Finally, all the processed tiles are merged into one images.
-
-        Modified from: https://github.com/ata4/esrgan-launcher
-        """
-        batch, channel, height, width = self.img.shape
-        output_height = height * self.scale
-        output_width = width * self.scale
-        output_shape = (batch, channel, output_height, output_width)
-
-        # start with black image
-        self.output = self.img.new_zeros(output_shape)
-        tiles_x = math.ceil(width / self.tile_size)
-        tiles_y = math.ceil(height / self.tile_size)
-
-        # loop over all tiles
-        with Progress(TextColumn('[cyan]{task.description}'), BarColumn(), TaskProgressColumn(), TimeRemainingColumn(), TimeElapsedColumn(), console=shared.console) as progress:
-            task = progress.add_task(description="Upscaling", total=tiles_y * tiles_x)
-            with torch.no_grad():
-                for y in range(tiles_y):
-                    if shared.state.interrupted:
-                        break
-                    for x in range(tiles_x):
-                        if shared.state.interrupted:
-                            break
-                        # extract tile from input image
-                        ofs_x = x * self.tile_size
-                        ofs_y = y * self.tile_size
-                        # input tile area on total image
-                        input_start_x = ofs_x
-                        input_end_x = min(ofs_x + self.tile_size, width)
-                        input_start_y = ofs_y
-                        input_end_y = min(ofs_y + self.tile_size, height)
-
-                        # input tile area on total image with padding
-                        input_start_x_pad = max(input_start_x - self.tile_pad, 0)
-                        input_end_x_pad = min(input_end_x + self.tile_pad, width)
-                        input_start_y_pad = max(input_start_y - self.tile_pad, 0)
-                        input_end_y_pad = min(input_end_y + self.tile_pad, height)
-
-                        # input tile dimensions
-                        input_tile_width = input_end_x - input_start_x
-                        input_tile_height = input_end_y - input_start_y
-                        tile_idx = y * tiles_x + x + 1 # noqa
-                        input_tile = self.img[:, :, input_start_y_pad:input_end_y_pad, input_start_x_pad:input_end_x_pad]
-
-                        # upscale tile
-                        try:
-                            output_tile = self.model(input_tile)
-                        except Exception as e:
-                            shared.log.error(f'Upscale error: type=R-ESRGAN {e}')
-
-                        # output tile area on total image
-                        output_start_x = input_start_x * self.scale
-                        output_end_x = input_end_x * self.scale
-                        output_start_y = input_start_y * self.scale
-                        output_end_y = input_end_y * self.scale
-
-                        # output tile area without padding
-                        output_start_x_tile = (input_start_x - input_start_x_pad) * self.scale
-                        output_end_x_tile = output_start_x_tile + input_tile_width * self.scale
-                        output_start_y_tile = (input_start_y - input_start_y_pad) * self.scale
-                        output_end_y_tile = output_start_y_tile + input_tile_height * self.scale
-
-                        # put tile into output image
-                        self.output[:, :, output_start_y:output_end_y,
-                                    output_start_x:output_end_x] = output_tile[:, :, output_start_y_tile:output_end_y_tile,
-                                                                            output_start_x_tile:output_end_x_tile]
-                        progress.update(task, advance=1, description="Upscaling")
+        """process image in batched overlapping tiles of tile size plus padding on each side, tiles are blended on device"""
+        self.output = tiling.tiled_forward(self.model, self.img, tile=self.tile_size + 2 * self.tile_pad, overlap=2 * self.tile_pad, scale=self.scale)
 
     def post_process(self):
         # remove extra pad
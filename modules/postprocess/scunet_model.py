@@ -1,9 +1,9 @@
 from PIL import Image
 import numpy as np
 import torch
-from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, TimeElapsedColumn
 from modules import devices
 from modules.postprocess.scunet_model_arch import SCUNet as net
+from modules.postprocess import tiling
 from modules.shared import opts, log, console
 from modules.upscaler import Upscaler, compile_upscaler
 
@@ -38,35 +38,7 @@ class UpscalerSCUNet(Upscaler):
     @staticmethod
     @torch.no_grad()
     def tiled_inference(img, model):
-        # test the image tile by tile
-        h, w = img.shape[2:]
-        tile = opts.upscaler_tile_size
-        tile_overlap = opts.upscaler_tile_overlap
-        if tile == 0:
-            return model(img)
-        assert tile % 8 == 0, "tile size should be a multiple of window_size"
-        sf = 1
-        stride = tile - tile_overlap
-        h_idx_list = list(range(0, h - tile, stride)) + [h - tile]
-        w_idx_list = list(range(0, w - tile, stride)) + [w - tile]
-        E = torch.zeros(1, 3, h * sf, w * sf, dtype=img.dtype, device=devices.device)
-        W = torch.zeros_like(E, dtype=devices.dtype, device=devices.device)
-        with Progress(TextColumn('[cyan]{task.description}'), BarColumn(), TaskProgressColumn(), TimeRemainingColumn(), TimeElapsedColumn(), console=console) as progress:
-            task = progress.add_task(description="Upscaling", total=len(h_idx_list) * len(w_idx_list))
-            for h_idx in h_idx_list:
-                for w_idx in w_idx_list:
-                    in_patch = img[..., h_idx: h_idx + tile, w_idx: w_idx + tile]
-                    out_patch = model(in_patch)
-                    out_patch_mask = torch.ones_like(out_patch)
-                    E[
-                        ..., h_idx * sf: (h_idx + tile) * sf, w_idx * sf: (w_idx + tile) * sf
-                    ].add_(out_patch)
-                    W[
-                        ..., h_idx * sf: (h_idx + tile) * sf, w_idx * sf: (w_idx + tile) * sf
-                    ].add_(out_patch_mask)
-                    progress.update(task, advance=1, description="Upscaling")
-        output = E.div_(W)
-        return output
+        return tiling.tiled_forward(model, img, tile=opts.upscaler_tile_size, overlap=opts.upscaler_tile_overlap, scale=1, multiple=8)
 
     def do_upscale(self, img: Image.Image, selected_file):
         devices.torch_gc()
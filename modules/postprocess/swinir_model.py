@@ -1,9 +1,9 @@
 import numpy as np
 import torch
 from PIL import Image
-from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, TimeElapsedColumn
 from modules.postprocess.swinir_model_arch import SwinIR as net
 from modules.postprocess.swinir_model_arch_v2 import Swin2SR as net2
+from modules.postprocess import tiling
 from modules import devices, script_callbacks, shared
 from modules.upscaler import Upscaler, compile_upscaler
 
@@ -111,35 +111,4 @@ def upscale(
 
 
 def inference(img, model, tile, tile_overlap, window_size, scale):
-    # test the image tile by tile
-    b, c, h, w = img.size()
-    tile = min(tile, h, w)
-    assert tile % window_size == 0, "tile size should be a multiple of window_size"
-    sf = scale
-    stride = tile - tile_overlap
-    h_idx_list = list(range(0, h - tile, stride)) + [h - tile]
-    w_idx_list = list(range(0, w - tile, stride)) + [w - tile]
-    E = torch.zeros(b, c, h * sf, w * sf, dtype=devices.dtype, device=devices.device).type_as(img)
-    W = torch.zeros_like(E, dtype=devices.dtype, device=devices.device)
-
-    with Progress(TextColumn('[cyan]{task.description}'), BarColumn(), TaskProgressColumn(), TimeRemainingColumn(), TimeElapsedColumn(), console=shared.console) as progress:
-        task = progress.add_task(description="Upscaling Initializing", total=len(h_idx_list) * len(w_idx_list))
-        for h_idx in h_idx_list:
-            if shared.state.interrupted:
-                break
-            for w_idx in w_idx_list:
-                if shared.state.interrupted or shared.state.skipped:
-                    break
-                in_patch = img[..., h_idx: h_idx + tile, w_idx: w_idx + tile]
-                out_patch = model(in_patch)
-                out_patch_mask = torch.ones_like(out_patch)
-
-                E[
-                ..., h_idx * sf: (h_idx + tile) * sf, w_idx * sf: (w_idx + tile) * sf
-                ].add_(out_patch)
-                W[
-                ..., h_idx * sf: (h_idx + tile) * sf, w_idx * sf: (w_idx + tile) * sf
-                ].add_(out_patch_mask)
-                progress.update(task, advance=1, description="Upscaling")
-    output = E.div_(W)
-    return output
+    return tiling.tiled_forward(model, img, tile=tile, overlap=tile_overlap, scale=scale, multiple=window_size)
@@ -0,0 +1,87 @@
+import time
+import torch
+from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn, TimeElapsedColumn
+from modules import shared, devices
+
+
+max_batch = 64 # upper bound for automatic tile batch size
+vram_budget = 0.8 # fraction of free vram used for automatic tile batch size
+
+
+def tile_positions(size: int, tile: int, stride: int):
+    if size <= tile:
+        return [0]
+    return list(range(0, size - tile, stride)) + [size - tile]
+
+
+def feather_mask(tile_h: int, tile_w: int, overlap: int, device, dtype=torch.float32):
+    """weight mask that ramps down linearly across overlap so neighbouring tiles blend instead of averaging with hard seams"""
+    def ramp(size):
+        r = torch.ones(size, device=device, dtype=dtype)
+        n = min(overlap, size // 2)
+        if n > 0:
+            edge = torch.arange(1, n + 1, device=device, dtype=dtype) / (n + 1)
+            r[:n] = edge
+            r[-n:] = edge.flip(0)
+        return r
+    return torch.outer(ramp(tile_h), ramp(tile_w)).unsqueeze(0).unsqueeze(0)
+
+
+def auto_batch(per_tile: int):
+    if shared.opts.upscaler_tile_batch > 0:
+        return shared.opts.upscaler_tile_batch
+    if devices.device.type != 'cuda' or per_tile <= 0:
+        return 1
+    try:
+        free, _total = torch.cuda.mem_get_info(devices.device)
+    except Exception:
+        return 1
+    return max(1, min(max_batch, int(free * vram_budget) // per_tile))
+
+
+@torch.no_grad()
+def tiled_forward(model, img: torch.Tensor, tile: int = None, overlap: int = None, scale: int = None, multiple: int = 1, desc: str = 'Upscaling'):
+    """run model over image tensor n c h w in batches of tiles kept on device and blend overlapping outputs with feathered mask on device"""
+    tile = shared.opts.upscaler_tile_size if tile is None else tile
+    overlap = shared.opts.upscaler_tile_overlap if overlap is None else overlap
+    n, _c, h, w = img.shape
+    if tile <= 0 or (tile >= h and tile >= w):
+        return model(img)
+    tile_h, tile_w = min(tile, h), min(tile, w)
+    if multiple > 1:
+        tile_h, tile_w = max(multiple, tile_h // multiple * multiple), max(multiple, tile_w // multiple * multiple)
+    overlap = max(0, min(overlap, min(tile_h, tile_w) // 2))
+    positions = [(y, x) for y in tile_positions(h, tile_h, tile_h - overlap) for x in tile_positions(w, tile_w, tile_w - overlap)]
+    t0 = time.time()
+    E, W, mask = None, None, None
+    batch = 1
+    i = 0
+    with Progress(TextColumn('[cyan]{task.description}'), BarColumn(), TaskProgressColumn(), TimeRemainingColumn(), TimeElapsedColumn(), console=shared.console) as progress:
+        task = progress.add_task(description=desc, total=len(positions))
+        while i < len(positions):
+            if shared.state.interrupted or shared.state.skipped:
+                break
+            chunk = positions[i:i+batch]
+            patches = torch.cat([img[..., y:y+tile_h, x:x+tile_w] for y, x in chunk], dim=0)
+            if E is None and devices.device.type == 'cuda':
+                torch.cuda.reset_peak_memory_stats(devices.device)
+                mem = torch.cuda.memory_allocated(devices.device)
+            out = model(patches)
+            if E is None: # first tile determines scale, output buffers and batch size for remaining tiles
+                sf = scale or out.shape[-1] // tile_w
+                E = torch.zeros(n, out.shape[1], h * sf, w * sf, dtype=torch.float32, device=out.device)
+                W = torch.zeros(1, 1, h * sf, w * sf, dtype=torch.float32, device=out.device)
+                mask = feather_mask(tile_h * sf, tile_w * sf, overlap * sf, device=out.device)
+                per_tile = (torch.cuda.max_memory_allocated(devices.device) - mem) // n if devices.device.type == 'cuda' else 0
+                batch = auto_batch(per_tile)
+            out = out.float()
+            for j, (y, x) in enumerate(chunk):
+                E[..., y*sf:(y+tile_h)*sf, x*sf:(x+tile_w)*sf].addcmul_(out[j*n:(j+1)*n], mask)
+                W[..., y*sf:(y+tile_h)*sf, x*sf:(x+tile_w)*sf].add_(mask)
+            del out, patches
+            i += len(chunk)
+            progress.update(task, advance=len(chunk), description=desc)
+    if E is None:
+        return img
+    shared.log.debug(f'Upscale tiles: input={list(img.shape)} tiles={len(positions)} tile={tile_h}x{tile_w} overlap={overlap} scale={sf} batch={batch} time={time.time()-t0:.2f}')
+    return E.div_(W.clamp_(min=1e-6)).to(img.dtype)
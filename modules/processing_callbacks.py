@@ -40,6 +40,8 @@ def diffusers_callback_legacy(step: int, timestep: int, latents: typing.Union[to
         latents = torch.from_numpy(latents)
     shared.state.sampling_step = step
     shared.state.current_latent = latents
+    from modules.sd_samplers_common import preview
+    preview.submit()
     latents = processing_correction.correction_callback(p, timestep, {'latents': latents})
     if shared.state.interrupted or shared.state.skipped:
         raise AssertionError('Interrupted...')
@@ -141,6 +143,8 @@ def diffusers_callback(pipe, step: int = 0, timestep: int = 0, kwargs: dict = {}
                     p.extra_generation_params["Sigma adjust"] = shared.opts.schedulers_sigma_adjust
             except Exception:
                 pass
+        from modules.sd_samplers_common import preview
+        preview.submit()
     except Exception as e:
         global warned # pylint: disable=global-statement
         if not warned:
@@ -96,7 +96,7 @@ def api_progress(req: ProgressRequest):
 
     if active and (req.id_live_preview != -1):
         have_image = shared.state.set_current_image()
-        if have_image and shared.state.current_image is not None:
+        if have_image and shared.state.current_image is not None and shared.state.id_live_preview != req.id_live_preview:
             buffered = io.BytesIO()
             shared.state.current_image.save(buffered, format='jpeg', quality=60)
             b64 = base64.b64encode(buffered.getvalue())
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from safetensors.torch import save_file, safe_open
+from modules import shared, devices, paths
+
+
+debug = shared.log.trace if os.environ.get('SD_PROMPT_DEBUG', None) is not None else lambda *args, **kwargs: None
+fields = ['prompt_embeds', 'negative_prompt_embeds', 'positive_pooleds', 'negative_pooleds', 'prompt_attention_masks', 'negative_prompt_attention_masks']
+
+
+def file_identity(filename):
+    """filename with size and mtime so files replaced in place do not reuse stale entries"""
+    try:
+        stat = os.stat(filename)
+        return f'{filename}:{stat.st_size}:{int(stat.st_mtime)}'
+    except Exception:
+        return filename
+
+
+def model_identity(p):
+    """identity of model, text encoder, loaded embeddings and settings that change embeddings output"""
+    from modules import model_te
+    model = getattr(p, 'sd_model', None) or shared.sd_model
+    info = getattr(model, 'sd_checkpoint_info', None)
+    checkpoint = getattr(model, 'sd_model_hash', None) or getattr(info, 'sha256', None)
+    if checkpoint is None:
+        checkpoint = file_identity(info.filename) if getattr(info, 'filename', None) is not None else model.__class__.__name__
+    text_encoder = getattr(model, 'text_encoder', None)
+    dtype = getattr(text_encoder, 'dtype', None) or devices.dtype
+    embedding_db = getattr(model, 'embedding_db', None)
+    embeddings = sorted(f'{name}:{file_identity(e.filename) if e.filename is not None else f"{e.vectors}:{e.shape}"}' for name, e in embedding_db.word_embeddings.items()) if embedding_db is not None else []
+    return [checkpoint, model.__class__.__name__, shared.opts.sd_text_encoder, model_te.loaded_te, str(dtype), shared.opts.diffusers_offload_mode, embeddings]
+
+
+class EmbedsCache:
+    """on-disk text encoder embeddings cache, one safetensors shard per prompt set with lru eviction under byte budget"""
+
+    def __init__(self, folder: str = None):
+        self.folder = folder or os.path.join(paths.data_path, 'cache', 'te')
+        self.lock = threading.Lock()
+        self.entries: dict[str, list] = {} # key: [bytes, atime]
+        self.total = 0
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sd-te-cache')
+
+    @property
+    def budget(self) -> int:
+        return int(shared.opts.sd_textencoder_disk_cache) * 1024 * 1024
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def key(self, p, key: str) -> str:
+        token = str([model_identity(p), shared.opts.prompt_attention, shared.opts.prompt_mean_norm, key])
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], f'{key}.safetensors')
+
+    def load(self):
+        if self.loaded:
+            return
+        with self.lock:
+            self.loaded = True
+            if not os.path.isdir(self.folder):
+                return
+            for root, _dirs, files in os.walk(self.folder): # index is rebuilt from shard size and mtime which doubles as lru timestamp
+                for f in files:
+                    if not f.endswith('.safetensors'):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, f))
+                    except Exception:
+                        continue
+                    self.entries[f[:-12]] = [stat.st_size, stat.st_mtime]
+                    self.total += stat.st_size
+        shared.log.debug(f'Prompt cache: folder="{self.folder}" items={len(self.entries)} size={self.total} budget={self.budget}')
+
+    def get(self, key: str):
+        self.load()
+        with self.lock:
+            entry = self.entries.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        fn = self.path(key)
+        try:
+            t0 = time.time()
+            with safe_open(fn, framework='pt', device='cpu') as f:
+                structure = json.loads(f.metadata()['structure'])
+                item = {}
+                for field in fields:
+                    item[field] = [[f.get_tensor(name).to(devices.device) if name is not None else None for name in schedule] for schedule in structure[field]]
+            now = time.time()
+            os.utime(fn, (now, now))
+            entry[1] = now
+            self.hits += 1
+            debug(f'Prompt cache: disk get={key} time={now-t0:.3f}')
+            return item
+        except Exception as e:
+            debug(f'Prompt cache: disk get={key} {e}')
+            with self.lock:
+                self.remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, item: dict):
+        self.load()
+        tensors = {}
+        structure = {}
+        seen = {} # batch entries of identical prompts reference same tensor
+        for field in fields:
+            structure[field] = []
+            for i, schedule in enumerate(item.get(field, [])):
+                names = []
+                for j, t in enumerate(schedule):
+                    if not isinstance(t, torch.Tensor):
+                        names.append(None)
+                        continue
+                    if id(t) not in seen:
+                        seen[id(t)] = f'{field}.{i}.{j}'
+                        tensors[seen[id(t)]] = t.detach().to(devices.cpu, copy=True).contiguous()
+                    names.append(seen[id(t)])
+                structure[field].append(names)
+        if len(tensors) == 0:
+            return
+        self.executor.submit(self.write, key, tensors, structure)
+
+    def write(self, key: str, tensors: dict, structure: dict):
+        fn = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(fn), exist_ok=True)
+            tmp = f'{fn}.tmp'
+            save_file(tensors, tmp, metadata={'structure': json.dumps(structure)})
+            os.replace(tmp, fn)
+            size = os.path.getsize(fn)
+        except Exception as e:
+            shared.log.error(f'Prompt cache: file="{fn}" {e}')
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total -= self.entries[key][0]
+            self.entries[key] = [size, time.time()]
+            self.total += size
+            self.evict()
+        debug(f'Prompt cache: disk put={key} size={size}')
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.total -= entry[0]
+        try:
+            os.remove(self.path(key))
+        except Exception:
+            pass
+
+    def evict(self):
+        budget = self.budget
+        if self.total <= budget:
+            return
+        for key, _entry in sorted(self.entries.items(), key=lambda kv: kv[1][1]):
+            if self.total <= budget:
+                break
+            self.remove(key)
+
+    def stats(self):
+        return { 'items': len(self.entries), 'size': self.total, 'budget': self.budget, 'hits': self.hits, 'misses': self.misses }
+
+
+disk_cache = EmbedsCache()
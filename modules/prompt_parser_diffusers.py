@@ -7,6 +7,7 @@ import torch
 from compel.embeddings_provider import BaseTextualInversionManager, EmbeddingsProvider
 from transformers import PreTrainedTokenizer
 from modules import shared, prompt_parser, devices, sd_models
+from modules.prompt_parser_cache import disk_cache
 from modules.prompt_parser_xhinker import get_weighted_text_embeddings_sd15, get_weighted_text_embeddings_sdxl_2p, get_weighted_text_embeddings_sd3, get_weighted_text_embeddings_flux1, get_weighted_text_embeddings_chroma
 
 debug_enabled = os.environ.get('SD_PROMPT_DEBUG', None)
@@ -100,7 +101,7 @@ class PromptEmbedder:
         debug(f"Prompt encode: time={(time.time() - t0):.3f}")
 
     def checkcache(self, p) -> bool:
-        if shared.opts.sd_textencoder_cache_size == 0:
+        if shared.opts.sd_textencoder_cache_size == 0 and not disk_cache.enabled:
             return False
         if self.scheduled_prompt:
             debug("Prompt cache: scheduled prompt")
@@ -120,29 +121,40 @@ class PromptEmbedder:
         effective_batch = 1 if self.allsame else self.batchsize
         key = str([self.prompts, self.negative_prompts, effective_batch, self.clip_skip, self.steps, en_data])
         item = cache.get(key)
-        if not item:
-            if not any(flatten(emb) for emb in [self.prompt_embeds,
+        computed = any(flatten(emb) for emb in [self.prompt_embeds,
                                                 self.negative_prompt_embeds,
                                                 self.positive_pooleds,
                                                 self.negative_pooleds,
                                                 self.prompt_attention_masks,
-                                                self.negative_prompt_attention_masks]):
+                                                self.negative_prompt_attention_masks])
+        disk_key = disk_cache.key(p, key) if disk_cache.enabled else None
+        if not item and not computed and disk_key is not None:
+            item = disk_cache.get(disk_key) # warm prompt from previous session skips text encoder
+            if item and shared.opts.sd_textencoder_cache_size > 0:
+                cache[key] = item
+        if not item:
+            if not computed:
                 return False
             else:
-                cache[key] = {'prompt_embeds': self.prompt_embeds,
-                              'negative_prompt_embeds': self.negative_prompt_embeds,
-                              'positive_pooleds': self.positive_pooleds,
-                              'negative_pooleds': self.negative_pooleds,
-                              'prompt_attention_masks': self.prompt_attention_masks,
-                              'negative_prompt_attention_masks': self.negative_prompt_attention_masks,
-                              }
-                debug(f"Prompt cache: add={key}")
-                while len(cache) > int(shared.opts.sd_textencoder_cache_size):
-                    cache.popitem(last=False)
+                item = {'prompt_embeds': self.prompt_embeds,
+                        'negative_prompt_embeds': self.negative_prompt_embeds,
+                        'positive_pooleds': self.positive_pooleds,
+                        'negative_pooleds': self.negative_pooleds,
+                        'prompt_attention_masks': self.prompt_attention_masks,
+                        'negative_prompt_attention_masks': self.negative_prompt_attention_masks,
+                        }
+                if shared.opts.sd_textencoder_cache_size > 0:
+                    cache[key] = item
+                    debug(f"Prompt cache: add={key}")
+                    while len(cache) > int(shared.opts.sd_textencoder_cache_size):
+                        cache.popitem(last=False)
+                if disk_key is not None:
+                    disk_cache.put(disk_key, item)
                 return True
         if item:
-            self.__dict__.update(cache[key])
-            cache.move_to_end(key)
+            self.__dict__.update(item)
+            if key in cache:
+                cache.move_to_end(key)
             if self.allsame and len(self.prompt_embeds) < self.batchsize:
                 self.prompt_embeds = [self.prompt_embeds[0]] * self.batchsize
                 self.positive_pooleds = [self.positive_pooleds[0]] * self.batchsize
@@ -5,6 +5,7 @@ import re
 import time
 import json
 import collections
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from modules import shared, paths, modelloader, hashes, sd_hijack_accelerate
 
@@ -14,8 +15,6 @@ checkpoint_aliases = {}
 checkpoints_loaded = collections.OrderedDict()
 model_dir = "Stable-diffusion"
 model_path = os.path.abspath(os.path.join(paths.models_path, model_dir))
-sd_metadata_file = os.path.join(paths.data_path, "metadata.json")
-sd_metadata = None
 sd_metadata_pending = 0
 sd_metadata_timer = 0
 warn_once = False
@@ -186,11 +185,20 @@ def update_model_hashes():
     lst = [ckpt for ckpt in checkpoints_list.values() if ckpt.sha256 is None or ckpt.shorthash is None]
     shared.log.info(f'Models list: hash missing={len(lst)} total={len(checkpoints_list)}')
     updated = []
-    for ckpt in lst:
-        ckpt.sha256 = hashes.sha256(ckpt.filename, f"checkpoint/{ckpt.name}")
+    jobid = shared.state.begin('Hash')
+    shared.state.job_count = len(lst)
+
+    def hash_ckpt(ckpt):
+        ckpt.sha256 = hashes.sha256(ckpt.filename, f"checkpoint/{ckpt.name}", quiet=True)
         ckpt.shorthash = ckpt.sha256[0:10] if ckpt.sha256 is not None else None
-        updated.append(ckpt)
-        yield update_model_hashes_table(updated)
+        return ckpt
+
+    with ThreadPoolExecutor(max_workers=max(1, shared.opts.hash_threads), thread_name_prefix='sd-hash') as executor:
+        for ckpt in executor.map(hash_ckpt, lst):
+            updated.append(ckpt)
+            shared.state.job_no = len(updated)
+            yield update_model_hashes_table(updated)
+    shared.state.end(jobid)
 
 
 def remove_hash(s):
@@ -327,9 +335,7 @@ def select_checkpoint(op='model', sd_model_checkpoint=None):
 
 
 def init_metadata():
-    global sd_metadata # pylint: disable=global-statement
-    if sd_metadata is None:
-        sd_metadata = shared.readfile(sd_metadata_file, lock=True) if os.path.isfile(sd_metadata_file) else {}
+    hashes.store.open()
 
 
 def extract_thumbnail(filename, data):
@@ -347,16 +353,13 @@ def extract_thumbnail(filename, data):
 
 
 def read_metadata_from_safetensors(filename):
-    global sd_metadata # pylint: disable=global-statement
-    if sd_metadata is None:
-        sd_metadata = shared.readfile(sd_metadata_file, lock=True) if os.path.isfile(sd_metadata_file) else {}
-    res = sd_metadata.get(filename, None)
-    if res is not None:
-        return res
     if not filename.endswith(".safetensors"):
         return {}
     if shared.cmd_opts.no_metadata:
         return {}
+    res = hashes.store.get_metadata(filename) # validated by file size and mtime
+    if res is not None:
+        return res
     res = {}
     # try:
     t0 = time.time()
@@ -394,7 +397,7 @@ def read_metadata_from_safetensors(filename):
             shared.log.error(f'Model metadata: file="{filename}" {e}')
             from modules import errors
             errors.display(e, 'Model metadata')
-    sd_metadata[filename] = res
+    hashes.store.set_metadata(filename, res)
     global sd_metadata_pending # pylint: disable=global-statement
     sd_metadata_pending += 1
     t1 = time.time()
@@ -419,8 +422,8 @@ def scrub_dict(dict_obj, keys):
 def write_metadata():
     global sd_metadata_pending # pylint: disable=global-statement
     if sd_metadata_pending == 0:
-        shared.log.debug(f'Model metadata: file="{sd_metadata_file}" no changes')
+        shared.log.debug(f'Model metadata: file="{hashes.store.filename}" no changes')
         return
-    shared.writefile(sd_metadata, sd_metadata_file)
-    shared.log.info(f'Model metadata saved: file="{sd_metadata_file}" items={sd_metadata_pending} time={sd_metadata_timer:.2f}')
+    hashes.store.commit()
+    shared.log.info(f'Model metadata saved: file="{hashes.store.filename}" items={sd_metadata_pending} time={sd_metadata_timer:.2f}')
     sd_metadata_pending = 0
@@ -3,6 +3,7 @@ import re
 import sys
 import time
 import inspect
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import accelerate.hooks
 import accelerate.utils.modeling
@@ -21,6 +22,8 @@ balanced_offload_exclude = ['CogView4Pipeline', 'MeissonicPipeline']
 no_split_module_classes = ["Linear", "Conv1d", "Conv2d", "Conv3d", "ConvTranspose1d", "ConvTranspose2d", "ConvTranspose3d", "WanTransformerBlock"]
 accelerate_dtype_byte_size = None
 move_stream = None
+prefetch_stream = None
+prefetch_executor = None
 
 
 def dtype_byte_size(dtype: torch.dtype):
@@ -159,6 +162,95 @@ def set_diffuser_offload(sd_model, op:str='model', quiet:bool=False, force:bool=
     process_timer.add('offload', time.time() - t0)
 
 
+def prefetch_supported(module):
+    if not shared.opts.diffusers_offload_prefetch or devices.device.type != 'cuda' or not torch.cuda.is_available():
+        return False
+    if getattr(module, 'quantization_method', None) is not None or shared.opts.layerwise_quantization: # quantized params cannot be swapped by data
+        return False
+    return devices.same_device(module.device, devices.cpu)
+
+
+def module_tensors(module):
+    """parameters and buffers of module as name, owning submodule, key and tensor, tied tensors are returned once"""
+    seen = set()
+    for prefix, submodule in module.named_modules():
+        for key, t in list(submodule._parameters.items()) + list(submodule._buffers.items()): # pylint: disable=protected-access
+            if t is None or id(t) in seen:
+                continue
+            seen.add(id(t))
+            yield f'{prefix}.{key}', submodule, key, t
+
+
+def set_tensor(submodule, key: str, t, value):
+    if key in submodule._parameters: # pylint: disable=protected-access
+        t.data = value
+    else:
+        submodule._buffers[key] = value # pylint: disable=protected-access
+
+
+def pin_host(module):
+    """move cpu tensors of module into persistent pinned host buffers, allocated once per module and reused by offload and prefetch"""
+    pinned = getattr(module, 'offload_pinned', None)
+    if pinned is None:
+        pinned = {}
+        module.offload_pinned = pinned
+    for name, submodule, key, t in module_tensors(module):
+        if t.device.type != 'cpu' or t.data.is_pinned():
+            continue
+        host = pinned.get(name, None)
+        if host is None or host.shape != t.shape or host.dtype != t.dtype:
+            host = torch.empty(t.shape, dtype=t.dtype, pin_memory=True)
+            pinned[name] = host
+        host.copy_(t.data)
+        set_tensor(submodule, key, t, host)
+
+
+def unpin_host(module):
+    """offload module into its pinned host buffers instead of allocating new pageable memory"""
+    event = getattr(module, 'offload_event', None)
+    if event is not None:
+        event.synchronize() # buffers may still be read by prefetch copy
+        module.offload_event = None
+    pinned = module.offload_pinned
+    for name, submodule, key, t in module_tensors(module):
+        host = pinned.get(name, None)
+        if t.device.type == 'cpu' or host is None or host.shape != t.shape or host.dtype != t.dtype:
+            continue
+        host.copy_(t.data)
+        set_tensor(submodule, key, t, host)
+
+
+def prefetch_copy(module):
+    """copy module tensors from pinned host buffers to gpu on dedicated stream, runs in background while current module computes"""
+    global prefetch_stream # pylint: disable=global-statement
+    t0 = time.time()
+    if prefetch_stream is None:
+        prefetch_stream = torch.cuda.Stream(device=devices.device)
+    pin_host(module) # first prefetch of module pins its weights, later offloads write back into same buffers
+    tensors = {} # id of cpu tensor: gpu copy
+    with torch.cuda.stream(prefetch_stream):
+        for _name, _submodule, _key, t in module_tensors(module):
+            if t.device.type == 'cpu':
+                tensors[id(t)] = t.data.to(devices.device, non_blocking=True)
+        event = torch.cuda.Event()
+        event.record(prefetch_stream)
+    module.offload_event = event
+    return tensors, event, time.time() - t0
+
+
+def prefetch_apply(module, tensors: dict):
+    stream = torch.cuda.current_stream(devices.device)
+    for t in tensors.values():
+        t.record_stream(stream)
+    for submodule in module.modules():
+        for p in submodule._parameters.values(): # pylint: disable=protected-access
+            if p is not None and id(p) in tensors:
+                p.data = tensors[id(p)]
+        for key, b in submodule._buffers.items(): # pylint: disable=protected-access
+            if b is not None and id(b) in tensors:
+                submodule._buffers[key] = tensors[id(b)] # pylint: disable=protected-access
+
+
 class OffloadHook(accelerate.hooks.ModelHook):
     def __init__(self, checkpoint_name):
         if shared.opts.diffusers_offload_max_gpu_memory > 1:
@@ -178,8 +270,13 @@ class OffloadHook(accelerate.hooks.ModelHook):
         self.last_pre = None
         self.last_post = None
         self.last_cls = None
+        self.last_name = None
+        self.next_module = {} # module name: name of module observed to run next, learned on first run
+        self.prefetched = None # (target, source, future)
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
         gpu = f'{(shared.gpu_memory * shared.opts.diffusers_offload_min_gpu_memory):.2f}-{(shared.gpu_memory * shared.opts.diffusers_offload_max_gpu_memory):.2f}:{shared.gpu_memory:.2f}'
-        shared.log.info(f'Offload: type=balanced op=init watermark={self.min_watermark}-{self.max_watermark} gpu={gpu} cpu={shared.cpu_memory:.3f} limit={shared.opts.cuda_mem_fraction:.2f} always={self.offload_always} never={self.offload_never} pre={shared.opts.diffusers_offload_pre} streams={shared.opts.diffusers_offload_streams}')
+        shared.log.info(f'Offload: type=balanced op=init watermark={self.min_watermark}-{self.max_watermark} gpu={gpu} cpu={shared.cpu_memory:.3f} limit={shared.opts.cuda_mem_fraction:.2f} always={self.offload_always} never={self.offload_never} pre={shared.opts.diffusers_offload_pre} streams={shared.opts.diffusers_offload_streams} prefetch={shared.opts.diffusers_offload_prefetch}')
         self.validate()
         super().__init__()
 
@@ -213,24 +310,80 @@ class OffloadHook(accelerate.hooks.ModelHook):
             return False
         return True
 
+    def find_module(self, module_name):
+        for pipe in get_pipe_variants():
+            module_instance = getattr(pipe, module_name, None)
+            if isinstance(module_instance, torch.nn.Module):
+                return module_instance
+        return None
+
+    def prefetch_start(self, module_name):
+        target = self.next_module.get(module_name, None)
+        if target is None or target == module_name or self.prefetched is not None:
+            return
+        module_instance = self.find_module(target)
+        if module_instance is None or not prefetch_supported(module_instance):
+            return
+        size = self.offload_map.get(target, 0) * 1024 * 1024 * 1024
+        if torch.cuda.memory_allocated(devices.device) + size > self.gpu: # prefetch only if both modules fit under high watermark
+            debug_move(f'Offload: type=balanced op=prefetch:skip module={target} size={size/1024/1024/1024:.3f}')
+            return
+        global prefetch_executor # pylint: disable=global-statement
+        if prefetch_executor is None:
+            prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sd-offload-prefetch')
+        self.prefetched = (target, module_name, prefetch_executor.submit(prefetch_copy, module_instance))
+        debug_move(f'Offload: type=balanced op=prefetch:start module={target} current={module_name}')
+
+    def prefetch_resolve(self, module, module_name):
+        if self.prefetched is None:
+            return
+        target, source, future = self.prefetched
+        if module_name == source:
+            return
+        self.prefetched = None
+        t0 = time.time()
+        try:
+            tensors, event, t_copy = future.result()
+        except Exception as e:
+            shared.log.error(f'Offload: type=balanced op=prefetch module={target} {e}')
+            return
+        if module_name != target or devices.same_device(module.device, devices.device): # order changed so prefetched copy is discarded
+            self.prefetch_misses += 1
+            debug_move(f'Offload: type=balanced op=prefetch:miss module={target} current={module_name}')
+            return
+        torch.cuda.current_stream(devices.device).wait_event(event)
+        prefetch_apply(module, tensors)
+        t_wait = time.time() - t0
+        self.prefetch_hits += 1
+        process_timer.add('prefetch', t_wait)
+        debug_move(f'Offload: type=balanced op=prefetch:hit module={target} copy={t_copy:.3f} wait={t_wait:.3f} hits={self.prefetch_hits} misses={self.prefetch_misses}')
+
     def pre_forward(self, module, *args, **kwargs):
         _id = id(module)
+        module_name = getattr(module, "module_name", module.__class__.__name__)
 
         do_offload = (self.last_pre != _id) or (module.__class__.__name__ != self.last_cls)
+        if do_offload and module_name != self.last_name:
+            if self.last_name is not None:
+                self.next_module[self.last_name] = module_name
+            self.last_name = module_name
 
         if do_offload and self.offload_allowed(module): # offload every other module first time when new module starts pre-forward
             if shared.opts.diffusers_offload_pre:
                 t0 = time.time()
                 debug_move(f'Offload: type=balanced op=pre module={module.__class__.__name__}')
                 for pipe in get_pipe_variants():
-                    for module_name in get_module_names(pipe):
-                        module_instance = getattr(pipe, module_name, None)
+                    for name in get_module_names(pipe):
+                        module_instance = getattr(pipe, name, None)
                         module_cls = module_instance.__class__.__name__
                         if (module_instance is not None) and (_id != id(module_instance)) and (module_cls not in self.offload_never) and (not devices.same_device(module_instance.device, devices.cpu)):
                             apply_balanced_offload_to_module(module_instance, op='pre')
                 self.last_cls = module.__class__.__name__
                 process_timer.add('offload', time.time() - t0)
 
+        if shared.opts.diffusers_offload_prefetch:
+            self.prefetch_resolve(module, module_name)
+
         if not devices.same_device(module.device, devices.device): # move-to-device
             t0 = time.time()
             device_index = torch.device(devices.device).index
@@ -252,11 +405,14 @@ class OffloadHook(accelerate.hooks.ModelHook):
             module.balanced_offload_max_memory = max_memory
             process_timer.add('onload', time.time() - t0)
 
+        if do_offload and shared.opts.diffusers_offload_prefetch:
+            self.prefetch_start(module_name)
+
         if debug:
             for _i, pipe in enumerate(get_pipe_variants()):
-                for module_name in get_module_names(pipe):
-                    module_instance = getattr(pipe, module_name, None)
-                    shared.log.trace(f'Offload: type=balanced op=pre:status forward={module.__class__.__name__} module={module_name} class={module_instance.__class__.__name__} pipe={_i} device={module_instance.device} dtype={module_instance.dtype}')
+                for name in get_module_names(pipe):
+                    module_instance = getattr(pipe, name, None)
+                    shared.log.trace(f'Offload: type=balanced op=pre:status forward={module.__class__.__name__} module={name} class={module_instance.__class__.__name__} pipe={_i} device={module_instance.device} dtype={module_instance.dtype}')
 
         self.last_pre = _id
         return args, kwargs
@@ -331,6 +487,8 @@ def get_module_sizes(pipe=None, exclude=None):
 
 def move_module_to_cpu(module, op='unk', force:bool=False):
     def do_move(module):
+        if getattr(module, 'offload_pinned', None) is not None:
+            unpin_host(module)
         if shared.opts.diffusers_offload_streams:
             global move_stream # pylint: disable=global-statement
             if move_stream is None:
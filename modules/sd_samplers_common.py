@@ -1,6 +1,7 @@
 import time
 import threading
 from collections import namedtuple
+from contextlib import nullcontext
 import torch
 import torchvision.transforms as T
 from PIL import Image
@@ -122,8 +123,131 @@ def images_tensor_to_samples(image, approximation=None, model=None):
     return x_latent
 
 
+def estimate_sample(sample, noise_pred, sigma, sigma_next, prediction_type):
+    """estimate denoised sample from current latent and noise prediction for preview"""
+    try:
+        if noise_pred is not None and sigma is not None and sigma_next is not None:
+            original_sample = sample - (noise_pred * (sigma_next - sigma))
+            if prediction_type in {"epsilon", "flow_prediction"}:
+                sample = original_sample - (noise_pred * sigma)
+            elif prediction_type == "v_prediction":
+                sample = noise_pred * (-sigma / (sigma**2 + 1) ** 0.5) + (original_sample / (sigma**2 + 1))
+    except Exception:
+        pass # ignore sigma errors
+    return sample
+
+
+class PreviewDecoder:
+    """live preview decoded on worker thread and side cuda stream from latest latent snapshot
+    submissions are rate limited by wall-clock fps, stale snapshots are replaced instead of queued and nothing is done without active preview consumer"""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.pending = None
+        self.thread: threading.Thread = None
+        self.stream = None
+        self.last_submit = 0
+        self.last_request = 0
+        self.submitted = 0
+        self.decoded = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        if shared.opts.show_progress_type == 'Full VAE': # full vae is shared with final decode and moved by offload so it is only used synchronously from sampling thread
+            return False
+        return shared.opts.live_preview_fps > 0 and shared.opts.show_progress_every_n_steps > 0 and not shared.cmd_opts.lowvram
+
+    def touch(self):
+        """called by preview consumers, decoder stays idle unless someone asked for preview recently"""
+        self.last_request = time.time()
+
+    def subscribed(self) -> bool:
+        timeout = 4 * max(shared.opts.live_preview_refresh_period / 1000, 1.0 / shared.opts.live_preview_fps, 0.25)
+        return time.time() - self.last_request < timeout
+
+    def copy(self, tensor, device):
+        if not isinstance(tensor, torch.Tensor):
+            return tensor
+        if self.stream is not None and tensor.device == device and device.type == 'cuda':
+            tensor.record_stream(self.stream) # keep source alive until async copy completes
+        return tensor.detach().clone()
+
+    def submit(self):
+        state = shared.state
+        latent = state.current_latent
+        if latent is None or state.disable_preview or state.job in {'VAE', 'Upscale'} or not self.enabled:
+            return
+        now = time.time()
+        if not self.subscribed() or (now - self.last_submit) < (1.0 / shared.opts.live_preview_fps):
+            return
+        self.last_submit = now
+        event = None
+        if isinstance(latent, torch.Tensor) and latent.device.type == 'cuda':
+            if self.stream is None or self.stream.device != latent.device:
+                self.stream = torch.cuda.Stream(device=latent.device)
+            self.stream.wait_stream(torch.cuda.current_stream(latent.device))
+        with torch.cuda.stream(self.stream) if self.stream is not None and latent.device.type == 'cuda' else nullcontext():
+            snapshot = {
+                'id': state.id,
+                'step': state.sampling_step,
+                'latent': self.copy(latent, latent.device),
+                'noise_pred': self.copy(state.current_noise_pred, latent.device),
+                'sigma': self.copy(state.current_sigma, latent.device),
+                'sigma_next': self.copy(state.current_sigma_next, latent.device),
+                'prediction_type': state.prediction_type,
+            }
+            if self.stream is not None and latent.device.type == 'cuda':
+                event = torch.cuda.Event()
+                event.record(self.stream)
+        snapshot['event'] = event
+        with self.lock:
+            if self.pending is not None:
+                self.dropped += 1
+            self.pending = snapshot
+            self.submitted += 1
+            self.lock.notify()
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.worker, name='sd-preview', daemon=True)
+            self.thread.start()
+
+    def decode(self, snapshot):
+        use_stream = snapshot['event'] is not None
+        with torch.cuda.stream(self.stream) if use_stream else nullcontext():
+            if use_stream:
+                self.stream.wait_event(snapshot['event'])
+            sample = estimate_sample(snapshot['latent'], snapshot['noise_pred'], snapshot['sigma'], snapshot['sigma_next'], snapshot['prediction_type'])
+            return samples_to_image_grid(sample) if shared.opts.show_progress_grid else sample_to_image(sample)
+
+    def worker(self):
+        while True:
+            with self.lock:
+                while self.pending is None:
+                    self.lock.wait()
+                snapshot = self.pending
+                self.pending = None
+            try:
+                image = self.decode(snapshot)
+            except Exception as e:
+                warn_once(f'Preview: {e}')
+                continue
+            if image is not None and snapshot['id'] == shared.state.id and shared.state.job_count > 0: # discard previews that finished after their job
+                shared.state.current_image_sampling_step = snapshot['step']
+                shared.state.assign_current_image(image)
+                self.decoded += 1
+
+    def stats(self):
+        return { 'submitted': self.submitted, 'decoded': self.decoded, 'dropped': self.dropped }
+
+
+preview = PreviewDecoder()
+
+
 def store_latent(decoded):
     shared.state.current_latent = decoded
+    if preview.enabled:
+        preview.submit()
+        return
     if shared.opts.show_progress_every_n_steps > 0 and shared.state.sampling_step % shared.opts.show_progress_every_n_steps == 0:
         if not shared.parallel_processing_allowed:
             image = sample_to_image(decoded)
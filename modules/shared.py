@@ -150,6 +150,9 @@ options_templates.update(options_section(('sd', "Model Loading"), {
     "sd_checkpoint_autoload": OptionInfo(True, "Model auto-load on start"),
     "sd_parallel_load": OptionInfo(True, "Model load using multiple threads"),
     "sd_checkpoint_autodownload": OptionInfo(True, "Model auto-download on demand"),
+    "hash_background": OptionInfo(False, "Model hash all in background on start"),
+    "hash_threads": OptionInfo(2, "Model hash threads", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
+    "hash_mmap": OptionInfo(False, "Model hash using memory-mapped reads"),
     "stream_load": OptionInfo(False, "Model load using streams", gr.Checkbox),
     "diffusers_to_gpu": OptionInfo(False, "Model load model direct to GPU"),
     "runai_streamer_diffusers": OptionInfo(False, "Diffusers load using Run:ai streamer", gr.Checkbox),
@@ -181,6 +184,7 @@ options_templates.update(options_section(('offload', "Model Offloading"), {
     "offload_balanced_sep": OptionInfo("<h2>Balanced Offload</h2>", "", gr.HTML),
     "diffusers_offload_pre": OptionInfo(True, "Offload during pre-forward"),
     "diffusers_offload_streams": OptionInfo(False, "Offload using streams"),
+    "diffusers_offload_prefetch": OptionInfo(False, "Prefetch next module using streams"),
     "diffusers_offload_min_gpu_memory": OptionInfo(startup_offload_min_gpu, "Offload low watermark", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01 }),
     "diffusers_offload_max_gpu_memory": OptionInfo(startup_offload_max_gpu, "Offload GPU high watermark", gr.Slider, {"minimum": 0.1, "maximum": 1, "step": 0.01 }),
     "diffusers_offload_max_cpu_memory": OptionInfo(0.90, "Offload CPU high watermark", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01, "visible": False }),
@@ -276,6 +280,7 @@ options_templates.update(options_section(('text_encoder', "Text Encoder"), {
     "prompt_attention": OptionInfo("native", "Prompt attention parser", gr.Radio, {"choices": ["native", "compel", "xhinker", "a1111", "fixed"] }),
     "prompt_mean_norm": OptionInfo(False, "Prompt attention normalization", gr.Checkbox),
     "sd_textencoder_cache_size": OptionInfo(4, "Text encoder cache size", gr.Slider, {"minimum": 0, "maximum": 16, "step": 1}),
+    "sd_textencoder_disk_cache": OptionInfo(0, "Text encoder disk cache size (MB)", gr.Slider, {"minimum": 0, "maximum": 16384, "step": 256}),
     "sd_textencder_linebreak": OptionInfo(True, "Use line break as prompt segment marker", gr.Checkbox),
     "diffusers_zeros_prompt_pad": OptionInfo(False, "Use zeros for prompt padding", gr.Checkbox),
     "te_optional_sep": OptionInfo("<h2>Optional</h2>", "", gr.HTML),
@@ -303,6 +308,10 @@ options_templates.update(options_section(('cuda', "Compute Settings"), {
     "xformers_options": OptionInfo(['Flash attention'], "xFormers options", gr.CheckboxGroup, {"choices": ['Flash attention'] }),
     "dynamic_attention_slice_rate": OptionInfo(0.5, "Dynamic Attention slicing rate in GB", gr.Slider, {"minimum": 0.01, "maximum": max(gpu_memory,4), "step": 0.01}),
     "dynamic_attention_trigger_rate": OptionInfo(1, "Dynamic Attention trigger rate in GB", gr.Slider, {"minimum": 0.01, "maximum": max(gpu_memory,4)*2, "step": 0.01}),
+
+    "api_batch_sep": OptionInfo("<h2>API Batching</h2>", "", gr.HTML),
+    "api_batch_wait": OptionInfo(0, "API job batch wait time in ms", gr.Slider, {"minimum": 0, "maximum": 5000, "step": 10}),
+    "api_batch_size": OptionInfo(4, "API job max batch size", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}),
 }))
 
 options_templates.update(options_section(('backends', "Backend Settings"), {
@@ -366,6 +375,10 @@ options_templates.update(options_section(('advanced', "Pipeline Modifiers"), {
     "pag_sep": OptionInfo("<h2>PAG: Perturbed attention guidance</h2>", "", gr.HTML),
     "pag_apply_layers": OptionInfo("m0", "PAG layer names"),
 
+    "ipadapter_sep": OptionInfo("<h2>IP-Adapter</h2>", "", gr.HTML),
+    "ipadapter_cache_size": OptionInfo(256, "IP-Adapter image embeds cache size (MB)", gr.Slider, {"minimum": 0, "maximum": 4096, "step": 64}),
+    "ipadapter_cache_disk": OptionInfo(False, "IP-Adapter image embeds disk cache"),
+
     "pab_sep": OptionInfo("<h2>PAB: Pyramid attention broadcast </h2>", "", gr.HTML),
     "pab_enabled": OptionInfo(False, "PAB cache enabled"),
     "pab_spacial_skip_range": OptionInfo(2, "PAB spacial skip range", gr.Slider, {"minimum": 1, "maximum": 4, "step": 1}),
@@ -399,6 +412,10 @@ options_templates.update(options_section(('advanced', "Pipeline Modifiers"), {
     "teacache_sep": OptionInfo("<h2>TeaCache</h2>", "", gr.HTML),
     "teacache_enabled": OptionInfo(False, "TeaCache cache enabled"),
     "teacache_thresh": OptionInfo(0.15, "TeaCache L1 threshold", gr.Slider, {"minimum": 0.0, "maximum": 1.0, "step": 0.01}),
+    "teacache_profile": OptionInfo(True, "TeaCache use calibrated model profile"),
+    "teacache_calibrate": OptionInfo(False, "TeaCache calibrate model profile during generate"),
+    "teacache_target": OptionInfo(1.8, "TeaCache profile target speedup", gr.Slider, {"minimum": 1.0, "maximum": 4.0, "step": 0.05}),
+    "teacache_budget": OptionInfo(0.0, "TeaCache profile quality budget", gr.Slider, {"minimum": 0.0, "maximum": 0.5, "step": 0.005}),
 
     "hypertile_sep": OptionInfo("<h2>HyperTile</h2>", "", gr.HTML),
     "hypertile_unet_enabled": OptionInfo(False, "Hypertile UNet Enabled"),
@@ -488,6 +505,8 @@ options_templates.update(options_section(('saving-images', "Image Options"), {
     "include_mask": OptionInfo(False, "Include mask in outputs"),
     "samples_save_zip": OptionInfo(False, "Create ZIP archive for multiple images"),
     "image_background": OptionInfo("#000000", "Resize background color", gr.ColorPicker, {}),
+    "save_workers": OptionInfo(2, "Image save workers", gr.Slider, {"minimum": 0, "maximum": 16, "step": 1}),
+    "save_queue_depth": OptionInfo(8, "Image save queue depth", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}),
 
     "image_sep_grid": OptionInfo("<h2>Grid Options</h2>", "", gr.HTML),
     "grid_save": OptionInfo(True, "Save all generated image grids"),
@@ -502,6 +521,9 @@ options_templates.update(options_section(('saving-images', "Image Options"), {
     "browser_cache": OptionInfo(True, "Use image gallery cache"),
     "browser_folders": OptionInfo("", "Additional image browser folders"),
     "browser_fixed_width": OptionInfo(False, "Use fixed width thumbnails"),
+    "browser_thumb_cache_size": OptionInfo(512, "Server thumbnail cache size (MB)", gr.Slider, {"minimum": 0, "maximum": 8192, "step": 64}),
+    "browser_index": OptionInfo(True, "Use persistent gallery folder index"),
+    "browser_index_interval": OptionInfo(30, "Gallery folder index rescan interval (sec)", gr.Slider, {"minimum": 0, "maximum": 600, "step": 5}),
     "viewer_show_metadata": OptionInfo(True, "Show metadata in full screen image browser"),
 
     "save_sep_options": OptionInfo("<h2>Intermediate Image Saving</h2>", "", gr.HTML),
@@ -513,6 +535,8 @@ options_templates.update(options_section(('saving-images', "Image Options"), {
     "save_mask": OptionInfo(False, "Save inpainting mask"),
     "save_mask_composite": OptionInfo(False, "Save inpainting masked composite"),
     "gradio_skip_video": OptionInfo(False, "Do not display video output in UI"),
+    "video_stream_frames": OptionInfo(16, "Video save chunk frames", gr.Slider, {"minimum": 0, "maximum": 256, "step": 1}),
+    "video_stream_queue": OptionInfo(4, "Video encode queue depth", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}),
 
     "image_sep_watermark": OptionInfo("<h2>Watermarking</h2>", "", gr.HTML),
     "image_watermark_enabled": OptionInfo(False, "Include invisible watermark"),
@@ -550,7 +574,7 @@ options_templates.update(options_section(('saving-paths', "Image Paths"), {
 options_templates.update(options_section(('image-metadata', "Image Metadata"), {
     "image_metadata": OptionInfo(True, "Include metadata in image"),
     "save_txt": OptionInfo(False, "Save metadata to text file"),
-    "save_log_fn": OptionInfo("", "Append metadata to JSON file", component_args=hide_dirs),
+    "save_log_fn": OptionInfo("", "Append metadata to generation log", component_args=hide_dirs),
     "disable_apply_params": OptionInfo('', "Restore from metadata: skip params", gr.Textbox),
     "disable_apply_metadata": OptionInfo(['sd_model_checkpoint', 'sd_vae', 'sd_unet', 'sd_text_encoder'], "Restore from metadata: skip settings", gr.Dropdown, lambda: {"multiselect":True, "choices": opts.list()}),
 }))
@@ -602,6 +626,7 @@ options_templates.update(options_section(('live-preview', "Live Previews"), {
     "show_progress_every_n_steps": OptionInfo(1, "Live preview display period", gr.Slider, {"minimum": 0, "maximum": 20, "step": 1}),
     "show_progress_type": OptionInfo("TAESD", "Live preview method", gr.Radio, {"choices": ["Simple", "Approximate", "TAESD", "Full VAE"]}),
     "live_preview_refresh_period": OptionInfo(500, "Progress update period", gr.Slider, {"minimum": 0, "maximum": 5000, "step": 25}),
+    "live_preview_fps": OptionInfo(4, "Live preview background decode rate limit (fps)", gr.Slider, {"minimum": 0, "maximum": 30, "step": 1}),
     "taesd_variant": OptionInfo(shared_items.sd_taesd_items()[0], "TAESD variant", gr.Dropdown, {"choices": shared_items.sd_taesd_items()}),
     "taesd_layers": OptionInfo(3, "TAESD decode layers", gr.Slider, {"minimum": 1, "maximum": 3, "step": 1}),
     "live_preview_downscale": OptionInfo(True, "Downscale high resolution live previews"),
@@ -637,12 +662,16 @@ options_templates.update(options_section(('postprocessing', "Postprocessing"), {
     "upscaler_latent_steps": OptionInfo(20, "Upscaler latent steps", gr.Slider, {"minimum": 4, "maximum": 100, "step": 1}),
     "upscaler_tile_size": OptionInfo(192, "Upscaler tile size", gr.Slider, {"minimum": 0, "maximum": 512, "step": 16}),
     "upscaler_tile_overlap": OptionInfo(8, "Upscaler tile overlap", gr.Slider, {"minimum": 0, "maximum": 64, "step": 1}),
+    "upscaler_tile_batch": OptionInfo(0, "Upscaler tile batch size", gr.Slider, {"minimum": 0, "maximum": 64, "step": 1}),
 }))
 
 options_templates.update(options_section(('interrogate', "Interrogate"), {
     "interrogate_default_type": OptionInfo("OpenCLiP", "Default type", gr.Radio, {"choices": ["OpenCLiP", "VLM", "DeepBooru"]}),
     "interrogate_offload": OptionInfo(True, "Offload models "),
     "interrogate_score": OptionInfo(False, "Include scores in results when available"),
+    "interrogate_batch_size": OptionInfo(4, "Batch captioning size", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}),
+    "interrogate_batch_workers": OptionInfo(2, "Batch captioning image loader threads", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
+    "interrogate_batch_resume": OptionInfo(False, "Batch captioning resume from manifest"),
 
     "interrogate_clip_sep": OptionInfo("<h2>OpenCLiP</h2>", "", gr.HTML),
     "interrogate_clip_model": OptionInfo("ViT-L-14/openai", "CLiP: default model", gr.Dropdown, lambda: {"choices": get_clip_models()}, refresh=refresh_clip_models),
@@ -712,11 +741,15 @@ options_templates.update(options_section(('extra_networks', "Networks"), {
     "extra_networks_lora_sep": OptionInfo("<h2>LoRA</h2>", "", gr.HTML),
     "extra_networks_default_multiplier": OptionInfo(1.0, "Default strength", gr.Slider, {"minimum": 0.0, "maximum": 2.0, "step": 0.01}),
     "lora_fuse_diffusers": OptionInfo(True, "LoRA fuse directly to model"),
+    "lora_incremental": OptionInfo(True, "LoRA incremental apply of changed networks only"),
+    "lora_batch_apply": OptionInfo(False, "LoRA batched weight calculation across layers"),
     "lora_force_reload": OptionInfo(False, "LoRA force reload always"),
     "lora_force_diffusers": OptionInfo(False if not cmd_opts.use_openvino else True, "LoRA load using Diffusers method"),
     "lora_maybe_diffusers": OptionInfo(False, "LoRA load using Diffusers method for selected models", gr.Checkbox, {"visible": False}),
     "lora_apply_tags": OptionInfo(0, "LoRA auto-apply tags", gr.Slider, {"minimum": -1, "maximum": 32, "step": 1}),
     "lora_in_memory_limit": OptionInfo(1, "LoRA memory cache", gr.Slider, {"minimum": 0, "maximum": 32, "step": 1}),
+    "lora_cache_size": OptionInfo(0, "LoRA memory cache size (MB)", gr.Slider, {"minimum": 0, "maximum": 32768, "step": 256}),
+    "lora_cache_pinned": OptionInfo(False, "LoRA memory cache use pinned memory"),
     "lora_add_hashes_to_infotext": OptionInfo(False, "LoRA add hash info to metadata"),
     "lora_quant": OptionInfo("NF4","LoRA precision when quantized", gr.Radio, {"choices": ["NF4", "FP4"]}),
 
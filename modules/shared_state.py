@@ -88,7 +88,9 @@ class State:
 
     def nextjob(self):
         import modules.devices
-        self.do_set_current_image()
+        from modules.sd_samplers_common import preview
+        if not preview.enabled:
+            self.do_set_current_image()
         self.job_no += 1
         # self.sampling_step = 0
         self.current_image_sampling_step = 0
@@ -260,6 +262,10 @@ class State:
         if self.job == 'VAE' or self.job == 'Upscale': # avoid generating preview while vae is running
             return False
         from modules.shared import opts, cmd_opts
+        from modules.sd_samplers_common import preview
+        if preview.enabled:
+            preview.touch()
+            return self.current_image is not None
         if cmd_opts.lowvram or self.api or (opts.show_progress_every_n_steps <= 0):
             return False
         if (not self.disable_preview) and (abs(self.sampling_step - self.current_image_sampling_step) >= opts.show_progress_every_n_steps):
@@ -267,22 +273,16 @@ class State:
         return False
 
     def do_set_current_image(self):
+        from modules import shared, sd_samplers, sd_samplers_common
+        if sd_samplers_common.preview.enabled: # decoded asynchronously from sampling callback
+            sd_samplers_common.preview.touch()
+            return self.current_image is not None
         if (self.current_latent is None) or self.disable_preview or (self.preview_job == self.job_no):
             return False
-        from modules import shared, sd_samplers
         self.preview_job = self.job_no
         try:
-            sample = self.current_latent
             self.current_image_sampling_step = self.sampling_step
-            try:
-                if self.current_noise_pred is not None and self.current_sigma is not None and self.current_sigma_next is not None:
-                    original_sample = sample - (self.current_noise_pred * (self.current_sigma_next-self.current_sigma))
-                    if self.prediction_type in {"epsilon", "flow_prediction"}:
-                        sample = original_sample - (self.current_noise_pred * self.current_sigma)
-                    elif self.prediction_type == "v_prediction":
-                        sample = self.current_noise_pred * (-self.current_sigma / (self.current_sigma**2 + 1) ** 0.5) + (original_sample / (self.current_sigma**2 + 1)) # pylint: disable=invalid-unary-operand-type
-            except Exception:
-                pass # ignore sigma errors
+            sample = sd_samplers_common.estimate_sample(self.current_latent, self.current_noise_pred, self.current_sigma, self.current_sigma_next, self.prediction_type)
             image = sd_samplers.samples_to_image_grid(sample) if shared.opts.show_progress_grid else sd_samplers.sample_to_image(sample)
             self.assign_current_image(image)
             self.preview_job = -1
@@ -62,31 +62,89 @@ def apply_curly_braces_to_prompt(prompt, seed=-1):
     return prompt
 
 
+class WildcardIndex:
+    """wildcard files indexed by name and path component, candidate files per wildcard are resolved once per file list
+    and file contents are cached until file mtime changes"""
+
+    def __init__(self):
+        self.files: list[str] = []
+        self.full: list[str] = [] # lowercase path without extension
+        self.components: list[list[str]] = [] # lowercase path components without extension
+        self.names: dict[str, list[int]] = {} # full path or basename: file indexes
+        self.parts: dict[str, list[int]] = {} # path component: file indexes
+        self.resolved: dict[str, list[str]] = {}
+        self.contents: dict[str, tuple] = {} # file: (mtime, lines)
+        self.hits = 0
+        self.misses = 0
+
+    def refresh(self):
+        files = list(files_cache.list_files(shared.opts.wildcards_dir, ext_filter=[".txt"], recursive=True))
+        if files == self.files:
+            return files
+        t0 = time.time()
+        self.files = files
+        self.full = [os.path.splitext(f)[0].lower() for f in files]
+        self.components = [[os.path.splitext(p.lower())[0] for p in os.path.normpath(f).split(os.path.sep)] for f in files]
+        self.names.clear()
+        self.parts.clear()
+        for i, f in enumerate(files):
+            for name in dict.fromkeys([self.full[i], os.path.splitext(os.path.basename(f).lower())[0]]):
+                self.names.setdefault(name, []).append(i)
+            for part in dict.fromkeys(self.components[i]):
+                self.parts.setdefault(part, []).append(i)
+        self.resolved.clear()
+        self.contents = {f: self.contents[f] for f in files if f in self.contents}
+        if debug_enabled:
+            shared.log.trace(f'Wildcards index: files={len(files)} names={len(self.names)} parts={len(self.parts)} time={time.time()-t0:.3f}')
+        return files
+
+    def candidates(self, trimmed: str) -> list[str]:
+        """files in the same order the linear basename pass followed by path component pass would try them"""
+        if trimmed in self.resolved:
+            return self.resolved[trimmed]
+        if os.path.sep in trimmed: # partial path match requires scan, result is cached
+            first = [i for i, full in enumerate(self.full) if trimmed == full or i in self.names.get(trimmed, []) or trimmed in full]
+            second = [i for i, parts in enumerate(self.components) if trimmed in parts or trimmed in parts[0]]
+        else:
+            first = self.names.get(trimmed, [])
+            second = self.parts.get(trimmed, [])
+        files = [self.files[i] for i in list(dict.fromkeys(first)) + list(dict.fromkeys(second))]
+        self.resolved[trimmed] = files
+        return files
+
+    def lines(self, file: str) -> list[str]:
+        mtime = os.path.getmtime(file)
+        cached = self.contents.get(file, None)
+        if cached is not None and cached[0] == mtime:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        with open(file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        self.contents[file] = (mtime, lines)
+        return lines
+
+
+wildcard_index = WildcardIndex()
+
+
 def apply_file_wildcards(prompt, replaced = [], not_found = [], recursion=0, seed=-1):
-    def check_wildcard_files(prompt, wildcard, files, file_only=True):
+    def check_wildcard_files(prompt, wildcard):
         trimmed = wildcard.replace('\\', os.path.sep).strip().lower()
-        for file in files:
-            if file_only:
-                paths = [os.path.splitext(file)[0].lower(), os.path.splitext(os.path.basename(file).lower())[0]] # fullname and basename
-            else:
-                paths = [os.path.splitext(p.lower())[0] for p in os.path.normpath(file).split(os.path.sep)] # every path component
-            if (trimmed in paths) or (os.path.sep in trimmed and trimmed in paths[0]):
-                try:
-                    with open(file, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        if len(lines) > 0:
-                            choice = random.choice(lines).strip(' \n')
-                            if '|' in choice:
-                                choice = random.choice(choice.split('|')).strip(' []{}\n')
-                            prompt = prompt.replace(f"__{wildcard}__", choice, 1)
-                            shared.log.debug(f'Apply wildcard: select="{wildcard}" choice="{choice}" file="{file}" choices={len(lines)}')
-                            replaced.append(wildcard)
-                            return prompt, True
-                except Exception as e:
-                    shared.log.error(f'Wildcards: wildcard={wildcard} file={file} {e}')
-        if not file_only:
-            return prompt, False
-        return check_wildcard_files(prompt, wildcard, files, file_only=False)
+        for file in wildcard_index.candidates(trimmed):
+            try:
+                lines = wildcard_index.lines(file)
+                if len(lines) > 0:
+                    choice = random.choice(lines).strip(' \n')
+                    if '|' in choice:
+                        choice = random.choice(choice.split('|')).strip(' []{}\n')
+                    prompt = prompt.replace(f"__{wildcard}__", choice, 1)
+                    shared.log.debug(f'Apply wildcard: select="{wildcard}" choice="{choice}" file="{file}" choices={len(lines)}')
+                    replaced.append(wildcard)
+                    return prompt, True
+            except Exception as e:
+                shared.log.error(f'Wildcards: wildcard={wildcard} file={file} {e}')
+        return prompt, False
 
     def get_wildcards(prompt):
         matches = re.findall(r'__(.*?)__', prompt, re.DOTALL)
@@ -100,11 +158,11 @@ def apply_file_wildcards(prompt, replaced = [], not_found = [], recursion=0, see
     wildcards = get_wildcards(prompt)
     if len(wildcards) == 0:
         return prompt, replaced, not_found
-    files = list(files_cache.list_files(shared.opts.wildcards_dir, ext_filter=[".txt"], recursive=True))
+    files = wildcard_index.refresh() if recursion == 1 else wildcard_index.files
     if len(files) == 0:
         return prompt, replaced, not_found
     for wildcard in wildcards:
-        prompt, found = check_wildcard_files(prompt, wildcard, files)
+        prompt, found = check_wildcard_files(prompt, wildcard)
         if found and wildcard in not_found:
             not_found.remove(wildcard)
         elif not found and wildcard not in not_found:
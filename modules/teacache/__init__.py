@@ -5,6 +5,7 @@ from .teacache_ltx import teacache_ltx_forward
 from .teacache_mochi import teacache_mochi_forward
 from .teacache_cogvideox import teacache_cog_forward
 from .teacache_chroma import teacache_chroma_forward
+from . import teacache_profile
 
 
 supported_models = ['Flux', 'Chroma', 'CogVideoX', 'Mochi', 'LTX', 'HiDream', 'Lumina2']
@@ -12,16 +13,29 @@ supported_models = ['Flux', 'Chroma', 'CogVideoX', 'Mochi', 'LTX', 'HiDream', 'L
 
 def apply_teacache(p):
     from modules import shared
+    teacache_profile.detach()
     if not shared.opts.teacache_enabled:
         return
     if not any(shared.sd_model.__class__.__name__.startswith(x) for x in supported_models):
         return
     if not hasattr(shared.sd_model, 'transformer'):
         return
-    shared.sd_model.transformer.__class__.enable_teacache = shared.opts.teacache_thresh > 0
+    thresh = shared.opts.teacache_thresh # 0.25 for 1.5x speedup, 0.4 for 1.8x speedup, 0.6 for 2.0x speedup, 0.8 for 2.25x speedup
+    coefficients = None
+    calibration = None
+    profile = teacache_profile.load(shared.sd_model) if shared.opts.teacache_profile else None
+    if shared.opts.teacache_calibrate: # compute every step and record changes to fit profile
+        calibration = teacache_profile.attach(shared.sd_model, shared.sd_model.transformer)
+        thresh = float('inf')
+    elif profile is not None:
+        coefficients = profile['coefficients']
+        thresh = profile['thresh']
+    shared.sd_model.transformer.__class__.enable_teacache = thresh > 0
     shared.sd_model.transformer.__class__.cnt = 0
     shared.sd_model.transformer.__class__.num_steps = p.steps
-    shared.sd_model.transformer.__class__.rel_l1_thresh = shared.opts.teacache_thresh # 0.25 for 1.5x speedup, 0.4 for 1.8x speedup, 0.6 for 2.0x speedup, 0.8 for 2.25x speedup
+    shared.sd_model.transformer.__class__.rel_l1_thresh = -thresh if calibration is not None else thresh
+    shared.sd_model.transformer.__class__.coefficients = coefficients
+    shared.sd_model.transformer.__class__.calibration = calibration
     shared.sd_model.transformer.__class__.accumulated_rel_l1_distance = 0
     shared.sd_model.transformer.__class__.previous_modulated_input = None
     shared.sd_model.transformer.__class__.previous_residual = None
@@ -30,4 +44,9 @@ def apply_teacache(p):
     if shared.sd_model.__class__.__name__.startswith('Lumina2'):
         shared.sd_model.transformer.__class__.cache = {}
         shared.sd_model.transformer.__class__.uncond_seq_len = None
-    shared.log.info(f'Transformers cache: type=teacache cls={shared.sd_model.__class__.__name__} thresh={shared.opts.teacache_thresh}')
+    if calibration is not None:
+        shared.log.info(f'Transformers cache: type=teacache cls={shared.sd_model.__class__.__name__} calibrate=True model="{calibration.name}" loras={len(calibration.loras)}')
+    elif profile is not None:
+        shared.log.info(f'Transformers cache: type=teacache cls={shared.sd_model.__class__.__name__} profile="{profile["model"]}" thresh={thresh:.3f} speedup={profile["speedup"]:.2f} error={profile["error"]:.4f}')
+    else:
+        shared.log.info(f'Transformers cache: type=teacache cls={shared.sd_model.__class__.__name__} thresh={thresh}')
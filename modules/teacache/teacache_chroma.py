@@ -3,6 +3,7 @@ import torch
 import numpy as np
 from diffusers.models.modeling_outputs import Transformer2DModelOutput
 from diffusers.utils import USE_PEFT_BACKEND, is_torch_version, logging, scale_lora_layers, unscale_lora_layers
+from .teacache_profile import rescale
 
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
@@ -98,8 +99,7 @@ def teacache_chroma_forward(
             self.accumulated_rel_l1_distance = 0
         else:
             coefficients = [4.98651651e+02, -2.83781631e+02,  5.58554382e+01, -3.82021401e+00, 2.64230861e-01]
-            rescale_func = np.poly1d(coefficients)
-            self.accumulated_rel_l1_distance += rescale_func(((modulated_inp-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item())
+            self.accumulated_rel_l1_distance += rescale(self, ((modulated_inp-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item(), coefficients)
             if self.accumulated_rel_l1_distance < self.rel_l1_thresh:
                 should_calc = False
             else:
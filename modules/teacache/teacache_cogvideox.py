@@ -1,8 +1,8 @@
 from typing import Any, Dict, Optional, Union, Tuple
 import torch
-import numpy as np
 from diffusers.utils import USE_PEFT_BACKEND, is_torch_version, scale_lora_layers, unscale_lora_layers, logging
 from diffusers.models.modeling_outputs import Transformer2DModelOutput
+from .teacache_profile import rescale
 
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
@@ -71,8 +71,7 @@ def teacache_cog_forward(
             else:
                 # CogVideoX-5B and CogvideoX1.5-5B
                 coefficients = [-1.53880483e+03,  8.43202495e+02, -1.34363087e+02,  7.97131516e+00, -5.23162339e-02]
-            rescale_func = np.poly1d(coefficients)
-            self.accumulated_rel_l1_distance += rescale_func(((emb-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item())
+            self.accumulated_rel_l1_distance += rescale(self, ((emb-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item(), coefficients)
             if self.accumulated_rel_l1_distance < self.rel_l1_thresh:
                 should_calc = False
             else:
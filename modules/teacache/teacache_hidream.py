@@ -3,7 +3,7 @@ from diffusers.models.modeling_outputs import Transformer2DModelOutput
 from diffusers.utils import logging, deprecate, USE_PEFT_BACKEND, logging, scale_lora_layers, unscale_lora_layers
 
 import torch
-import numpy as np
+from .teacache_profile import rescale
 
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
@@ -112,8 +112,7 @@ def teacache_hidream_forward(
             self.accumulated_rel_l1_distance = 0
         else:
             coefficients = [-3.13605009e+04, -7.12425503e+02, 4.91363285e+01, 8.26515490e+00, 1.08053901e-01]
-            rescale_func = np.poly1d(coefficients)
-            self.accumulated_rel_l1_distance += rescale_func(((modulated_inp-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item())
+            self.accumulated_rel_l1_distance += rescale(self, ((modulated_inp-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item(), coefficients)
             if self.accumulated_rel_l1_distance < self.rel_l1_thresh:
                 should_calc = False
             else:
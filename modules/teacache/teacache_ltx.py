@@ -2,7 +2,7 @@ from typing import Any, Dict, Optional, Tuple
 import torch
 from diffusers.utils import USE_PEFT_BACKEND, is_torch_version, scale_lora_layers, unscale_lora_layers, logging
 from diffusers.models.modeling_outputs import Transformer2DModelOutput
-import numpy as np
+from .teacache_profile import rescale
 
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
@@ -71,8 +71,7 @@ def teacache_ltx_forward(
             self.accumulated_rel_l1_distance = 0
         else:
             coefficients = [2.14700694e+01, -1.28016453e+01,  2.31279151e+00,  7.92487521e-01, 9.69274326e-03]
-            rescale_func = np.poly1d(coefficients)
-            self.accumulated_rel_l1_distance += rescale_func(((modulated_inp-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item())
+            self.accumulated_rel_l1_distance += rescale(self, ((modulated_inp-self.previous_modulated_input).abs().mean() / self.previous_modulated_input.abs().mean()).cpu().item(), coefficients)
             if self.accumulated_rel_l1_distance < self.rel_l1_thresh:
                 should_calc = False
             else:
@@ -1,10 +1,10 @@
 import torch
 import torch.nn as nn
-import numpy as np
 from typing import Any, Dict, Optional, Union, List
 
 from diffusers.models.modeling_outputs import Transformer2DModelOutput
 from diffusers.utils import USE_PEFT_BACKEND, logging, scale_lora_layers, unscale_lora_layers
+from .teacache_profile import rescale
 
 logger = logging.get_logger(__name__)  # pylint: disable=invalid-name
 
@@ -71,7 +71,6 @@ def teacache_lumina2_forward(
                 coefficients = [393.76566581, -603.50993606, 209.10239044, -23.00726601, 0.86377344]
                 # teacache v2 coefficients:
                 #coefficients = [225.7042019806413, -608.8453716535591, 304.1869942338369, 124.21267720116742, -1.4089066892956552]
-                rescale_func = np.poly1d(coefficients)
                 prev_mod_input = current_cache["previous_modulated_input"]
                 prev_mean = prev_mod_input.abs().mean()
 
@@ -80,7 +79,7 @@ def teacache_lumina2_forward(
                 else:
                     rel_l1_change = 0.0 if modulated_inp.abs().mean().item() < 1e-9 else float('inf')
 
-                current_cache["accumulated_rel_l1_distance"] += rescale_func(rel_l1_change)
+                current_cache["accumulated_rel_l1_distance"] += rescale(self, rel_l1_change, coefficients, key=cache_key)
 
                 if current_cache["accumulated_rel_l1_distance"] < self.rel_l1_thresh:
                     should_calc = False
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+from modules import shared, paths
+
+
+degree = 4 # same polynomial degree as built-in coefficients
+max_runs = 16 # calibration runs kept per profile, oldest are dropped
+candidates = 200 # thresholds evaluated when selecting operating point
+profiles = {} # key: loaded profile
+calibration = None # active calibration recorder
+
+
+def rescale(module, rel: float, coefficients: list, key=None) -> float:
+    """rescale relative input change using calibrated profile coefficients if loaded, records raw change while calibrating"""
+    recorder = getattr(module, 'calibration', None)
+    if recorder is not None:
+        recorder.pending = (key, rel)
+    coefficients = getattr(module, 'coefficients', None) or coefficients
+    return float(np.poly1d(coefficients)(rel))
+
+
+def model_key(model):
+    """profile is specific to checkpoint and active lora stack since both change output response to same input change"""
+    info = getattr(model, 'sd_checkpoint_info', None)
+    name = (info.shorthash or info.name) if info is not None else model.__class__.__name__
+    try:
+        from modules.lora import lora_common
+        loras = sorted(f'{net.name}:{net.unet_multiplier}' for net in lora_common.loaded_networks)
+    except Exception:
+        loras = []
+    base = hashlib.sha256(name.encode('utf-8')).hexdigest()[:16]
+    key = hashlib.sha256(json.dumps([name] + loras).encode('utf-8')).hexdigest()[:16] if len(loras) > 0 else base
+    return key, base, name, loras
+
+
+def profile_file(key: str) -> str:
+    return os.path.join(paths.data_path, 'cache', 'teacache', f'{key}.json')
+
+
+def read(key: str):
+    if key in profiles:
+        return profiles[key]
+    fn = profile_file(key)
+    profile = None
+    if os.path.isfile(fn):
+        try:
+            with open(fn, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+        except Exception as e:
+            shared.log.warning(f'TeaCache profile: file="{fn}" {e}')
+    profiles[key] = profile
+    return profile
+
+
+def write(key: str, profile: dict):
+    fn = profile_file(key)
+    try:
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, 'w', encoding='utf-8') as f:
+            json.dump(profile, f)
+        profiles[key] = profile
+    except Exception as e:
+        shared.log.error(f'TeaCache profile: file="{fn}" {e}')
+
+
+def fit(runs: list):
+    x = [rel_in for run in runs for rel_in, _rel_out in run]
+    y = [rel_out for run in runs for _rel_in, rel_out in run]
+    if len(x) <= degree:
+        return None
+    return np.polyfit(x, y, degree).tolist()
+
+
+def simulate(runs: list, coefficients: list, thresh: float):
+    """replay recorded runs with threshold, returns speedup and mean accumulated output drift over skipped steps"""
+    rescale_func = np.poly1d(coefficients)
+    steps, computed, error = 0, 0, 0.0
+    for run in runs:
+        steps += len(run) + 2 # first and last steps are always computed
+        computed += 2
+        accumulated, drift = 0.0, 0.0
+        for rel_in, rel_out in run:
+            accumulated += rescale_func(rel_in)
+            drift += rel_out
+            if accumulated < thresh:
+                error += drift # skipped step reuses residual from last computed step
+            else:
+                computed += 1
+                accumulated, drift = 0.0, 0.0
+    return steps / max(computed, 1), error / max(steps, 1)
+
+
+def select(runs: list, coefficients: list, target: float, budget: float):
+    """smallest threshold that reaches target speedup, or largest threshold within quality budget if budget is set"""
+    rescale_func = np.poly1d(coefficients)
+    upper = max([sum(abs(rescale_func(rel_in)) for rel_in, _rel_out in run) for run in runs] + [0])
+    best = (0.0, 1.0, 0.0)
+    for thresh in np.linspace(0, upper, candidates + 1)[1:]:
+        speedup, error = simulate(runs, coefficients, thresh)
+        if budget > 0:
+            if error <= budget and speedup >= best[1]:
+                best = (float(thresh), speedup, error)
+        else:
+            best = (float(thresh), speedup, error)
+            if speedup >= target:
+                break
+    return best
+
+
+def load(model):
+    """profile for current model and lora stack with threshold selected for configured target, falls back to base model profile"""
+    key, base, _name, _loras = model_key(model)
+    profile = read(key) or read(base)
+    if profile is None or profile.get('coefficients', None) is None:
+        return None
+    target, budget = shared.opts.teacache_target, shared.opts.teacache_budget
+    if profile.get('target', None) != target or profile.get('budget', None) != budget:
+        profile['thresh'], profile['speedup'], profile['error'] = select(profile['runs'], profile['coefficients'], target, budget)
+        profile['target'], profile['budget'] = target, budget
+    return profile
+
+
+class Calibration:
+    """records relative input and output change of every step while caching is disabled, each completed run refits the profile"""
+
+    def __init__(self, model, module):
+        self.key, _base, self.name, self.loras = model_key(model)
+        self.cls = model.__class__.__name__
+        self.module = module
+        self.pending = None # (key, relative input change) set by rescale during forward
+        self.previous = {} # key: previous output
+        self.run = []
+        self.cnt = 0
+        self.handle = module.register_forward_hook(self.hook)
+
+    def hook(self, module, _args, output):
+        out = output.sample if hasattr(output, 'sample') else output[0] if isinstance(output, (tuple, list)) else output
+        key, rel_in = self.pending if self.pending is not None else (None, None)
+        self.pending = None
+        previous = self.previous.get(key, None)
+        if rel_in is not None and previous is not None and previous.shape == out.shape:
+            rel_out = ((out - previous).abs().mean() / previous.abs().mean()).cpu().item()
+            if np.isfinite(rel_in) and np.isfinite(rel_out):
+                self.run.append((rel_in, rel_out))
+        self.previous[key] = out.detach().clone()
+        if module.cnt == 0 and self.cnt != 0: # forward wraps step counter at end of run
+            self.complete()
+        self.cnt = module.cnt
+
+    def complete(self):
+        run, self.run = self.run, []
+        self.previous.clear()
+        if len(run) == 0:
+            return
+        profile = read(self.key) or {}
+        runs = (profile.get('runs', []) + [run])[-max_runs:]
+        coefficients = fit(runs)
+        if coefficients is None:
+            return
+        target, budget = shared.opts.teacache_target, shared.opts.teacache_budget
+        thresh, speedup, error = select(runs, coefficients, target, budget)
+        profile = {
+            'model': self.name,
+            'cls': self.cls,
+            'loras': self.loras,
+            'coefficients': coefficients,
+            'thresh': thresh,
+            'speedup': speedup,
+            'error': error,
+            'target': target,
+            'budget': budget,
+            'runs': runs,
+            'created': time.time(),
+        }
+        write(self.key, profile)
+        shared.log.info(f'TeaCache calibrate: model="{self.name}" loras={len(self.loras)} runs={len(runs)} samples={sum(len(r) for r in runs)} thresh={thresh:.3f} speedup={speedup:.2f} error={error:.4f} target={target} budget={budget}')
+
+    def remove(self):
+        self.handle.remove()
+        self.previous.clear()
+
+
+def detach():
+    global calibration # pylint: disable=global-statement
+    if calibration is not None:
+        calibration.remove()
+        calibration = None
+
+
+def attach(model, module):
+    global calibration # pylint: disable=global-statement
+    detach()
+    calibration = Calibration(model, module)
+    return calibration
@@ -140,6 +140,7 @@ def save_files(js_data, files, html_info, index):
         start_index = index
     filenames = []
     fullfns = []
+    futures = []
     for image_index, filedata in enumerate(files, start_index):
         is_grid = image_index < p.index_of_first_image # pylint: disable=no-member
         i = 0 if is_grid else (image_index - p.index_of_first_image) # pylint: disable=no-member
@@ -192,7 +193,10 @@ def save_files(js_data, files, html_info, index):
             try:
                 seed = p.all_seeds[i] if i < len(p.all_seeds) else p.seed
                 prompt = p.all_prompts[i] if i < len(p.all_prompts) else p.prompt
-                fullfn, txt_fullfn, _exif = images.save_image(image, shared.opts.outdir_save, "", seed=seed, prompt=prompt, info=info, extension=shared.opts.samples_format, grid=is_grid, p=p)
+                res = images.save_image(image, shared.opts.outdir_save, "", seed=seed, prompt=prompt, info=info, extension=shared.opts.samples_format, grid=is_grid, p=p)
+                fullfn, txt_fullfn, _exif = res
+                if getattr(res, 'future', None) is not None:
+                    futures.append(res.future)
             except Exception as e:
                 fullfn, txt_fullfn = None, None
                 shared.log.error(f'Save: image={image} i={i} seeds={p.all_seeds} prompts={p.all_prompts}')
@@ -207,6 +211,11 @@ def save_files(js_data, files, html_info, index):
                 # fullfns.append(txt_fullfn)
             script_callbacks.image_save_btn_callback(filename)
     if shared.opts.samples_save_zip and len(fullfns) > 1:
+        for future in futures:
+            try:
+                future.result() # zip needs files written by save workers
+            except Exception:
+                pass
         zip_filepath = os.path.join(shared.opts.outdir_save, "images.zip")
         from zipfile import ZipFile
         with ZipFile(zip_filepath, "w") as zip_file:
@@ -48,6 +48,50 @@ card_list = '''
     </div>
 '''
 preview_map = None
+sort_keys = {
+    'Name [A-Z]': (lambda x: x.get("name", ""), False),
+    'Name [Z-A]': (lambda x: x.get("name", ""), True),
+    'Date [Newest]': (lambda x: x.get("mtime", 0) or 0, True),
+    'Date [Oldest]': (lambda x: x.get("mtime", 0) or 0, False),
+    'Size [Largest]': (lambda x: x.get("size", 0) or 0, True),
+    'Size [Smallest]': (lambda x: x.get("size", 0) or 0, False),
+}
+card_fields = ['type', 'name', 'title', 'alias', 'filename', 'hash', 'prompt', 'onclick', 'mtime', 'size', 'version', 'tags', 'preview', 'search_term']
+query_cache = OrderedDict()
+
+
+def sort_items(items: list, order: str):
+    if order not in sort_keys or len(items) == 0 or items[0].get('mtime', None) is None:
+        return items
+    key, reverse = sort_keys[order]
+    items.sort(key=key, reverse=reverse)
+    return items
+
+
+def query_items(page, order: str = None, search: str = None, version: str = None, folder: str = None):
+    """sorted and filtered list of page items, memoized until page is refreshed"""
+    order = order or shared.opts.extra_networks_sort
+    key = (page.name, page.refresh_time, order, (search or '').lower(), version, folder)
+    if key in query_cache:
+        query_cache.move_to_end(key)
+        return query_cache[key]
+    items = [item for item in page.items if item is not None]
+    if folder:
+        items = [item for item in items if folder in item.get('name', '').replace('\\', '/') or folder in (item.get('filename', '') or '').replace('\\', '/')]
+    if version:
+        items = [item for item in items if item.get('version', '') == version]
+    if search:
+        terms = search.lower().split()
+        def text(item):
+            tags = item.get('tags', {})
+            tags = tags if isinstance(tags, str) else ' '.join(tags.keys())
+            return ' '.join([item.get('name', ''), item.get('alias', '') or '', item.get('filename', '') or '', item.get('search_term', '') or '', tags]).lower()
+        items = [item for item in items if all(t in text(item) for t in terms)]
+    items = sort_items(items, order)
+    query_cache[key] = items
+    while len(query_cache) > 16:
+        query_cache.popitem(last=False)
+    return items
 
 
 def init_api():
@@ -114,7 +158,29 @@ def init_api():
         obj = json.dumps(item, cls=DateTimeEncoder)
         return JSONResponse(obj)
 
+    def list_network(page: str = "", sort: str = None, search: str = None, version: str = None, folder: str = None, cursor: str = None, limit: int = 100):
+        page = next(iter([x for x in get_pages() if x.name.lower() == page.lower()]), None)
+        if page is None:
+            return JSONResponse({ "error": "page not found" }, status_code=404)
+        page.create_items('api')
+        items = query_items(page, sort, search, version, folder)
+        start = 0
+        if cursor:
+            try:
+                after = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            except Exception:
+                return JSONResponse({ "error": "invalid cursor" }, status_code=400)
+            start = after.get('offset', 0)
+            if start > 0 and (start > len(items) or items[start - 1].get('name') != after.get('name')): # list changed since cursor was issued so locate last seen item
+                start = next((i + 1 for i, item in enumerate(items) if item.get('name') == after.get('name')), min(start, len(items)))
+        limit = max(1, min(limit, 1000))
+        res = [{k: item[k] for k in card_fields if k in item} for item in items[start:start + limit]]
+        end = start + len(res)
+        next_cursor = base64.urlsafe_b64encode(json.dumps({ 'offset': end, 'name': items[end - 1].get('name') }).encode()).decode() if end < len(items) else None
+        return JSONResponse({ "page": page.name, "total": len(items), "items": json.loads(json.dumps(res, cls=DateTimeEncoder)), "cursor": next_cursor })
+
     shared.api.add_api_route("/sdapi/v1/network", get_network, methods=["GET"])
+    shared.api.add_api_route("/sdapi/v1/network/list", list_network, methods=["GET"])
     shared.api.add_api_route("/sdapi/v1/network/thumb", fetch_file, methods=["GET"])
     shared.api.add_api_route("/sdapi/v1/network/metadata", get_metadata, methods=["GET"])
     shared.api.add_api_route("/sdapi/v1/network/info", get_info, methods=["GET"])
@@ -146,6 +212,7 @@ class ExtraNetworksPage:
         self.desc_time = 0
         self.preview_time = 0
         self.dirs = {}
+        self.index = {} # key: (signature, item) used to skip create_item for unchanged files
         self.view = shared.opts.extra_networks_view
         self.card = card_full if shared.opts.extra_networks_view == 'gallery' else card_list
 
@@ -241,6 +308,33 @@ class ExtraNetworksPage:
             shared.log.info(f'Network thumbnails: type={self.name} created={created}')
             self.missing_thumbs.clear()
 
+    def item_signature(self, filename, *extra):
+        if filename is None:
+            return None
+        def mtime(fn):
+            try:
+                st = os.stat(fn)
+                return st.st_size, st.st_mtime_ns
+            except Exception:
+                return None
+        base = os.path.splitext(filename)[0]
+        sidecars = [mtime(f'{base}{ext}') for ext in ['.json', '.txt', '.md']] # info and description
+        return (mtime(filename), sidecars, extra)
+
+    def cached_item(self, key, filename, fn, *args, extra=()):
+        """return indexed item if file and its sidecars are unchanged since last listing, otherwise create item
+        indexed item is returned as copy with preview cleared so added or replaced previews are picked up by update_all_previews"""
+        signature = self.item_signature(filename, *extra)
+        entry = self.index.get(key, None)
+        if signature is not None and entry is not None and entry[0] == signature:
+            item = dict(entry[1])
+            item['preview'] = None
+            return item
+        item = fn(*args)
+        if item is not None and signature is not None:
+            self.index[key] = (signature, item)
+        return item
+
     def create_items(self, tabname):
         if self.refresh_time is not None and self.refresh_time > refresh_time: # cached results
             return
@@ -334,21 +428,7 @@ class ExtraNetworksPage:
         self.create_xyz_grid()
         htmls = []
 
-        if len(self.items) > 0 and self.items[0].get('mtime', None) is not None:
-            if shared.opts.extra_networks_sort == 'Default':
-                pass
-            elif shared.opts.extra_networks_sort == 'Name [A-Z]':
-                self.items.sort(key=lambda x: x["name"])
-            elif shared.opts.extra_networks_sort == 'Name [Z-A]':
-                self.items.sort(key=lambda x: x["name"], reverse=True)
-            elif shared.opts.extra_networks_sort == 'Date [Newest]':
-                self.items.sort(key=lambda x: x["mtime"], reverse=True)
-            elif shared.opts.extra_networks_sort == 'Date [Oldest]':
-                self.items.sort(key=lambda x: x["mtime"])
-            elif shared.opts.extra_networks_sort == 'Size [Largest]':
-                self.items.sort(key=lambda x: x["size"], reverse=True)
-            elif shared.opts.extra_networks_sort == 'Size [Smallest]':
-                self.items.sort(key=lambda x: x["size"])
+        sort_items(self.items, shared.opts.extra_networks_sort)
 
         for item in self.items:
             htmls.append(self.create_html(item, tabname))
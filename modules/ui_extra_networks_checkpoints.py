@@ -136,7 +136,7 @@ class ExtraNetworksPageCheckpoints(ui_extra_networks.ExtraNetworksPage):
     def list_items(self):
         items = []
         with concurrent.futures.ThreadPoolExecutor(max_workers=shared.max_workers) as executor:
-            future_items = {executor.submit(self.create_item, cp): cp for cp in list(sd_models.checkpoints_list.copy())}
+            future_items = {executor.submit(self.cached_item, cp, info.filename, self.create_item, cp, extra=(info.shorthash,)): cp for cp, info in list(sd_models.checkpoints_list.copy().items())}
             for future in concurrent.futures.as_completed(future_items):
                 item = future.result()
                 if item is not None:
@@ -101,7 +101,7 @@ class ExtraNetworksPageLora(ui_extra_networks.ExtraNetworksPage):
     def list_items(self):
         items = []
         with concurrent.futures.ThreadPoolExecutor(max_workers=shared.max_workers) as executor:
-            future_items = {executor.submit(self.create_item, net): net for net in lora_load.available_networks}
+            future_items = {executor.submit(self.cached_item, net, l.filename, self.create_item, net, extra=(l.shorthash,)): net for net, l in lora_load.available_networks.items()}
             for future in concurrent.futures.as_completed(future_items):
                 item = future.result()
                 if item is not None:
@@ -230,6 +230,8 @@ def create_ui():
                         with gr.Row():
                             re_basin = gr.Checkbox(label="ReBasin")
                             re_basin_iterations = gr.Slider(minimum=0, maximum=25, step=1, label='Number of ReBasin Iterations', value=None, visible=False)
+                        with gr.Row():
+                            streaming = gr.Checkbox(label="Streaming merge", value=False)
                         with gr.Row():
                             checkpoint_format = gr.Radio(choices=["ckpt", "safetensors"], value="safetensors", visible=False, label="Model format")
                         with gr.Row():
@@ -273,6 +275,7 @@ def create_ui():
                                 prune, # pylint: disable=unused-argument
                                 re_basin, # pylint: disable=unused-argument
                                 re_basin_iterations, # pylint: disable=unused-argument
+                                streaming, # pylint: disable=unused-argument
                                 device, # pylint: disable=unused-argument
                                 unload, # pylint: disable=unused-argument
                                 bake_in_vae): # pylint: disable=unused-argument
@@ -393,6 +396,7 @@ def create_ui():
                         prune,
                         re_basin,
                         re_basin_iterations,
+                        streaming,
                         device,
                         unload,
                         bake_in_vae,
@@ -143,7 +143,7 @@ def generate(*args, **kwargs):
     shared.log.info(f'Video: name="{selected.name}" cls={shared.sd_model.__class__.__name__} frames={len(processed.images)} time={t1-t0:.2f}')
 
     # video_file = images.save_video(p, filename=None, images=processed.images, video_type=video_type, duration=video_duration, loop=video_loop, pad=video_pad, interpolate=video_interpolate) # legacy video save from list of images
-    pixels = video_save.images_to_tensor(processed.images)
+    pixels = video_save.images_to_chunks(processed.images, shared.opts.video_stream_frames)
     _num_frames, video_file = video_save.save_video(
         p=p,
         pixels=pixels,
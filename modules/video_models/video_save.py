@@ -1,5 +1,7 @@
 import os
 import time
+import queue
+import threading
 import cv2
 import numpy as np
 import torch
@@ -62,16 +64,27 @@ def images_to_tensor(images):
     return tensor
 
 
-def atomic_save_video(filename, tensor:torch.Tensor, fps:float=24, codec:str='libx264', pix_fmt:str='yuv420p', options:str='', metadata:dict={}, pbar=None):
-    av = check_av()
-    if av is None or av is False:
-        shared.log.error('Video: ffmpeg/av not available')
+def images_to_chunks(images, frames:int=16):
+    """convert images to pixel tensors lazily in temporal chunks instead of materializing full video tensor"""
+    if images is None or len(images) == 0:
         return
+    frames = frames if frames > 0 else len(images)
+    for i in range(0, len(images), frames):
+        yield images_to_tensor(images[i:i+frames])
 
-    savejob = shared.state.begin('Save video')
-    frames, height, width, _channels = tensor.shape
-    rate = round(fps)
-    options_str = options
+
+def pixel_chunks(pixels, frames:int=16):
+    """split pixel tensor n c t h w into temporal chunks or pass through iterable of chunks"""
+    if torch.is_tensor(pixels):
+        t = pixels.shape[2]
+        frames = frames if frames > 0 else t
+        for i in range(0, t, frames):
+            yield pixels[:, :, i:i+frames]
+    else:
+        yield from pixels
+
+
+def parse_options(options_str:str):
     options = {}
     for option in [option.strip() for option in options_str.split(',')]:
         if '=' in option:
@@ -81,30 +94,104 @@ def atomic_save_video(filename, tensor:torch.Tensor, fps:float=24, codec:str='li
         else:
             continue
         options[key.strip()] = value.strip()
-    shared.log.info(f'Video: file="{filename}" codec={codec} frames={frames} width={width} height={height} fps={rate} options={options}')
-    video_array = torch.as_tensor(tensor, dtype=torch.uint8).numpy(force=True)
-    task = pbar.add_task('encoding', total=frames) if pbar is not None else None
-    if task is not None:
-        pbar.update(task, description='video encoding')
-    with av.open(filename, mode="w") as container:
-        for k, v in metadata.items():
-            container.metadata[k] = v
-        stream: av.VideoStream = container.add_stream(codec, rate=rate, options=options)
-        stream.width = video_array.shape[2]
-        stream.height = video_array.shape[1]
-        stream.pix_fmt = pix_fmt
-        for img in video_array:
-            frame = av.VideoFrame.from_ndarray(img, format="rgb24")
-            for packet in stream.encode_lazy(frame):
-                container.mux(packet)
-            if task is not None:
-                pbar.update(task, advance=1)
-        for packet in stream.encode(): # flush
-            container.mux(packet)
-    shared.state.outputs(filename)
+    return options
+
+
+class VideoEncoder:
+    """background pyav encoder fed through bounded queue of uint8 frame chunks so encoding overlaps decode and conversion"""
+
+    def __init__(self, filename:str, width:int, height:int, fps:float=24, codec:str='libx264', pix_fmt:str='yuv420p', options:str='', metadata:dict={}, depth:int=4, pbar=None, total:int=None):
+        self.av = check_av()
+        if self.av is None or self.av is False:
+            raise RuntimeError('ffmpeg/av not available')
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.rate = round(fps)
+        self.codec = codec
+        self.pix_fmt = pix_fmt
+        self.options = parse_options(options)
+        self.metadata = metadata
+        self.queue = queue.Queue(maxsize=max(1, depth))
+        self.frames = 0
+        self.error = None
+        self.pbar = pbar
+        self.task = pbar.add_task('encoding', total=total) if pbar is not None else None
+        if self.task is not None:
+            pbar.update(self.task, description='video encoding')
+        shared.log.info(f'Video: file="{filename}" codec={codec} width={width} height={height} fps={self.rate} options={self.options} queue={depth}')
+        self.thread = threading.Thread(target=self.run, name='sd-video-encode', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        av = self.av
+        try:
+            with av.open(self.filename, mode="w") as container:
+                for k, v in self.metadata.items():
+                    container.metadata[k] = v
+                stream: av.VideoStream = container.add_stream(self.codec, rate=self.rate, options=self.options)
+                stream.width = self.width
+                stream.height = self.height
+                stream.pix_fmt = self.pix_fmt
+                while True:
+                    chunk = self.queue.get()
+                    if chunk is None:
+                        break
+                    for img in chunk:
+                        frame = av.VideoFrame.from_ndarray(img, format="rgb24")
+                        for packet in stream.encode_lazy(frame):
+                            container.mux(packet)
+                        self.frames += 1
+                        if self.task is not None:
+                            self.pbar.update(self.task, advance=1)
+                for packet in stream.encode(): # flush
+                    container.mux(packet)
+        except Exception as e:
+            self.error = e
+            while self.queue.get() is not None: # drain so producer is never blocked
+                pass
+
+    def write(self, chunk:np.ndarray):
+        """chunk of frames in t h w c uint8 format, blocks when queue is full"""
+        if self.error is not None:
+            raise self.error
+        self.queue.put(chunk)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.frames
+
+
+def atomic_save_video(filename, tensor:torch.Tensor, fps:float=24, codec:str='libx264', pix_fmt:str='yuv420p', options:str='', metadata:dict={}, pbar=None):
+    savejob = shared.state.begin('Save video')
+    try:
+        frames, height, width, _channels = tensor.shape
+        encoder = VideoEncoder(filename, width=width, height=height, fps=fps, codec=codec, pix_fmt=pix_fmt, options=options, metadata=metadata, pbar=pbar, total=frames)
+        encoder.write(torch.as_tensor(tensor, dtype=torch.uint8).numpy(force=True))
+        encoder.close()
+        shared.state.outputs(filename)
+    except Exception as e:
+        shared.log.error(f'Video: file="{filename}" {e}')
     shared.state.end(savejob)
 
 
+def interpolate_chunk(pixels:torch.Tensor, count:int, last:torch.Tensor=None):
+    """rife interpolation of single chunk, previous chunk last frame is prepended so chunk boundaries interpolate same as full video"""
+    x = pixels.squeeze(0).permute(1, 0, 2, 3)
+    if last is not None:
+        x = torch.cat([last.to(x.device, x.dtype), x], dim=0)
+    interpolated = rife.interpolate_nchw(x, count=count)
+    if last is not None:
+        interpolated = interpolated[count:] # drop outputs generated for prepended frame
+    last = x[-1:].clone()
+    pixels = torch.stack(interpolated, dim=0)
+    pixels = pixels.permute(1, 2, 0, 3, 4)
+    return pixels, last
+
+
 def save_video(
         p:processing.StableDiffusionProcessingVideo,
         pixels:torch.Tensor,
@@ -120,58 +207,76 @@ def save_video(
         metadata:dict={}, # metadata for video
         pbar=None, # progress bar for video
     ):
+    """save video from pixel tensor n c t h w or iterable of such chunks, chunks are converted, interpolated and encoded one at a time"""
     output_video = None
     if pixels is None:
         return 0, output_video
-    if not torch.is_tensor(pixels):
+    if torch.is_tensor(pixels):
+        shape = list(pixels.shape)
+        size = pixels.element_size() * pixels.numel()
+    elif hasattr(pixels, '__iter__'):
+        shape = None
+        size = None
+    else:
         shared.log.error(f'Video: type={type(pixels)} not a tensor')
         return 0, output_video
     t_save = time.time()
-    n, _c, t, h, w = pixels.shape
-    size = pixels.element_size() * pixels.numel()
-    shared.log.debug(f'Video: video={mp4_video} export={mp4_frames} safetensors={mp4_sf} interpolate={mp4_interpolate}')
-    shared.log.debug(f'Video: encode={t} raw={size} latent={pixels.shape} fps={mp4_fps} codec={mp4_codec} ext={mp4_ext} options="{mp4_opt}"')
+    chunk_frames = shared.opts.video_stream_frames
+    shared.log.debug(f'Video: video={mp4_video} export={mp4_frames} safetensors={mp4_sf} interpolate={mp4_interpolate} chunk={chunk_frames} queue={shared.opts.video_stream_queue}')
+    shared.log.debug(f'Video: raw={size} latent={shape} fps={mp4_fps} codec={mp4_codec} ext={mp4_ext} options="{mp4_opt}"')
+    t = 0
+    h, w = 0, 0
+    encoder = None
+    savejob = shared.state.begin('Save video')
     try:
-        preparejob = shared.state.begin('Prepare video')
         if stream is not None:
             stream.output_queue.push(('progress', (None, 'Saving video...')))
-        if mp4_interpolate > 0:
-            x = pixels.squeeze(0).permute(1, 0, 2, 3)
-            interpolated = rife.interpolate_nchw(x, count=mp4_interpolate+1)
-            pixels = torch.stack(interpolated, dim=0)
-            pixels = pixels.permute(1, 2, 0, 3, 4)
-
-        n, _c, t, h, w = pixels.shape
-        x = torch.clamp(pixels.float(), -1., 1.) * 127.5 + 127.5
-        x = x.detach().cpu().to(torch.uint8)
-        x = einops.rearrange(x, '(m n) c t h w -> t (m h) (n w) c', n=n)
-        x = x.contiguous()
-
         output_filename = get_video_filename(p)
         if shared.opts.save_txt:
             save_params(p, f'{output_filename}.txt')
         save_params(p)
+        if mp4_frames:
+            shared.log.info(f'Video frames: files="{output_filename}-00000.jpg"')
+        sf_chunks = []
+        last = None
+        for chunk in pixel_chunks(pixels, chunk_frames):
+            if mp4_interpolate > 0:
+                chunk, last = interpolate_chunk(chunk, count=mp4_interpolate+1, last=last)
+            n, _c, frames, h, w = chunk.shape
+            x = torch.clamp(chunk.float(), -1., 1.) * 127.5 + 127.5
+            x = x.detach().cpu().to(torch.uint8)
+            x = einops.rearrange(x, '(m n) c t h w -> t (m h) (n w) c', n=n)
+            x = x.contiguous()
+            del chunk
 
-        if mp4_sf:
+            if mp4_video and (mp4_codec != 'none'):
+                if encoder is None:
+                    output_video = f'{output_filename}.{mp4_ext}'
+                    total = shape[2] * (mp4_interpolate + 1) if shape is not None else None
+                    encoder = VideoEncoder(output_video, width=x.shape[2], height=x.shape[1], fps=mp4_fps, codec=mp4_codec, options=mp4_opt, metadata=metadata, depth=shared.opts.video_stream_queue, pbar=pbar, total=total)
+                encoder.write(x.numpy())
+            if mp4_frames:
+                for i in range(frames):
+                    image = cv2.cvtColor(x[i].numpy(), cv2.COLOR_RGB2BGR)
+                    fn = f'{output_filename}-{t+i:05d}.jpg'
+                    shared.state.outputs(fn)
+                    cv2.imwrite(fn, image)
+            if mp4_sf:
+                sf_chunks.append(x)
+            t += frames
+
+        if mp4_sf and len(sf_chunks) > 0:
+            x = torch.cat(sf_chunks, dim=0)
             fn = f'{output_filename}.safetensors'
             shared.log.info(f'Video export: file="{fn}" type=savetensors shape={x.shape}')
             from safetensors.torch import save_file
             shared.state.outputs(fn)
             save_file({ 'frames': x }, fn, metadata={'format': 'video', 'frames': str(t), 'width': str(w), 'height': str(h), 'fps': str(mp4_fps), 'codec': mp4_codec, 'options': mp4_opt, 'ext': mp4_ext, 'interpolate': str(mp4_interpolate)})
 
-        if mp4_frames:
-            shared.log.info(f'Video frames: files="{output_filename}-00000.jpg" frames={t} width={w} height={h}')
-            for i in range(t):
-                image = cv2.cvtColor(x[i].numpy(), cv2.COLOR_RGB2BGR)
-                fn = f'{output_filename}-{i:05d}.jpg'
-                shared.state.outputs(fn)
-                cv2.imwrite(fn, image)
-
-        shared.state.end(preparejob)
-
-        if mp4_video and (mp4_codec != 'none'):
-            output_video = f'{output_filename}.{mp4_ext}'
-            atomic_save_video(output_video, tensor=x, fps=mp4_fps, codec=mp4_codec, options=mp4_opt, metadata=metadata, pbar=pbar)
+        if encoder is not None:
+            encoder.close()
+            encoder = None
+            shared.state.outputs(output_video)
             if stream is not None:
                 stream.output_queue.push(('progress', (None, f'Video {os.path.basename(output_video)} | Codec {mp4_codec} | Size {w}x{h}x{t} | FPS {mp4_fps}')))
                 stream.output_queue.push(('file', output_video))
@@ -182,5 +287,11 @@ def save_video(
     except Exception as e:
         shared.log.error(f'Video save: raw={size} {e}')
         errors.display(e, 'video')
+        if encoder is not None:
+            try:
+                encoder.close()
+            except Exception:
+                pass
+    shared.state.end(savejob)
     timer.process.add('save', time.time()-t_save)
     return t, output_video
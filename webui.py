@@ -369,6 +369,8 @@ def webui(restart=False):
     app = start_ui()
     modules.script_callbacks.after_ui_callback()
     modules.sd_models.write_metadata()
+    if shared.opts.hash_background:
+        modules.hashes.hash_all()
 
     load_model()
     mount_subpath(app)